@@ -10,6 +10,8 @@ from flask import Flask
 from .config import Config
 from .extensions import cors, mongo
 from .routes import register_blueprints
+from .services.index_manager import ensure_indexes_on_startup, register_slow_query_listener
+from .services.report_jobs import recover_report_jobs_on_startup
 
 def create_app():
     """
@@ -26,8 +28,18 @@ def create_app():
             "allow_headers": ["Content-Type", "Authorization", "X-User-ID"]
         }
     })
+    # 慢查询监听器必须在创建MongoClient之前注册
+    register_slow_query_listener()
     mongo.init_app(app)
 
+    # 确保热点查询所需的索引存在
+    if app.config.get("MONGO_ENSURE_INDEXES"):
+        ensure_indexes_on_startup()
+
+    # 重新入队服务重启前未完成的报告任务
+    if app.config.get("REPORT_JOB_RECOVER_ON_STARTUP"):
+        recover_report_jobs_on_startup()
+
     # 注册蓝图
     register_blueprints(app)
 
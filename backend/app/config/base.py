@@ -15,6 +15,131 @@ class Config(object):
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your_openai_azure_key")
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://your-azure-endpoint.openai.azure.com/")
     OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION", "2023-05-15")
+
+    # Azure OpenAI HTTP连接池配置（每个模型一个连接池，进程内共享）
+    AZURE_HTTP_POOL_SIZE = int(os.getenv("AZURE_HTTP_POOL_SIZE", "10"))
+    AZURE_HTTP_POOL_BLOCK = os.getenv("AZURE_HTTP_POOL_BLOCK", "false").lower() == "true"
+    AZURE_HTTP_CONNECT_TIMEOUT = float(os.getenv("AZURE_HTTP_CONNECT_TIMEOUT", "5"))
+    AZURE_HTTP_READ_TIMEOUT = float(os.getenv("AZURE_HTTP_READ_TIMEOUT", "60"))
+    # 异步客户端（ASGI入口）单个模型的最大并发连接数
+    AZURE_ASYNC_MAX_CONNECTIONS = int(os.getenv("AZURE_ASYNC_MAX_CONNECTIONS", "200"))
+
+    # Azure OpenAI 调用容错配置
+    AZURE_REQUEST_DEADLINE = float(os.getenv("AZURE_REQUEST_DEADLINE", "90"))  # 单次调用（含重试）的总超时秒数
+    AZURE_RETRY_MAX_ATTEMPTS = int(os.getenv("AZURE_RETRY_MAX_ATTEMPTS", "3"))
+    AZURE_RETRY_BASE_DELAY = float(os.getenv("AZURE_RETRY_BASE_DELAY", "0.5"))
+    AZURE_RETRY_MAX_DELAY = float(os.getenv("AZURE_RETRY_MAX_DELAY", "8"))
+    AZURE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("AZURE_CIRCUIT_FAILURE_THRESHOLD", "5"))  # 连续失败N次后熔断
+    AZURE_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("AZURE_CIRCUIT_RECOVERY_TIMEOUT", "30"))  # 熔断后N秒放行探测请求
+    
+    # 模型路由（多部署选择与降级）
+    AZURE_DEFAULT_MODEL = os.getenv("AZURE_DEFAULT_MODEL", "4o")
+    AZURE_MODEL_FALLBACKS = os.getenv("AZURE_MODEL_FALLBACKS", "4o=gpt-35-turbo,gpt-4=4o|gpt-35-turbo")  # 主模型不可用时的备用模型
+    AZURE_ROUTER_MAX_IN_FLIGHT = int(os.getenv("AZURE_ROUTER_MAX_IN_FLIGHT", "32"))  # 单个部署的最大并发请求数，0为不限制
+    AZURE_ROUTER_EWMA_ALPHA = float(os.getenv("AZURE_ROUTER_EWMA_ALPHA", "0.2"))  # 延迟/错误率滑动平均的权重
+    # 流式请求携带 stream_options.include_usage，最后一个数据块返回token用量（需要 api-version 2024-09-01+）
+    AZURE_STREAM_INCLUDE_USAGE = os.getenv("AZURE_STREAM_INCLUDE_USAGE", "false").lower() == "true"
+
+    # 用量计量（token、延迟、首字耗时），按分钟聚合后批量写入时间序列集合
+    USAGE_METERING_ENABLED = os.getenv("USAGE_METERING_ENABLED", "true").lower() == "true"
+    USAGE_COLLECTION = os.getenv("USAGE_COLLECTION", "usage_metrics")
+    USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "500"))
+    USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+    USAGE_RETENTION_DAYS = int(os.getenv("USAGE_RETENTION_DAYS", "90"))  # 创建集合时设置的过期天数
+    USAGE_PRICES = os.getenv("USAGE_PRICES", "")  # 每1K token单价，如 4o=0.0025/0.01,gpt-35-turbo=0.0005/0.0015
+
+    # 会话上下文缓存配置（进程内，按用户缓存最近历史与画像）
+    CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+    CONTEXT_CACHE_MAX_USERS = int(os.getenv("CONTEXT_CACHE_MAX_USERS", "1000"))
+    CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "300"))
+    CONTEXT_CACHE_HISTORY_SIZE = int(os.getenv("CONTEXT_CACHE_HISTORY_SIZE", "20"))
+
+    # 聊天会话配置：超过 CHAT_SESSION_IDLE_MINUTES 没有消息时开始新会话，上一个会话随后折叠进摘要
+    CHAT_SESSIONS_ENABLED = os.getenv("CHAT_SESSIONS_ENABLED", "true").lower() == "true"
+    CHAT_SESSION_IDLE_MINUTES = float(os.getenv("CHAT_SESSION_IDLE_MINUTES", "120"))
+    CHAT_SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "10000"))  # 进程内缓存的活跃会话数
+
+    # 对话上下文token预算（系统提示词 + 历史 + 当前消息）
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "4000"))
+    CHAT_CONTEXT_MAX_MESSAGE_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGE_TOKENS", "800"))
+    TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+    # 系统提示词渲染缓存的最大条目数（0 表示不缓存）
+    PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+
+    # 后台任务队列默认线程数
+    JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "2"))
+
+    # 滚动对话摘要配置
+    SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_LLM = os.getenv("SUMMARY_LLM", "azure")  # azure | stub
+    SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "1"))
+    SUMMARY_CHECK_EVERY = int(os.getenv("SUMMARY_CHECK_EVERY", "10"))  # 每N轮对话检查一次
+    SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "20"))  # 最近N条消息保留原文
+    SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "10"))
+    SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "100"))
+    SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "800"))
+
+    # 聊天消息异步批量写入（write-behind）配置
+    WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+    WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+
+    # 消息内容压缩（需要 zstandard）：超过 CONTENT_CODEC_MIN_BYTES 字节的 content 以 zstd 压缩存储
+    CONTENT_CODEC_ENABLED = os.getenv("CONTENT_CODEC_ENABLED", "false").lower() == "true"
+    CONTENT_CODEC_LEVEL = int(os.getenv("CONTENT_CODEC_LEVEL", "3"))
+    CONTENT_CODEC_MIN_BYTES = int(os.getenv("CONTENT_CODEC_MIN_BYTES", "64"))
+    CONTENT_CODEC_DICT_DIR = os.getenv("CONTENT_CODEC_DICT_DIR", "")  # 字典目录（scripts/train_content_dict.py 生成）
+    CONTENT_CODEC_DICT_ID = int(os.getenv("CONTENT_CODEC_DICT_ID", "0"))  # 压缩使用的字典，0 表示不使用字典
+
+    # 聊天记录冷热分层：超过 ARCHIVE_HOT_DAYS 天的消息按 (用户, 月份) 压缩归档（scripts/archive_messages.py）
+    ARCHIVE_HOT_DAYS = int(os.getenv("ARCHIVE_HOT_DAYS", "30"))
+    ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "0"))  # 归档在该月结束后保留的天数，0 表示永久保留
+    ARCHIVE_COLLECTION = os.getenv("ARCHIVE_COLLECTION", "chat_archive")
+    ARCHIVE_BATCH_MESSAGES = int(os.getenv("ARCHIVE_BATCH_MESSAGES", "1000"))  # 每个用户每批归档的消息数
+    ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))  # zlib 压缩级别
+
+    # MongoDB索引与慢查询配置
+    MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+    MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+    MONGO_PROFILE_SLOW_QUERIES = os.getenv("MONGO_PROFILE_SLOW_QUERIES", "false").lower() == "true"
+
+    # 报告结果缓存
+    REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")  # memory / mongo / none
+    REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "512"))  # memory 后端的最大条目数
+    REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "604800"))  # 缓存有效期（秒），默认7天
+    REPORT_CACHE_COLLECTION = os.getenv("REPORT_CACHE_COLLECTION", "report_cache")
+    REPORT_PROMPT_VERSION = os.getenv("REPORT_PROMPT_VERSION", "1")  # 修改后所有已缓存的报告失效
+    REPORT_JSON_MODE = os.getenv("REPORT_JSON_MODE", "true").lower() == "true"  # 报告使用 response_format=json_object
+    # 大五人格得分由本地按计分键计算（需要NumPy），大模型只生成文字部分
+    BIG_FIVE_LOCAL_SCORING = os.getenv("BIG_FIVE_LOCAL_SCORING", "true").lower() == "true"
+
+    # 综合报告流水线并行生成前两个阶段的线程数（每个进程）
+    REPORT_PIPELINE_WORKERS = int(os.getenv("REPORT_PIPELINE_WORKERS", "8"))
+    # 流水线三个阶段共用的总超时秒数（含重试），需小于 gunicorn 的 worker 超时（Dockerfile 中为120秒）
+    REPORT_PIPELINE_DEADLINE = float(os.getenv("REPORT_PIPELINE_DEADLINE", "100"))
+    # 剩余时间少于N秒时不再开始综合阶段，返回前两个阶段的部分结果
+    REPORT_HOLISTIC_MIN_SECONDS = float(os.getenv("REPORT_HOLISTIC_MIN_SECONDS", "20"))
+
+    # 报告异步任务
+    REPORT_JOB_COLLECTION = os.getenv("REPORT_JOB_COLLECTION", "report_jobs")
+    REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "4"))  # 每个进程执行报告任务的线程数
+    REPORT_JOB_TTL = int(os.getenv("REPORT_JOB_TTL", "604800"))  # 任务记录保留时间（秒）
+    REPORT_JOB_LEASE = int(os.getenv("REPORT_JOB_LEASE", "600"))  # 执行超过N秒未结束的任务在重启后重新入队
+    REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "2"))
+    REPORT_JOB_RECOVER_ON_STARTUP = os.getenv("REPORT_JOB_RECOVER_ON_STARTUP", "true").lower() == "true"
+    REPORT_JOB_RECOVER_LIMIT = int(os.getenv("REPORT_JOB_RECOVER_LIMIT", "100"))
+    REPORT_JOB_WEBHOOK_HOSTS = os.getenv("REPORT_JOB_WEBHOOK_HOSTS", "")  # 允许回调的主机，逗号分隔；为空时不允许回调
+    REPORT_JOB_WEBHOOK_SECRET = os.getenv("REPORT_JOB_WEBHOOK_SECRET", "")  # 回调请求的HMAC签名密钥
+    REPORT_JOB_WEBHOOK_TIMEOUT = float(os.getenv("REPORT_JOB_WEBHOOK_TIMEOUT", "5"))
+    REPORT_JOB_WEBHOOK_ATTEMPTS = int(os.getenv("REPORT_JOB_WEBHOOK_ATTEMPTS", "3"))
+
+    # Prometheus 指标（/metrics，需要 prometheus_client；多进程部署需设置 PROMETHEUS_MULTIPROC_DIR）
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # 管理接口（/api/admin 和 /metrics）访问令牌，留空则管理接口一律返回403
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
     # TODO: 可在此添加更多配置项，如日志、缓存、第三方服务等
 
 # TODO: 如需多环境（开发/生产）配置，可继承Config类扩展
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+情绪词典配置模块
+- 定义情绪分析使用的关键词及权重
+- 情绪类别与 XinErPersona.EMOTIONAL_RESPONSES 保持一致（normal 对应 neutral），另外保留 lonely
+- 英文关键词统一使用小写，分析时只对ASCII字母做大小写折叠
+"""
+
+# 情绪关键词词典：{情绪: {关键词: 权重}}
+# 权重 1.0 为一般表达，更强烈或更明确的表达使用更高的权重
+EMOTION_LEXICON = {
+    "sad": {
+        "难过": 1.0, "伤心": 1.0, "痛苦": 1.5, "失落": 1.0, "沮丧": 1.0,
+        "哭": 1.0, "眼泪": 1.0, "心碎": 1.5, "委屈": 1.0, "崩溃": 1.5,
+        "绝望": 2.0, "不开心": 1.0, "难受": 0.8, "想哭": 1.5, "emo": 1.0,
+    },
+    "anxious": {
+        "焦虑": 1.5, "紧张": 1.0, "担心": 1.0, "害怕": 1.0, "不安": 1.0,
+        "压力": 1.0, "慌": 0.8, "失眠": 0.8, "烦躁": 1.0, "睡不着": 0.8,
+        "恐惧": 1.5, "忐忑": 1.0,
+    },
+    "happy": {
+        "开心": 1.0, "高兴": 1.0, "快乐": 1.0, "兴奋": 1.0, "愉快": 1.0,
+        "满足": 1.0, "幸福": 1.5, "太好了": 1.0, "哈哈": 0.5, "喜欢": 0.5,
+        "期待": 0.8, "激动": 1.0,
+    },
+    "lonely": {
+        "孤独": 1.5, "寂寞": 1.5, "一个人": 0.8, "没人": 1.0, "独自": 0.8,
+        "空虚": 1.0, "孤单": 1.5, "没有朋友": 1.5, "没人理": 1.5, "被忽略": 1.0,
+    },
+    "tired": {
+        "累": 1.0, "疲惫": 1.5, "困": 0.8, "好困": 1.0, "没力气": 1.0,
+        "辛苦": 0.8, "熬夜": 0.8, "筋疲力尽": 2.0, "心累": 1.5, "想睡": 0.8,
+    },
+}
+
+# 得分相同时的优先顺序（与原关键词匹配的判断顺序一致）
+EMOTION_PRIORITY = ("sad", "anxious", "happy", "lonely", "tired")
@@ -7,10 +7,32 @@ Flask扩展初始化模块
 
 from flask_pymongo import PyMongo
 from flask_cors import CORS
+from .config import Config
 
 # 初始化MongoDB扩展
 mongo = PyMongo()
 # 初始化CORS扩展
 cors = CORS()
 
+# 异步MongoDB客户端（motor），仅在ASGI入口中按需创建
+_async_mongo_client = None
+
+def get_async_db():
+    """
+    获取异步MongoDB数据库对象
+    motor 客户端在首次调用时创建，进程内共享
+    """
+    global _async_mongo_client
+    if _async_mongo_client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _async_mongo_client = AsyncIOMotorClient(Config.MONGO_URI)
+    return _async_mongo_client.get_default_database()
+
+def close_async_db():
+    """关闭异步MongoDB客户端"""
+    global _async_mongo_client
+    if _async_mongo_client is not None:
+        _async_mongo_client.close()
+        _async_mongo_client = None
+
 # TODO: 如需添加更多扩展（如JWT、缓存等），可在此统一管理
@@ -2,20 +2,43 @@
 """
 聊天数据模型
 - 定义聊天记录在MongoDB中的数据结构
+- 模型使用 __slots__，不为每个实例创建 __dict__；FIELDS 给出固定的字段顺序，可与元组互相转换（to_row / from_row）
+- 构造上下文只需要 role 和 content：用 HISTORY_PROJECTION 查询，再用 openai_messages_from_docs 直接转换，
+  不经过模型对象
+- content 写入时经 content_codec 编码（可选的 zstd 压缩），ChatMessage 在第一次访问 content 时才解码
 """
 
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Dict, Iterable, List, Tuple
 from bson import ObjectId
 
+from ..services.content_codec import content_codec, decode_content
+
+# 读取对话上下文时的投影：只取 role 和 content
+HISTORY_PROJECTION = {"role": 1, "content": 1, "_id": 0}
+
+
+def openai_messages_from_docs(docs: Iterable[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    把 chat_messages 文档（或投影结果）直接转换为 OpenAI 消息格式
+    等价于 ChatMessage.from_dict(doc).to_openai_format()，但不创建模型对象、不生成默认的ID和时间
+    """
+    return [{"role": doc.get("role", "user"), "content": decode_content(doc.get("content", ""))} for doc in docs]
+
+
 class ChatMessage:
     """
     聊天消息模型
     用于MongoDB存储和查询聊天记录
     """
-    def __init__(self, user_id: str, content: str, role: str, 
-                 message_id: str = None, timestamp: datetime = None, 
-                 emotional_state: str = "neutral", tokens_used: int = 0):
+    __slots__ = ("message_id", "user_id", "_content", "timestamp", "role", "emotional_state", "tokens_used",
+                 "session_id")
+    FIELDS = ("message_id", "user_id", "content", "timestamp", "role", "emotional_state", "tokens_used",
+              "session_id")
+
+    def __init__(self, user_id: str, content: str, role: str,
+                 message_id: str = None, timestamp: datetime = None,
+                 emotional_state: str = "neutral", tokens_used: int = 0, session_id: str = None):
         self.message_id = message_id or str(ObjectId())
         self.user_id = user_id
         self.content = content
@@ -23,37 +46,68 @@ class ChatMessage:
         self.role = role  # "user" or "assistant"
         self.emotional_state = emotional_state  # 情绪状态
         self.tokens_used = tokens_used  # 使用的token数量
-    
+        self.session_id = session_id  # 所属会话，未启用会话时为 None
+
+    @property
+    def content(self) -> str:
+        """消息内容；从数据库读取的压缩内容在第一次访问时解码"""
+        if not isinstance(self._content, str):
+            self._content = decode_content(self._content)
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for MongoDB storage"""
-        return {
+        doc = {
             "_id": self.message_id,
             "user_id": self.user_id,
-            "content": self.content,
+            # 尚未解码的内容直接写回，不重复压缩
+            "content": content_codec.encode(self._content) if isinstance(self._content, str) else self._content,
             "timestamp": self.timestamp,
             "role": self.role,
             "emotional_state": self.emotional_state,
             "tokens_used": self.tokens_used
         }
-    
+        if self.session_id is not None:
+            doc["session_id"] = self.session_id
+        return doc
+
     def to_openai_format(self) -> Dict[str, str]:
         """Convert to OpenAI API format"""
         return {
             "role": self.role,
             "content": self.content
         }
-    
+
+    def to_row(self) -> Tuple:
+        """Convert to a tuple in FIELDS order"""
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'ChatMessage':
+        """Create ChatMessage from a tuple in FIELDS order"""
+        message = cls.__new__(cls)
+        for field, value in zip(cls.FIELDS, row):
+            setattr(message, field, value)
+        return message
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ChatMessage':
         """Create ChatMessage from dictionary"""
+        # 缺少 _id / timestamp 时才生成默认值（由 __init__ 处理）
+        message_id = data.get("_id")
         return cls(
-            message_id=str(data.get("_id", "")),
+            message_id=str(message_id) if message_id is not None else None,
             user_id=data.get("user_id", ""),
             content=data.get("content", ""),
-            timestamp=data.get("timestamp", datetime.now()),
+            timestamp=data.get("timestamp"),
             role=data.get("role", "user"),
             emotional_state=data.get("emotional_state", "neutral"),
-            tokens_used=data.get("tokens_used", 0)
+            tokens_used=data.get("tokens_used", 0),
+            session_id=data.get("session_id")
         )
 
 class ChatSession:
@@ -61,14 +115,19 @@ class ChatSession:
     聊天会话模型
     用于管理用户的聊天会话
     """
-    def __init__(self, user_id: str, session_id: str = None, 
-                 created_at: datetime = None, last_active: datetime = None):
+    __slots__ = ("session_id", "user_id", "created_at", "last_active", "message_count", "tokens_used")
+    FIELDS = __slots__
+
+    def __init__(self, user_id: str, session_id: str = None,
+                 created_at: datetime = None, last_active: datetime = None,
+                 message_count: int = 0, tokens_used: int = 0):
         self.session_id = session_id or str(ObjectId())
         self.user_id = user_id
         self.created_at = created_at or datetime.now()
-        self.last_active = last_active or datetime.now()
-        self.message_count = 0
-    
+        self.last_active = last_active or self.created_at
+        self.message_count = message_count
+        self.tokens_used = tokens_used
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for MongoDB storage"""
         return {
@@ -76,5 +135,19 @@ class ChatSession:
             "user_id": self.user_id,
             "created_at": self.created_at,
             "last_active": self.last_active,
-            "message_count": self.message_count
+            "message_count": self.message_count,
+            "tokens_used": self.tokens_used
         }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ChatSession':
+        """Create ChatSession from dictionary"""
+        session_id = data.get("_id")
+        return cls(
+            session_id=str(session_id) if session_id is not None else None,
+            user_id=data.get("user_id", ""),
+            created_at=data.get("created_at"),
+            last_active=data.get("last_active"),
+            message_count=data.get("message_count", 0),
+            tokens_used=data.get("tokens_used", 0)
+        )
@@ -23,6 +23,7 @@ class User:
         self.persona_preferences = {}  # 个性化偏好
         self.emotional_state = "neutral"  # 当前情绪状态
         self.interaction_history = []  # 交互历史摘要
+        self.conversation_summary = {}  # 滚动对话摘要 {text, summarized_until, message_count, updated_at}
         self.last_active = datetime.now()  # 最后活跃时间
         
     def update_persona_profile(self, profile_data: Dict):
@@ -55,5 +56,6 @@ class User:
             "persona_preferences": self.persona_preferences,
             "emotional_state": self.emotional_state,
             "interaction_history": self.interaction_history,
+            "conversation_summary": self.conversation_summary,
             "last_active": self.last_active
         }
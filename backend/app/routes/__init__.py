@@ -6,6 +6,8 @@
 
 from .report import report_bp
 from .chat import chat_bp
+from .admin import admin_bp
+from .metrics import metrics_bp
 
 def register_blueprints(app):
     """
@@ -13,4 +15,6 @@ def register_blueprints(app):
     """
     app.register_blueprint(report_bp, url_prefix="/api/report")
     app.register_blueprint(chat_bp, url_prefix="/api/chat")
+    app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(metrics_bp)
     # TODO: 如需添加新功能模块，在此注册对应蓝图
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+运维管理路由模块
+- 提供数据库索引、慢查询、执行计划等运维信息接口
+- 提供报告缓存统计与清除接口、报告任务统计接口
+- 提供按用户、按天汇总的大模型用量（token、费用、延迟）查询接口
+- 提供聊天记录归档的统计与手动触发接口
+- 需要在请求头中携带 Authorization: Bearer <ADMIN_TOKEN>；未配置 ADMIN_TOKEN 时管理接口一律返回403
+"""
+
+import hmac
+from functools import wraps
+
+from flask import Blueprint, request, jsonify
+from ..config import Config
+from ..services.index_manager import IndexManager, slow_query_listener
+from ..services.message_archive import message_archiver
+from ..services.report_cache import report_cache
+from ..services.report_jobs import report_job_manager
+from ..services.usage_meter import usage_meter
+
+admin_bp = Blueprint("admin", __name__)
+index_manager = IndexManager()
+
+# 用量查询允许的附加分组字段
+USAGE_GROUP_FIELDS = ("endpoint", "model")
+
+
+def admin_required(view):
+    """
+    校验管理接口访问令牌
+    未配置 ADMIN_TOKEN 时拒绝所有请求（默认部署不暴露管理接口和指标）
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({"error": "Admin API is disabled, set ADMIN_TOKEN to enable it", "status": "error"}), 403
+        expected = f"Bearer {Config.ADMIN_TOKEN}".encode("utf-8")
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"), expected):
+            return jsonify({"error": "Unauthorized", "status": "error"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/db/indexes", methods=["GET", "POST"])
+@admin_required
+def db_indexes():
+    """
+    查看索引状态接口
+    POST 时会先重新执行一次索引创建
+    """
+    try:
+        result = {"status": "success"}
+        if request.method == "POST":
+            result["ensure"] = index_manager.ensure_indexes()
+        result["indexes"] = index_manager.list_indexes()
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/db/slow_queries", methods=["GET"])
+@admin_required
+def db_slow_queries():
+    """
+    慢查询接口
+    返回本进程记录的慢查询；开启服务端profiling时同时返回 system.profile 中的记录
+    """
+    try:
+        limit = request.args.get("limit", 50, type=int)
+        result = {
+            "threshold_ms": slow_query_listener.threshold_ms,
+            "recent": slow_query_listener.recent(limit),
+            "status": "success"
+        }
+        if Config.MONGO_PROFILE_SLOW_QUERIES:
+            result["profiled"] = index_manager.get_profiled_queries(limit)
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/db/explain/history", methods=["GET"])
+@admin_required
+def db_explain_history():
+    """
+    聊天历史查询执行计划接口
+    查询参数: user_id - 用于生成执行计划的用户ID
+    """
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required", "status": "error"}), 400
+
+        limit = request.args.get("limit", 20, type=int)
+        plan = index_manager.explain_history_query(user_id, limit)
+        return jsonify({"plan": plan, "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/report_cache", methods=["GET"])
+@admin_required
+def report_cache_stats():
+    """报告缓存统计接口（命中率、条目数等）"""
+    try:
+        return jsonify({"cache": report_cache.stats(), "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/report_cache/invalidate", methods=["POST"])
+@admin_required
+def report_cache_invalidate():
+    """
+    清除报告缓存接口（修改提示词或切换模型后调用）
+    请求体（可选）: {"report_type": "big_five" | "core_values" | "holistic"}，为空时清除全部
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        removed = report_cache.invalidate(data.get("report_type"))
+        return jsonify({"removed": removed, "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/report_jobs", methods=["GET"])
+@admin_required
+def report_jobs_stats():
+    """报告任务统计接口（线程池状态、各状态任务数、回调结果）"""
+    try:
+        return jsonify({"jobs": report_job_manager.stats(), "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+def _usage_group_by(*fields):
+    """解析 ?by=endpoint,model 附加分组字段"""
+    extra = [field for field in request.args.get("by", "").split(",") if field in USAGE_GROUP_FIELDS]
+    return tuple(fields) + tuple(extra)
+
+
+@admin_bp.route("/usage", methods=["GET"])
+@admin_required
+def usage_stats():
+    """用量计量器状态接口（队列长度、已写入/丢弃的记录数）"""
+    try:
+        return jsonify({"meter": usage_meter.stats(), "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/usage/daily", methods=["GET"])
+@admin_required
+def usage_daily():
+    """
+    按天汇总的用量接口
+    查询参数: days - 最近N天（默认7）；endpoint - 只统计该来源；by - 附加分组（endpoint / model，逗号分隔）
+    """
+    try:
+        days = request.args.get("days", 7, type=int)
+        rows = usage_meter.query(days=days, endpoint=request.args.get("endpoint"), group_by=_usage_group_by("day"))
+        return jsonify({"days": days, "usage": rows, "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/usage/users", methods=["GET"])
+@admin_required
+def usage_top_users():
+    """
+    按用户汇总的用量接口（按token数从高到低）
+    查询参数: days - 最近N天（默认1）；limit - 返回的用户数（默认20）
+    """
+    try:
+        days = request.args.get("days", 1, type=int)
+        limit = request.args.get("limit", 20, type=int)
+        rows = usage_meter.query(days=days, endpoint=request.args.get("endpoint"), group_by=("user_id",))
+        rows = sorted((row for row in rows if row.get("user_id")), key=lambda row: row["total_tokens"], reverse=True)
+        return jsonify({"days": days, "usage": rows[:limit], "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/usage/users/<user_id>", methods=["GET"])
+@admin_required
+def usage_user(user_id):
+    """
+    单个用户按天汇总的用量接口
+    查询参数: days - 最近N天（默认7）；by - 附加分组（endpoint / model，逗号分隔）
+    """
+    try:
+        days = request.args.get("days", 7, type=int)
+        rows = usage_meter.query(days=days, user_id=user_id, group_by=_usage_group_by("day"))
+        return jsonify({"user_id": user_id, "days": days, "usage": rows, "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/archive", methods=["GET"])
+@admin_required
+def archive_stats():
+    """聊天记录归档统计接口（热数据天数、保留期、归档桶数和消息数）"""
+    try:
+        return jsonify({"archive": message_archiver.stats(), "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+
+@admin_bp.route("/archive/run", methods=["POST"])
+@admin_required
+def archive_run():
+    """
+    手动触发归档接口（日常由定时任务运行 scripts/archive_messages.py）
+    请求体（可选）: {"user_id": "只归档该用户", "max_users": 100}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get("user_id"):
+            result = message_archiver.archive_user(data["user_id"])
+        else:
+            result = message_archiver.run(max_users=int(data.get("max_users", 100)))
+        return jsonify({"result": result, "status": "success"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
@@ -8,7 +8,11 @@
 
 from flask import Blueprint, request, jsonify, Response, stream_template
 import json
+import re
 from ..services.chat_service import ChatService
+from ..services.metrics import metrics
+from ..services.content_codec import content_codec, decode_content
+from ..services.message_archive import message_archiver
 
 chat_bp = Blueprint("chat", __name__)
 chat_service = ChatService()
@@ -94,7 +98,7 @@ def chat_message():
         
         # 返回流式响应
         return Response(
-            generate_response(),
+            metrics.track_stream(request.url_rule.rule, generate_response()),
             mimetype='text/plain',
             headers={
                 'Cache-Control': 'no-cache',
@@ -162,17 +166,131 @@ def chat_message_sync():
 def chat_history():
     """
     获取聊天历史接口
-    从数据库获取用户聊天历史记录
+    按 (timestamp, _id) 键集分页，从数据库获取用户聊天历史记录
+    
+    查询参数:
+        user_id: 用户ID（必填）
+        limit: 每页条数，默认20，最大100
+        before / after: 上一页返回的 older_cursor / newer_cursor（不能同时使用）
+        fields: 额外返回的字段，逗号分隔（emotional_state, tokens_used）
+        session_id: 只返回该会话的消息（会话ID见 /sessions）
+        format: json（默认）/ compact（字段名只出现一次的行数组）/ ndjson（逐行输出）
     """
     try:
         user_id = request.args.get("user_id")
         if not user_id:
             return jsonify({"error": "user_id is required", "status": "error"}), 400
         
-        # 调用chat_service获取历史记录
-        result = chat_service.get_history(user_id)
+        output_format = request.args.get("format", "json")
+        if output_format not in ("json", "compact", "ndjson"):
+            return jsonify({"error": "format must be json, compact or ndjson", "status": "error"}), 400
+        try:
+            limit = int(request.args.get("limit", 20))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer", "status": "error"}), 400
+        fields = tuple(field.strip() for field in request.args.get("fields", "").split(",")
+                       if field.strip() in ChatService.HISTORY_OPTIONAL_FIELDS)
         
-        return jsonify(result), 200
+        # 调用chat_service按游标查询一页历史记录
+        try:
+            page = chat_service.get_history_page(user_id, limit=limit, before=request.args.get("before"),
+                                                 after=request.args.get("after"), fields=fields,
+                                                 session_id=request.args.get("session_id"))
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+        
+        cursors = {
+            "older_cursor": page["older_cursor"],
+            "newer_cursor": page["newer_cursor"],
+            "has_more": page["has_more"],
+        }
+        if output_format == "compact":
+            # 字段名只输出一次，时间戳为毫秒数
+            columns = ["id", "role", "content", "timestamp"] + list(fields)
+            rows = [[int(message["timestamp"].timestamp() * 1000) if column == "timestamp"
+                     else message.get(column) for column in columns] for message in page["messages"]]
+            body = {"user_id": user_id, "fields": columns, "rows": rows, **cursors, "status": "success"}
+            return Response(json.dumps(body, ensure_ascii=False, separators=(",", ":"), default=str),
+                            mimetype="application/json")
+        
+        messages = [dict(message, timestamp=message["timestamp"].isoformat()) for message in page["messages"]]
+        if output_format == "ndjson":
+            def generate_lines():
+                for message in messages:
+                    yield json.dumps(message, ensure_ascii=False, default=str) + "\n"
+                # 最后一行为分页游标
+                yield json.dumps(cursors) + "\n"
+            return Response(generate_lines(), mimetype="application/x-ndjson")
+        
+        return jsonify({
+            "history": messages,
+            "user_id": user_id,
+            "message_count": len(messages),
+            **cursors,
+            "status": "success"
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@chat_bp.route("/history/archive", methods=["GET"])
+def chat_history_archive():
+    """
+    获取归档聊天记录接口
+    超过热数据保留天数的消息按月归档；不传 month 时返回已归档的月份列表，传 month（如 2026-01）时返回该月的消息
+    """
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required", "status": "error"}), 400
+        
+        month = request.args.get("month")
+        if not month:
+            months = message_archiver.list_months(user_id)
+            return jsonify({"user_id": user_id, "months": months, "status": "success"}), 200
+        if not re.fullmatch(r"\d{4}-\d{2}", month):
+            return jsonify({"error": "month must be formatted as YYYY-MM", "status": "error"}), 400
+        
+        messages = [
+            {
+                "id": str(message["_id"]),
+                "role": message.get("role", "user"),
+                "content": decode_content(message.get("content", "")),
+                "timestamp": message["timestamp"].isoformat(),
+            }
+            for message in message_archiver.load_month(user_id, month)
+        ]
+        return jsonify({
+            "user_id": user_id,
+            "month": month,
+            "history": messages,
+            "message_count": len(messages),
+            "status": "success"
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@chat_bp.route("/sessions", methods=["GET"])
+def chat_sessions():
+    """
+    获取会话列表接口
+    按最后活跃时间倒序返回用户的会话及其消息数、token数
+    """
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required", "status": "error"}), 400
+        try:
+            limit = max(1, min(int(request.args.get("limit", 20)), 100))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer", "status": "error"}), 400
+        
+        # 确保排队中的消息已计入会话计数
+        if chat_service.write_behind.has_pending(user_id):
+            chat_service.write_behind.flush()
+        sessions = chat_service.sessions.list_sessions(user_id, limit)
+        return jsonify({"user_id": user_id, "sessions": sessions, "status": "success"}), 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
@@ -190,6 +308,16 @@ def chat_health():
         return jsonify({
             "status": "healthy",
             "available_models": available_models,
+            "http_pool": chat_service.openai_service.get_pool_stats(),
+            "circuit_breakers": chat_service.openai_service.get_circuit_stats(),
+            "model_router": chat_service.openai_service.get_router_stats(),
+            "context_cache": chat_service.context_cache.stats(),
+            "write_behind": chat_service.write_behind.stats(),
+            "sessions": chat_service.sessions.stats(),
+            "content_codec": content_codec.stats(),
+            "summarizer": chat_service.summarizer.stats(),
+            "prompt_templates": chat_service.prompt_templates.stats(),
+            "usage_meter": chat_service.openai_service.usage_meter.stats(),
             "service": "chat"
         }), 200
         
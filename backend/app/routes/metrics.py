@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+指标路由模块
+- GET /metrics 以 Prometheus 文本格式输出指标（多进程部署时汇总所有 worker）
+- 为所有蓝图的请求记录耗时，路由标签使用URL规则（如 /api/report/jobs/<job_id>），避免标签数量无限增长
+- 抓取请求需要携带 Authorization: Bearer <ADMIN_TOKEN>；未配置 ADMIN_TOKEN 时返回403
+"""
+
+import time
+
+from flask import Blueprint, Response, g, jsonify, request
+from ..services.metrics import metrics
+from .admin import admin_required
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def observe_request_latency(response):
+    """记录请求耗时（流式响应只统计到响应开始，流的持续时间单独记录）"""
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+@admin_required
+def prometheus_metrics():
+    """Prometheus 抓取接口"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled or prometheus_client is not installed",
+                        "status": "error"}), 503
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
@@ -2,19 +2,73 @@
 """
 报告相关路由模块
 - 提供报告生成、更新等接口
+- 报告生成接口加 ?async=true 时只创建后台任务并返回 job_id，通过 /jobs/<job_id> 查询结果
+- <报告>/stream 接口以SSE流式返回报告，JSON的每个顶层字段完成后作为一条 section 事件推送
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context, url_for
 import re
 import json
 import csv
 import os
 from ..services.openai_service import OpenAIService
 from ..services.report_service import ReportService
+from ..services.report_jobs import report_job_manager
+from ..services.metrics import metrics
 
 report_bp = Blueprint("report", __name__)
 report_service = ReportService()
 
+
+def _wants_async(data):
+    """请求是否要求以后台任务方式生成报告"""
+    flag = request.args.get("async", "")
+    return flag.lower() in ("1", "true", "yes") or data.get("async") is True
+
+
+def _sse_response(events):
+    """
+    把报告事件包装为SSE响应
+    事件顺序: start → section（每个顶层字段一条）→ end 或 error → [DONE]
+    """
+    def generate():
+        try:
+            yield f"data: {json.dumps({'type': 'start', 'message': 'Report started'})}\n\n"
+            for event in events:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return Response(
+        stream_with_context(metrics.track_stream(request.url_rule.rule, generate())),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+        }
+    )
+
+
+def _enqueue_report_job(report_type, data):
+    """创建报告任务，返回 202 和任务信息"""
+    try:
+        job = report_job_manager.submit(
+            report_type, data,
+            callback_url=data.get("callback_url"),
+            user_id=request.headers.get("X-User-ID"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+    return jsonify({
+        "job": job,
+        "status_url": url_for("report.get_report_job", job_id=job["job_id"]),
+        "status": "accepted"
+    }), 202
+
 @report_bp.route("/overview", methods=["POST"])
 def generate_overview_report():
     """
@@ -47,6 +101,9 @@ def generate_big_five_report():
         if not answers:
             return jsonify({"error": "Answers are required", "status": "error"}), 400
         
+        if _wants_async(data):
+            return _enqueue_report_job("big_five", data)
+        
         result = report_service.generate_big_five_report(answers)
         return jsonify(result), 200
         
@@ -68,12 +125,53 @@ def generate_core_values_report():
         if not answers:
             return jsonify({"error": "Answers are required", "status": "error"}), 400
         
+        if _wants_async(data):
+            return _enqueue_report_job("core_values", data)
+        
         result = report_service.generate_core_values_report(answers)
         return jsonify(result), 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
 
+@report_bp.route("/big_five/stream", methods=["POST"])
+def stream_big_five_report():
+    """
+    流式生成大五人格报告的接口（SSE）
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required", "status": "error"}), 400
+        
+        answers = data.get('answers', [])
+        if not answers:
+            return jsonify({"error": "Answers are required", "status": "error"}), 400
+        
+        return _sse_response(report_service.stream_big_five_report(answers))
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@report_bp.route("/core_values/stream", methods=["POST"])
+def stream_core_values_report():
+    """
+    流式生成价值观报告的接口（SSE）
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required", "status": "error"}), 400
+        
+        answers = data.get('answers', [])
+        if not answers:
+            return jsonify({"error": "Answers are required", "status": "error"}), 400
+        
+        return _sse_response(report_service.stream_core_values_report(answers))
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
 @report_bp.route("/mood", methods=["POST"])
 def generate_mood_report():
     """
@@ -127,10 +225,100 @@ def generate_holistic_report():
                 "status": "error"
             }), 400
         
+        if _wants_async(data):
+            return _enqueue_report_job("holistic", data)
+        
         result = report_service.generate_holistic_report(core_values_data, big_five_data)
         return jsonify(result), 200
         
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
 
+@report_bp.route("/holistic/stream", methods=["POST"])
+def stream_holistic_report():
+    """
+    流式生成综合心理画像报告的接口（SSE）
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required", "status": "error"}), 400
+        
+        core_values_data = data.get('core_values_data')
+        big_five_data = data.get('big_five_data')
+        
+        if not core_values_data or not big_five_data:
+            return jsonify({
+                "error": "Both core_values_data and big_five_data are required", 
+                "status": "error"
+            }), 400
+        
+        return _sse_response(report_service.stream_holistic_report(core_values_data, big_five_data))
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@report_bp.route("/holistic_pipeline", methods=["POST"])
+def generate_holistic_pipeline():
+    """
+    由原始答案一次性生成综合心理画像报告的接口
+    大五人格和核心价值观报告并行生成，再生成综合报告；
+    以任务方式（?async=true）执行时，轮询结果中的 partial 字段会随各阶段完成逐步更新
+    请求体: {"answers": [...], "core_values_answers": 可选，核心价值观报告单独使用的答案}
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required", "status": "error"}), 400
+        
+        answers = data.get('answers', [])
+        if not answers:
+            return jsonify({"error": "Answers are required", "status": "error"}), 400
+        
+        if _wants_async(data):
+            return _enqueue_report_job("holistic_pipeline", data)
+        
+        result = report_service.generate_holistic_pipeline(answers, data.get('core_values_answers'))
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@report_bp.route("/jobs", methods=["POST"])
+def create_report_job():
+    """
+    创建报告生成任务的接口
+    请求体: {"report_type": "big_five" | "core_values" | "holistic" | "holistic_pipeline", ...与对应报告接口相同的字段,
+            "callback_url": 可选，任务结束后回调的地址}
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required", "status": "error"}), 400
+        
+        report_type = data.get('report_type')
+        if not report_type:
+            return jsonify({"error": "report_type is required", "status": "error"}), 400
+        
+        return _enqueue_report_job(report_type, data)
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
+@report_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_report_job(job_id):
+    """
+    查询报告任务状态的接口
+    status 为 queued / running / succeeded / failed；succeeded 时 result 为报告结果
+    """
+    try:
+        job = report_job_manager.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found", "status": "error"}), 404
+        
+        return jsonify({"job": job, "status": "success"}), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}", "status": "error"}), 500
+
 # TODO: 可根据需求添加更多报告相关接口，如获取历史报告、报告详情等
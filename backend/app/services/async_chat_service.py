@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+异步聊天服务
+- ChatService 的 asyncio 版本，使用 motor 访问MongoDB、httpx 调用Azure OpenAI
+- 情绪分析、提示词构建等纯计算逻辑直接复用 ChatService
+- 消息与同步路径共用 write-behind 队列批量写入（入队只是内存操作，不阻塞事件循环）；
+  队列未启用或已满时用 motor 直接写入
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, Dict
+
+from .chat_service import ChatService
+from .async_openai_service import AsyncOpenAIService
+from .metrics import metrics
+from .session_manager import SESSION_COLLECTION, session_counter_updates
+from .summary_service import SUMMARY_COVERAGE_PROJECTION, summarized_until
+from ..extensions import get_async_db
+from ..models.chat import HISTORY_PROJECTION, ChatMessage
+
+
+class AsyncChatService(ChatService):
+    """
+    异步聊天服务类
+    用于 ASGI 入口下的流式聊天，一个事件循环即可同时服务大量 SSE 连接
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.async_openai_service = AsyncOpenAIService()
+
+    async def get_history_async(self, user_id: str, limit: int = 20) -> Dict[str, Any]:
+        """
+        Get user chat history from MongoDB (async)
+
+        Args:
+            user_id: User ID to query history for
+            limit: Maximum number of messages to return (default: 20)
+
+        Returns:
+            Dict containing chat history and metadata
+        """
+        try:
+            db = get_async_db()
+            session, created = await self.sessions.get_active_session_async(db, user_id)
+            if created:
+                self.context_cache.invalidate(user_id)
+                self.summarizer.note_session_closed(user_id)
+
+            conversation_history = self.context_cache.get_history(user_id, limit)
+            if conversation_history is None:
+                # 排队中的消息先写入，刷新是同步的数据库操作，放到线程中执行
+                if self.write_behind.has_pending(user_id):
+                    await asyncio.to_thread(self.write_behind.flush)
+                fetch_limit = max(limit, self.context_cache.history_size)
+                with metrics.time_mongo("get_history"):
+                    user_doc = await db.users.find_one({"user_id": user_id}, SUMMARY_COVERAGE_PROJECTION)
+                    messages_cursor = db.chat_messages.find(
+                        self._history_query(user_id, session, summarized_until(user_doc)), HISTORY_PROJECTION
+                    ).sort("timestamp", -1).limit(fetch_limit)
+                    messages_data = await messages_cursor.to_list(length=fetch_limit)
+                conversation_history = self._history_from_docs(messages_data)
+                if fetch_limit == self.context_cache.history_size:
+                    self.context_cache.set_history(user_id, conversation_history)
+                conversation_history = conversation_history[-limit:] if limit else []
+
+            return {
+                "history": conversation_history,
+                "user_id": user_id,
+                "session_id": session.session_id if session is not None else None,
+                "message_count": len(conversation_history),
+                "status": "success"
+            }
+
+        except Exception as e:
+            print(f"Error fetching chat history for user {user_id}: {str(e)}")
+            return {
+                "history": [],
+                "user_id": user_id,
+                "message_count": 0,
+                "status": "success",
+                "error": f"Failed to fetch history: {str(e)}"
+            }
+
+    async def save_message_async(self, user_id: str, content: str, role: str,
+                                 emotional_state: str = "neutral", tokens_used: int = 0) -> bool:
+        """
+        Save chat message to MongoDB (async)
+        Queued on the shared write-behind queue like save_message; written directly when it is unavailable
+
+        Returns:
+            bool: True if saved successfully, False otherwise
+        """
+        try:
+            db = get_async_db()
+            session, _ = await self.sessions.get_active_session_async(db, user_id)
+            chat_msg = ChatMessage(
+                user_id=user_id,
+                content=content,
+                role=role,
+                emotional_state=emotional_state,
+                tokens_used=tokens_used,
+                session_id=session.session_id if session is not None else None
+            )
+            message_doc = chat_msg.to_dict()
+            user_update = self._build_user_update(role, emotional_state)
+            # 与同步路径共用批量写入队列；未启用或队列已满时直接写入
+            saved = self.write_behind.enqueue(message_doc, user_id, user_update)
+            if not saved:
+                with metrics.time_mongo("save_message"):
+                    result = await db.chat_messages.insert_one(message_doc)
+                    await db.users.update_one(
+                        {"user_id": user_id},
+                        {"$set": user_update},
+                        upsert=True
+                    )
+                    session_updates = session_counter_updates([message_doc])
+                    if session_updates:
+                        await db[SESSION_COLLECTION].bulk_write(session_updates)
+                saved = result.inserted_id is not None
+            if session is not None:
+                self.sessions.note_message(session, tokens_used, chat_msg.timestamp)
+            self.context_cache.append_message(user_id, role, content, emotional_state)
+            return saved
+
+        except Exception as e:
+            print(f"Error saving message for user {user_id}: {str(e)}")
+            self.context_cache.invalidate(user_id)
+            return False
+
+    async def get_user_profile_async(self, user_id: str) -> Dict[str, Any]:
+        """
+        Get user profile from MongoDB (async)
+
+        Returns:
+            Dict containing user profile data
+        """
+        try:
+            cached_profile = self.context_cache.get_profile(user_id)
+            if cached_profile is not None:
+                return cached_profile
+
+            db = get_async_db()
+            with metrics.time_mongo("get_user_profile"):
+                user_data = await db.users.find_one({"user_id": user_id})
+            profile = self._profile_from_user_doc(user_data)
+            self.context_cache.set_profile(user_id, profile)
+            return profile
+
+        except Exception as e:
+            print(f"Error fetching user profile for user {user_id}: {str(e)}")
+            return {
+                "persona_profile": {},
+                "persona_preferences": {},
+                "emotional_state": "neutral",
+                "status": "error",
+                "error": f"Failed to fetch profile: {str(e)}"
+            }
+
+    async def process_message_stream_async(self, message: str, conversation_history: list = None,
+                                           user_profile: Dict = None, user_id: str = None,
+                                           user_emotional_history: str = "neutral",
+                                           conversation_summary: str = None) -> AsyncGenerator[str, None]:
+        """
+        处理用户消息，异步生成AI流式回复
+
+        与同步版本不同，调用方已经读取过用户画像，这里直接传入历史情绪状态和对话摘要，避免重复查询
+        """
+        emotional_state = self._analyze_emotion(message)
+        messages = self._build_messages(message, conversation_history, user_profile,
+                                        emotional_state, user_emotional_history,
+                                        conversation_summary)
+
+        if user_id:
+            await self.save_message_async(user_id, message, "user", emotional_state)
+
+        try:
+            full_response = ""
+            usage = {}
+            async for chunk in self.async_openai_service.chat_stream_async(messages, user_id=user_id,
+                                                                           endpoint="chat.message", usage=usage):
+                if chunk:
+                    full_response += chunk
+                    yield chunk
+
+            if user_id and full_response:
+                await self.save_message_async(user_id, full_response, "assistant", "neutral",
+                                              usage.get("total_tokens", 0))
+                self.summarizer.note_turn(user_id)
+
+        except Exception:
+            error_response = self.STREAM_ERROR_RESPONSE
+            if user_id:
+                await self.save_message_async(user_id, error_response, "assistant", "neutral")
+            yield error_response
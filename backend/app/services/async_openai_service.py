@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+异步OpenAI Azure API服务
+- 基于 httpx.AsyncClient 的非阻塞流式调用
+- 供 ASGI 入口（asgi.py）使用，空闲的流只占用一个协程而不是一个 worker 进程
+"""
+
+import asyncio
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+import httpx
+
+from ..config import Config
+from .model_router import Deployment
+from .openai_service import OpenAIService
+from .resilience import Deadline
+
+
+class AsyncOpenAIService(OpenAIService):
+    """
+    异步 Azure OpenAI 服务类
+    复用 OpenAIService 的模型配置与请求构造逻辑，只替换底层HTTP客户端
+    """
+
+    # 按部署区分的共享 AsyncClient（同一事件循环内复用 keep-alive 连接）
+    _clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _get_client(self, name: str) -> httpx.AsyncClient:
+        """获取指定部署的共享异步客户端，首次使用时创建"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=Config.AZURE_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.AZURE_HTTP_POOL_SIZE,
+                ),
+                timeout=httpx.Timeout(
+                    Config.AZURE_HTTP_READ_TIMEOUT,
+                    connect=Config.AZURE_HTTP_CONNECT_TIMEOUT,
+                ),
+            )
+            self._clients[name] = client
+        return client
+
+    @classmethod
+    async def aclose(cls):
+        """关闭所有异步客户端（在 ASGI lifespan shutdown 时调用）"""
+        clients = list(cls._clients.values())
+        cls._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    async def _post_with_retry_async(self, model: str, payload: Dict,
+                                     deadline: Deadline) -> Optional[Tuple[Deployment, httpx.Response, float]]:
+        """
+        异步发送流式请求，路由、重试与熔断规则与同步版本 _post_with_retry 相同
+
+        Returns:
+            (部署, 已收到响应头的流式响应, 首字节耗时)；调用方负责关闭响应并调用 router.release。
+            失败、熔断或超过截止时间时返回None
+        """
+        tried: List[str] = []
+        attempt = 0
+        while True:
+            attempt += 1
+            deployment = self._acquire_deployment(model, "stream", tried, deadline)
+            if deployment is None:
+                return None
+            breaker = self.router.breakers.get(deployment.name)
+
+            retry_after = None
+            connect_timeout, read_timeout = deadline.clamp(Config.AZURE_HTTP_CONNECT_TIMEOUT,
+                                                           Config.AZURE_HTTP_READ_TIMEOUT)
+            started = time.monotonic()
+            try:
+                client = self._get_client(deployment.name)
+                request = client.build_request(
+                    "POST", deployment.endpoint, headers=self._build_headers(deployment), json=payload,
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                )
+                response = await client.send(request, stream=True)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                breaker.record_failure()
+                self.router.release(deployment, None, False, "stream")
+                error = str(e) or type(e).__name__
+            except httpx.HTTPError as e:
+                breaker.release_probe()
+                self.router.release(deployment, None, True, "stream")
+                self.print_log(f"Async API request failed: {e}")
+                return None
+            else:
+                latency = time.monotonic() - started
+                action, retry_after = self._check_response(breaker, response.status_code, response.headers)
+                if action == "ok":
+                    return deployment, response, latency
+                self.router.release(deployment, latency, action == "fail", "stream")
+                body = (await response.aread())[:200].decode("utf-8", errors="replace")
+                await response.aclose()
+                error = f"HTTP {response.status_code}: {body}"
+                if action == "fail":
+                    self.print_log(f"Async API request failed: {error}")
+                    return None
+
+            tried.append(deployment.name)
+            delay = self.retry_policy.next_delay(attempt, deadline, retry_after)
+            if delay is None:
+                self.print_log(f"Async API request failed ({deployment.name}, attempt {attempt}), giving up: {error}")
+                return None
+            self.print_log(f"Async API request failed ({deployment.name}, attempt {attempt}), "
+                           f"retrying in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+
+    async def call_azure_gpt_stream_async(
+        self,
+        message_list: List[Dict],
+        temperature: float = None,
+        max_tokens: int = None,
+        model: str = None,
+        top_p: float = None,
+        deadline: Deadline = None,
+        timeout: float = None,
+        user_id: str = None,
+        endpoint: str = None,
+        usage: Dict = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        异步调用Azure GPT模型进行流式对话
+
+        Args:
+            message_list: 消息列表，格式为 [{"role": "user", "content": "消息内容"}, ...]
+            temperature: 温度参数，控制回复的随机性 (0-1)
+            max_tokens: 最大token数
+            model: 使用的模型名称
+            top_p: top_p参数
+            deadline: 截止时间，约束建立流（收到响应头）之前的所有尝试
+            timeout: 未传入 deadline 时的超时秒数，默认 AZURE_REQUEST_DEADLINE
+            user_id: 发起调用的用户（用量统计）
+            endpoint: 调用来源（用量统计）
+            usage: 传入字典时，流结束后填充本次调用的token用量
+
+        Yields:
+            str: 流式返回的文本片段
+        """
+        request = self._prepare_stream_request(message_list, temperature, max_tokens, model, top_p)
+        if request is None:
+            return
+        model, payload = request
+
+        # 只在收到响应头之前重试，开始输出后不再重试，避免重复内容
+        started = time.monotonic()
+        result = await self._post_with_retry_async(model, payload, Deadline.resolve(deadline, timeout))
+        if result is None:
+            self._record_stream_usage(message_list, model, None, started, None, [], None, False,
+                                      user_id, endpoint, usage)
+            return
+        deployment, response, latency = result
+
+        success = True
+        ttft = None
+        pieces: List[str] = []
+        stream_usage = None
+        try:
+            # 处理流式响应
+            async for line in response.aiter_lines():
+                if line:
+                    done, content, line_usage = self._parse_stream_line(line)
+                    if done:
+                        break
+                    if line_usage:
+                        stream_usage = line_usage
+                    if content is not None:
+                        if ttft is None:
+                            ttft = time.monotonic() - started
+                        pieces.append(content)
+                        yield content
+
+        except httpx.HTTPError as e:
+            # 流中断计入熔断器和路由统计的失败次数
+            success = False
+            self.router.breakers.get(deployment.name).record_failure()
+            self.print_log(f"Async API request failed: {e}")
+            return
+        except Exception as e:
+            self.print_log(f"Unknown error: {e}")
+            return
+        finally:
+            await response.aclose()
+            self.router.release(deployment, latency, success, "stream")
+            self._record_stream_usage(message_list, model, deployment, started, ttft, pieces, stream_usage,
+                                      success, user_id, endpoint, usage)
+
+    async def chat_stream_async(self, messages: List[Dict], **kwargs) -> AsyncGenerator[str, None]:
+        """
+        简化的异步流式聊天接口
+
+        Args:
+            messages: 消息列表
+            **kwargs: 其他参数
+
+        Yields:
+            str: 流式返回的文本片段
+        """
+        async for chunk in self.call_azure_gpt_stream_async(messages, **kwargs):
+            yield chunk
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+大五人格本地计分模块
+- 把问卷中的李克特量表题（如 results/results.csv 的第4-9题）按计分键映射到OCEAN五个维度，
+  反向题先反转再计分，同一维度的题目取平均，得分范围1-5
+- 计分是确定性的：相同答案总是得到相同的得分，不再由大模型推算
+- 使用NumPy向量化：整批受访者组成一个矩阵一次算完（见 score_batch）
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 与报告中的 radarLabels 顺序一致
+DIMENSIONS = ("Openness", "Conscientiousness", "Extraversion", "Agreeableness", "Neuroticism")
+
+# 量表点数：A.完全不符合 B.大部分不符合 C.有点不符合 D.有点符合 E.完全符合
+SCALE_POINTS = 5
+# 选项没有字母前缀时按文字匹配（较长的先匹配，避免 "有点符合" 命中 "有点不符合"）
+OPTION_LEVELS = (
+    ("大部分不符合", 2),
+    ("完全不符合", 1),
+    ("有点不符合", 3),
+    ("有点符合", 4),
+    ("完全符合", 5),
+)
+_OPTION_LETTER = re.compile(r"^\s*([A-Ea-e])\s*[.．、]")
+_QUESTION_NUMBER = re.compile(r"^\s*(\d+)\s*[.．、]")
+
+# 计分键：(题号, 题目关键词, 维度, 是否反向计分)
+BIG_FIVE_ITEMS = (
+    (4, "人多的聚会", "Extraversion", True),
+    (5, "不公正", "Agreeableness", True),
+    (6, "应付过去", "Conscientiousness", True),
+    (7, "新事物", "Openness", False),
+    (8, "领导者", "Extraversion", False),
+    (9, "漫不经心", "Neuroticism", False),
+)
+
+
+def parse_level(value: Any) -> Optional[float]:
+    """把一个选项（"C.有点不符合"、"有点符合" 或数字）转换为1-5的分值，无法识别时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if 1 <= value <= SCALE_POINTS else None
+    if not isinstance(value, str):
+        return None
+    match = _OPTION_LETTER.match(value)
+    if match:
+        return float("ABCDE".index(match.group(1).upper()) + 1)
+    for label, level in OPTION_LEVELS:
+        if label in value:
+            return float(level)
+    return None
+
+
+class BigFiveScorer:
+    """
+    大五人格计分器
+    计分键在初始化时展开为 题目×维度 的归属矩阵和反向题标记，
+    计分就是一次 "反转 -> 按维度求和 / 按维度计数" 的矩阵运算
+    """
+
+    def __init__(self, items: Sequence[tuple] = BIG_FIVE_ITEMS):
+        self.items = tuple(items)
+        self._by_number = {number: index for index, (number, _, _, _) in enumerate(self.items)}
+        if np is not None:
+            self._membership = np.zeros((len(self.items), len(DIMENSIONS)))
+            for index, (_, _, dimension, _) in enumerate(self.items):
+                self._membership[index, DIMENSIONS.index(dimension)] = 1.0
+            self._reverse = np.array([reverse for _, _, _, reverse in self.items], dtype=bool)
+
+    @property
+    def available(self) -> bool:
+        """未安装NumPy时不可用，调用方应回退到由大模型推算得分"""
+        return np is not None
+
+    def _match_item(self, question: Any) -> Optional[int]:
+        """按题号或题目关键词找到计分键中的题目"""
+        if isinstance(question, int):
+            return self._by_number.get(question)
+        if not isinstance(question, str):
+            return None
+        match = _QUESTION_NUMBER.match(question)
+        if match and int(match.group(1)) in self._by_number:
+            index = self._by_number[int(match.group(1))]
+            if self.items[index][1] in question:
+                return index
+        for index, (_, keyword, _, _) in enumerate(self.items):
+            if keyword in question:
+                return index
+        return None
+
+    def parse_answers(self, answers: List[Any]) -> List[float]:
+        """
+        把一个受访者的答案转换为计分向量（未作答的题目为 NaN）
+
+        Args:
+            answers: "题目：选项" 字符串列表（问卷导出格式），
+                     或 {"question" / "question_id": ..., "answer": ...} 字典列表
+
+        Returns:
+            与计分键等长的分值列表
+        """
+        row = [float("nan")] * len(self.items)
+        for answer in answers or []:
+            if isinstance(answer, dict):
+                question = answer.get("question", answer.get("question_id"))
+                value = answer.get("answer")
+            elif isinstance(answer, str):
+                question, separator, value = answer.replace(":", "：").rpartition("：")
+                if not separator:
+                    continue
+            else:
+                continue
+            index = self._match_item(question)
+            level = parse_level(value) if index is not None else None
+            if level is not None:
+                row[index] = level
+        return row
+
+    def score_matrix(self, responses):
+        """
+        对分值矩阵计分
+
+        Args:
+            responses: 受访者×题目 的矩阵，未作答为 NaN
+
+        Returns:
+            受访者×维度 的得分矩阵，维度没有任何作答时为 NaN
+        """
+        responses = np.asarray(responses, dtype=float).reshape(-1, len(self.items))
+        keyed = np.where(self._reverse, SCALE_POINTS + 1 - responses, responses)
+        answered = ~np.isnan(keyed)
+        totals = np.where(answered, keyed, 0.0) @ self._membership
+        counts = answered.astype(float) @ self._membership
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def score_batch(self, answer_lists: List[List[Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量计分（整批受访者一次矩阵运算）
+
+        Returns:
+            与输入等长的列表，元素为 {"radarLabels", "radarData", "itemsAnswered"}；
+            有维度没有任何作答时为 None
+        """
+        if not answer_lists:
+            return []
+        rows = [self.parse_answers(answers) for answers in answer_lists]
+        scores = self.score_matrix(rows)
+        answered = (~np.isnan(np.asarray(rows))).sum(axis=1)
+        results: List[Optional[Dict[str, Any]]] = []
+        for row_scores, count in zip(scores, answered):
+            if np.isnan(row_scores).any():
+                results.append(None)
+                continue
+            results.append({
+                "radarLabels": list(DIMENSIONS),
+                "radarData": [round(float(score), 2) for score in row_scores],
+                "itemsAnswered": int(count),
+            })
+        return results
+
+    def score_answers(self, answers: List[Any]) -> Optional[Dict[str, Any]]:
+        """为一个受访者计分；未安装NumPy或有维度缺少作答时返回 None"""
+        if not self.available:
+            return None
+        return self.score_batch([answers])[0]
+
+
+# 进程级共享的计分器
+big_five_scorer = BigFiveScorer()
@@ -5,12 +5,26 @@
 - 支持念念AI人设
 """
 
-from typing import Generator, Dict, Any, Optional
+from typing import Generator, Dict, Any, Optional, Tuple
 from .openai_service import OpenAIService
+from .context_cache import conversation_context_cache
+from .write_behind import message_write_behind
+from .context_builder import ContextWindow, ContextWindowBuilder
+from .summary_service import SUMMARY_COVERAGE_PROJECTION, conversation_summarizer, summarized_until
+from .emotion_analyzer import emotion_analyzer
+from .prompt_templates import prompt_template_cache
+from .metrics import metrics
+from .content_codec import decode_content
+from .message_archive import message_archiver
+from .session_manager import SESSION_COLLECTION, session_counter_updates, session_manager
+from ..models.chat import HISTORY_PROJECTION, ChatSession, openai_messages_from_docs
 from ..config.persona_config import XinErPersona
+import base64
 import random
 import re
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
 
 class ChatService:
     """
@@ -19,59 +33,68 @@ class ChatService:
     支持为欣儿定制的AI人设的情感陪伴功能
     """
     
+    # 流式对话出错时的兜底回复
+    STREAM_ERROR_RESPONSE = "抱歉，我现在有点不舒服，可能需要休息一下...不过不用担心，我很快就会好起来的～"
+    
+    # 分页历史接口：每页最大条数，以及可通过 fields 追加返回的字段
+    HISTORY_PAGE_MAX = 100
+    HISTORY_OPTIONAL_FIELDS = ("emotional_state", "tokens_used")
+    
     def __init__(self):
         self.openai_service = OpenAIService()
         self.persona = XinErPersona()
+        self.emotion_analyzer = emotion_analyzer
+        # 进程级共享的系统提示词模板缓存
+        self.prompt_templates = prompt_template_cache
+        # 进程级共享的会话上下文缓存（最近历史 + 用户画像）
+        self.context_cache = conversation_context_cache
+        # 进程级共享的消息批量写入队列
+        self.write_behind = message_write_behind
+        # 按token预算裁剪历史消息
+        self.context_builder = ContextWindowBuilder()
+        # 后台滚动摘要，较早的对话以摘要形式进入上下文
+        self.summarizer = conversation_summarizer
+        # 进程级共享的会话管理器，上下文为当前会话加上摘要尚未覆盖的消息
+        self.sessions = session_manager
     
     def _analyze_emotion(self, message: str) -> str:
-        """简单的情绪分析"""
-        sad_keywords = ["难过", "伤心", "痛苦", "失落", "沮丧", "哭", "眼泪"]
-        anxious_keywords = ["焦虑", "紧张", "担心", "害怕", "不安", "压力"]
-        happy_keywords = ["开心", "高兴", "快乐", "兴奋", "愉快", "满足"]
-        lonely_keywords = ["孤独", "寂寞", "一个人", "没人", "独自", "空虚"]
-        
-        message_lower = message.lower()
-        
-        if any(keyword in message_lower for keyword in sad_keywords):
-            return "sad"
-        elif any(keyword in message_lower for keyword in anxious_keywords):
-            return "anxious"
-        elif any(keyword in message_lower for keyword in happy_keywords):
-            return "happy"
-        elif any(keyword in message_lower for keyword in lonely_keywords):
-            return "lonely"
-        else:
-            return "neutral"
+        """情绪分析，返回得分最高的情绪标签"""
+        return self.emotion_analyzer.classify(message)
     
     def _build_personalized_system_prompt(self, user_profile: Dict = None, emotional_state: str = "neutral", user_emotional_history: str = "neutral") -> str:
-        """构建个性化的系统提示词"""
-        base_prompt = self.persona.SYSTEM_PROMPT
-        
-        # 根据用户画像调整提示词
-        if user_profile:
-            profile_context = "\n\n## 用户信息：\n"
-            if user_profile.get("age_range"):
-                profile_context += f"- 年龄段: {user_profile['age_range']}\n"
-            if user_profile.get("personality"):
-                profile_context += f"- 性格特点: {user_profile['personality']}\n"
-            if user_profile.get("communication_style"):
-                profile_context += f"- 沟通偏好: {user_profile['communication_style']}\n"
-            if user_profile.get("interests"):
-                profile_context += f"- 兴趣爱好: {user_profile['interests']}\n"
-            
-            base_prompt += profile_context
+        """构建个性化的系统提示词（使用预编译模板，渲染结果按画像和情绪缓存）"""
+        return self.prompt_templates.render(self.persona, user_profile, emotional_state, user_emotional_history)
+    
+    def _build_context(self, message: str, conversation_history: list = None,
+                       user_profile: Dict = None, emotional_state: str = "neutral",
+                       user_emotional_history: str = "neutral",
+                       conversation_summary: str = None) -> ContextWindow:
+        """构建发送给模型的上下文窗口（同步与异步路径共用）"""
+        # 添加个性化系统消息
+        system_message = self._build_personalized_system_prompt(user_profile, emotional_state, user_emotional_history)
+        system_messages = [{"role": "system", "content": system_message}]
         
-        # 根据情绪状态调整回应方式
-        if emotional_state != "neutral":
-            emotion_context = f"\n\n## 当前用户情绪状态: {emotional_state}\n请特别关注用户的情绪，给予相应的情感支持和理解。"
-            base_prompt += emotion_context
+        # 较早的对话以摘要形式提供，放在系统提示词之后
+        if conversation_summary:
+            system_messages.append({
+                "role": "system",
+                "content": f"## 你们之前聊天的摘要（供你回忆，不要直接复述）：\n{conversation_summary}"
+            })
         
-        # 如果用户历史情绪状态与当前不同，提供连续性关怀
-        if user_emotional_history != "neutral" and user_emotional_history != emotional_state:
-            continuity_context = f"\n\n## 情绪变化提醒: 用户之前的情绪状态是{user_emotional_history}，现在是{emotional_state}，请关注这种变化并给予适当的关怀。"
-            base_prompt += continuity_context
-            
-        return base_prompt
+        # 在token预算内添加历史对话和当前用户消息
+        context = self.context_builder.build(system_messages, conversation_history or [], message)
+        if context.history_dropped or context.history_truncated:
+            print(f"Context window trimmed: {context.to_dict()}")
+        return context
+    
+    def _build_messages(self, message: str, conversation_history: list = None,
+                        user_profile: Dict = None, emotional_state: str = "neutral",
+                        user_emotional_history: str = "neutral",
+                        conversation_summary: str = None) -> list:
+        """构建发送给模型的消息列表"""
+        return self._build_context(message, conversation_history, user_profile,
+                                   emotional_state, user_emotional_history,
+                                   conversation_summary).messages
     
     def process_message_stream(self, message: str, conversation_history: list = None, 
                              user_profile: Dict = None, user_id: str = None) -> Generator[str, None, None]:
@@ -79,25 +102,18 @@ class ChatService:
         # 分析用户情绪
         emotional_state = self._analyze_emotion(message)
         
-        # 获取用户历史情绪状态
+        # 获取用户历史情绪状态和对话摘要
         user_emotional_history = "neutral"
+        conversation_summary = None
         if user_id:
             profile_result = self.get_user_profile(user_id)
             user_emotional_history = profile_result.get("emotional_state", "neutral")
+            conversation_summary = profile_result.get("conversation_summary")
         
         # 构建消息列表
-        messages = []
-        
-        # 添加个性化系统消息
-        system_message = self._build_personalized_system_prompt(user_profile, emotional_state, user_emotional_history)
-        messages.append({"role": "system", "content": system_message})
-        
-        # 添加历史对话（如果有）
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # 添加当前用户消息
-        messages.append({"role": "user", "content": message})
+        messages = self._build_messages(message, conversation_history, user_profile,
+                                        emotional_state, user_emotional_history,
+                                        conversation_summary)
         
         # 保存用户消息到数据库
         if user_id:
@@ -106,18 +122,21 @@ class ChatService:
         # 调用OpenAI服务进行流式对话
         try:
             full_response = ""
-            for chunk in self.openai_service.chat_stream(messages):
+            usage = {}
+            for chunk in self.openai_service.chat_stream(messages, user_id=user_id, endpoint="chat.message",
+                                                         usage=usage):
                 if chunk:
                     full_response += chunk
                     yield chunk
             
-            # 保存完整的AI回复到数据库
+            # 保存完整的AI回复到数据库（token数来自流中的usage或本地计数）
             if user_id and full_response:
-                self.save_message(user_id, full_response, "assistant", "neutral")
+                self.save_message(user_id, full_response, "assistant", "neutral", usage.get("total_tokens", 0))
+                self.summarizer.note_turn(user_id)
                 
         except Exception as e:
             # 提供温暖的错误回应
-            error_response = "抱歉，我现在有点不舒服，可能需要休息一下...不过不用担心，我很快就会好起来的～"
+            error_response = self.STREAM_ERROR_RESPONSE
             if user_id:
                 self.save_message(user_id, error_response, "assistant", "neutral")
             yield error_response
@@ -136,26 +155,22 @@ class ChatService:
             # 分析用户情绪
             emotional_state = self._analyze_emotion(message)
             
-            # 获取用户历史情绪状态
+            # 获取用户历史情绪状态和对话摘要
             user_emotional_history = "neutral"
+            conversation_summary = None
             if user_id:
                 profile_result = self.get_user_profile(user_id)
                 user_emotional_history = profile_result.get("emotional_state", "neutral")
+                conversation_summary = profile_result.get("conversation_summary")
             
             # 构建消息列表
-            messages = []
-            system_message = self._build_personalized_system_prompt(user_profile, emotional_state, user_emotional_history)
-            messages.append({"role": "system", "content": system_message})
-            
-            # 添加历史对话
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # 添加当前用户消息
-            messages.append({"role": "user", "content": message})
+            context = self._build_context(message, conversation_history, user_profile,
+                                          emotional_state, user_emotional_history,
+                                          conversation_summary)
             
             # 调用OpenAI服务
-            response, tokens = self.openai_service.chat(messages)
+            response, tokens = self.openai_service.chat(context.messages, user_id=user_id,
+                                                        endpoint="chat.message_sync")
             
             if response:
                 # 保存用户消息到数据库
@@ -163,10 +178,12 @@ class ChatService:
                     self.save_message(user_id, message, "user", emotional_state)
                     # 保存AI回复到数据库
                     self.save_message(user_id, response, "assistant", "neutral", tokens)
+                    self.summarizer.note_turn(user_id)
                 
                 return {
                     "response": response,
                     "tokens_used": tokens,
+                    "context_tokens": context.tokens_used,
                     "emotional_state": emotional_state,
                     "persona": self.persona.NAME,
                     "status": "success"
@@ -212,26 +229,40 @@ class ChatService:
         """
         try:
             from ..extensions import mongo
-            from ..models.chat import ChatMessage
-            
-            # Query messages from MongoDB, sorted by timestamp (newest first)
-            messages_cursor = mongo.db.chat_messages.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(limit)
             
-            # Convert to list and reverse to get chronological order
-            messages_data = list(messages_cursor)
-            messages_data.reverse()  # Oldest first for conversation context
+            # Resolve the active session; after the idle timeout this starts a new session
+            session, created = self.sessions.get_active_session(user_id)
+            if created:
+                self.context_cache.invalidate(user_id)
+                # Fold the closed session into the rolling summary in the background
+                self.summarizer.note_session_closed(user_id)
             
-            # Convert to OpenAI format for API consumption
-            conversation_history = []
-            for msg_data in messages_data:
-                chat_msg = ChatMessage.from_dict(msg_data)
-                conversation_history.append(chat_msg.to_openai_format())
+            # Serve from the in-process context cache when possible
+            conversation_history = self.context_cache.get_history(user_id, limit)
+            if conversation_history is None:
+                # Make sure queued writes for this user are visible before reading
+                if self.write_behind.has_pending(user_id):
+                    self.write_behind.flush()
+                
+                # Load the full cache window so later turns can be served from memory
+                fetch_limit = max(limit, self.context_cache.history_size)
+                
+                # Query messages from MongoDB, sorted by timestamp (newest first)
+                with metrics.time_mongo("get_history"):
+                    user_doc = mongo.db.users.find_one({"user_id": user_id}, SUMMARY_COVERAGE_PROJECTION)
+                    messages_data = list(mongo.db.chat_messages.find(
+                        self._history_query(user_id, session, summarized_until(user_doc)), HISTORY_PROJECTION
+                    ).sort("timestamp", -1).limit(fetch_limit))
+                
+                conversation_history = self._history_from_docs(messages_data)
+                if fetch_limit == self.context_cache.history_size:
+                    self.context_cache.set_history(user_id, conversation_history)
+                conversation_history = conversation_history[-limit:] if limit else []
             
             return {
                 "history": conversation_history,
                 "user_id": user_id,
+                "session_id": session.session_id if session is not None else None,
                 "message_count": len(conversation_history),
                 "status": "success"
             }
@@ -247,6 +278,142 @@ class ChatService:
                 "error": f"Failed to fetch history: {str(e)}"
             }
     
+    # 游标中 ObjectId 类型 _id 的前缀（chat_messages 的 _id 通常是字符串，见 ChatMessage）
+    CURSOR_OBJECTID_PREFIX = "$oid:"
+    
+    @classmethod
+    def encode_history_cursor(cls, timestamp: datetime, message_id: Any) -> str:
+        """把消息的 (timestamp, _id) 编码为不透明的分页游标，保留 _id 的类型"""
+        if isinstance(message_id, ObjectId):
+            message_id = f"{cls.CURSOR_OBJECTID_PREFIX}{message_id}"
+        raw = f"{timestamp.isoformat()}|{message_id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+    
+    @classmethod
+    def decode_history_cursor(cls, cursor: str) -> Tuple[datetime, Any]:
+        """
+        解析分页游标
+        _id 按编码时的类型还原：MongoDB 不跨类型比较，字符串 _id 必须按字符串比较
+        
+        Raises:
+            ValueError: 游标格式不正确
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+            timestamp, message_id = raw.split("|", 1)
+            if message_id.startswith(cls.CURSOR_OBJECTID_PREFIX):
+                message_id = ObjectId(message_id[len(cls.CURSOR_OBJECTID_PREFIX):])
+            return datetime.fromisoformat(timestamp), message_id
+        except (ValueError, UnicodeDecodeError, InvalidId) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    def get_history_page(self, user_id: str, limit: int = 20, before: str = None, after: str = None,
+                         fields: Tuple[str, ...] = (), session_id: str = None) -> Dict[str, Any]:
+        """
+        按 (timestamp, _id) 键集分页查询聊天历史
+        只读取需要的字段（投影），翻页时不使用 skip，越往前翻开销不变
+        
+        Args:
+            user_id: 用户ID
+            limit: 每页条数（最大 HISTORY_PAGE_MAX）
+            before: 游标，返回比它更早的消息
+            after: 游标，返回比它更新的消息（用于拉取新消息）
+            fields: 额外返回的字段（见 HISTORY_OPTIONAL_FIELDS）
+            session_id: 只查询该会话的消息（默认查询用户的全部消息）
+            
+        Returns:
+            Dict: {"messages": 按时间正序的消息 [{"id", "role", "content", "timestamp", ...}],
+                   "older_cursor": 更早一页的游标（没有更早的消息时为 None），
+                   "newer_cursor": 拉取更新消息的游标（没有任何消息时为 None），
+                   "has_more": 请求方向上是否还有下一页}
+            
+        Raises:
+            ValueError: 同时传入 before 和 after，或游标格式不正确
+        """
+        from ..extensions import mongo
+        
+        if before and after:
+            raise ValueError("before and after cannot be used together")
+        limit = max(1, min(int(limit), self.HISTORY_PAGE_MAX))
+        projection = {"role": 1, "content": 1, "timestamp": 1}
+        projection.update({field: 1 for field in fields if field in self.HISTORY_OPTIONAL_FIELDS})
+        
+        query: Dict[str, Any] = {"user_id": user_id}
+        if session_id:
+            query["session_id"] = session_id
+        cursor = before or after
+        if cursor:
+            timestamp, message_id = self.decode_history_cursor(cursor)
+            op = "$gt" if after else "$lt"
+            query["$or"] = [
+                {"timestamp": {op: timestamp}},
+                {"timestamp": timestamp, "_id": {op: message_id}},
+            ]
+        # 向后翻页按时间倒序取，拉取新消息按时间正序取；多取一条判断是否还有下一页
+        direction = 1 if after else -1
+        
+        # 确保本用户排队中的消息已写入
+        if self.write_behind.has_pending(user_id):
+            self.write_behind.flush()
+        with metrics.time_mongo("get_history_page"):
+            docs = list(mongo.db.chat_messages.find(query, projection)
+                        .sort([("timestamp", direction), ("_id", direction)])
+                        .limit(limit + 1))
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        if not after:
+            docs.reverse()
+        
+        messages = []
+        for doc in docs:
+            message = {
+                "id": str(doc["_id"]),
+                "role": doc.get("role", "user"),
+                "content": decode_content(doc.get("content", "")),
+                "timestamp": doc["timestamp"],
+            }
+            for field in fields:
+                if field in doc:
+                    message[field] = doc[field]
+            messages.append(message)
+        
+        older_cursor = newer_cursor = after
+        if docs:
+            oldest, newest = docs[0], docs[-1]
+            # 拉取新消息时游标之前一定还有消息；向后翻页时由多取的一条判断
+            if after or has_more:
+                older_cursor = self.encode_history_cursor(oldest["timestamp"], oldest["_id"])
+            else:
+                older_cursor = None
+            newer_cursor = self.encode_history_cursor(newest["timestamp"], newest["_id"])
+        elif not after:
+            older_cursor = None
+        return {"messages": messages, "older_cursor": older_cursor, "newer_cursor": newer_cursor,
+                "has_more": has_more}
+    
+    @staticmethod
+    def _history_query(user_id: str, session: Optional[ChatSession],
+                       summarized_until: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Context = the active session plus every message the rolling summary does not cover yet,
+        so a closed session stays in context verbatim until it has been folded into the summary
+        """
+        if session is None or summarized_until is None:
+            return {"user_id": user_id}
+        return {"user_id": user_id, "$or": [
+            {"session_id": session.session_id},
+            {"timestamp": {"$gt": summarized_until}},
+        ]}
+    
+    @staticmethod
+    def _history_from_docs(messages_data: list) -> list:
+        """Convert newest-first chat_messages documents into chronological OpenAI messages"""
+        # Reverse to get chronological order (oldest first for conversation context)
+        messages_data.reverse()
+        
+        # Convert projected documents straight to OpenAI format, without ChatMessage objects
+        return openai_messages_from_docs(messages_data)
+    
     def save_message(self, user_id: str, content: str, role: str, 
                     emotional_state: str = "neutral", tokens_used: int = 0) -> bool:
         """
@@ -266,35 +433,78 @@ class ChatService:
             from ..extensions import mongo
             from ..models.chat import ChatMessage
             
+            session, _ = self.sessions.get_active_session(user_id)
+            
             # Create chat message object
             chat_msg = ChatMessage(
                 user_id=user_id,
                 content=content,
                 role=role,
                 emotional_state=emotional_state,
-                tokens_used=tokens_used
+                tokens_used=tokens_used,
+                session_id=session.session_id if session is not None else None
             )
             
-            # Save to MongoDB
-            result = mongo.db.chat_messages.insert_one(chat_msg.to_dict())
-            
+            message_doc = chat_msg.to_dict()
             # Update user's last active time and emotional state (for user messages)
-            update_data = {"last_active": datetime.now()}
-            if role == "user" and emotional_state != "neutral":
-                update_data["emotional_state"] = emotional_state
+            user_update = self._build_user_update(role, emotional_state)
             
-            mongo.db.users.update_one(
-                {"user_id": user_id},
-                {"$set": update_data},
-                upsert=True
-            )
+            # Queue for batched background write; fall back to synchronous writes
+            # when write-behind is disabled or the queue is full
+            saved = self.write_behind.enqueue(message_doc, user_id, user_update)
+            if not saved:
+                with metrics.time_mongo("save_message"):
+                    result = mongo.db.chat_messages.insert_one(message_doc)
+                    mongo.db.users.update_one(
+                        {"user_id": user_id},
+                        {"$set": user_update},
+                        upsert=True
+                    )
+                    session_updates = session_counter_updates([message_doc])
+                    if session_updates:
+                        mongo.db[SESSION_COLLECTION].bulk_write(session_updates)
+                saved = result.inserted_id is not None
+            if session is not None:
+                self.sessions.note_message(session, tokens_used, chat_msg.timestamp)
             
-            return result.inserted_id is not None
+            # Write-through: keep the cached context in sync with the database
+            self.context_cache.append_message(user_id, role, content, emotional_state)
+            
+            return saved
             
         except Exception as e:
             print(f"Error saving message for user {user_id}: {str(e)}")
+            self.context_cache.invalidate(user_id)
             return False
     
+    @staticmethod
+    def _build_user_update(role: str, emotional_state: str) -> Dict[str, Any]:
+        """Build the $set payload applied to the user document after a message"""
+        update_data = {"last_active": datetime.now()}
+        if role == "user" and emotional_state != "neutral":
+            update_data["emotional_state"] = emotional_state
+        return update_data
+    
+    @staticmethod
+    def _profile_from_user_doc(user_data: Optional[Dict]) -> Dict[str, Any]:
+        """Convert a users document (or None) into the profile result dict"""
+        if user_data:
+            return {
+                "persona_profile": user_data.get("persona_profile", {}),
+                "persona_preferences": user_data.get("persona_preferences", {}),
+                "emotional_state": user_data.get("emotional_state", "neutral"),
+                "conversation_summary": (user_data.get("conversation_summary") or {}).get("text", ""),
+                "status": "success"
+            }
+        # Return default profile for new users
+        return {
+            "persona_profile": {},
+            "persona_preferences": {},
+            "emotional_state": "neutral",
+            "status": "success",
+            "is_new_user": True
+        }
+    
     def get_user_profile(self, user_id: str) -> Dict[str, Any]:
         """
         Get user profile from MongoDB
@@ -308,25 +518,16 @@ class ChatService:
         try:
             from ..extensions import mongo
             
-            # Query user from MongoDB
-            user_data = mongo.db.users.find_one({"user_id": user_id})
+            cached_profile = self.context_cache.get_profile(user_id)
+            if cached_profile is not None:
+                return cached_profile
             
-            if user_data:
-                return {
-                    "persona_profile": user_data.get("persona_profile", {}),
-                    "persona_preferences": user_data.get("persona_preferences", {}),
-                    "emotional_state": user_data.get("emotional_state", "neutral"),
-                    "status": "success"
-                }
-            else:
-                # Return default profile for new users
-                return {
-                    "persona_profile": {},
-                    "persona_preferences": {},
-                    "emotional_state": "neutral",
-                    "status": "success",
-                    "is_new_user": True
-                }
+            # Query user from MongoDB
+            with metrics.time_mongo("get_user_profile"):
+                user_data = mongo.db.users.find_one({"user_id": user_id})
+            profile = self._profile_from_user_doc(user_data)
+            self.context_cache.set_profile(user_id, profile)
+            return profile
                 
         except Exception as e:
             print(f"Error fetching user profile for user {user_id}: {str(e)}")
@@ -341,6 +542,7 @@ class ChatService:
     def clear_history(self, user_id: str) -> Dict[str, Any]:
         """
         Clear user's chat history
+        Also removes the archive buckets, the chat sessions and the rolling summary built from the messages
         
         Args:
             user_id: User ID
@@ -351,11 +553,29 @@ class ChatService:
         try:
             from ..extensions import mongo
             
-            # Delete all messages for the user
+            # Write out queued messages first so they are deleted as well
+            self.write_behind.flush()
+            # Stop pending/in-flight summary jobs from writing the deleted conversation back
+            self.summarizer.forget_user(user_id)
+            
+            # Delete all messages for the user, including archived monthly buckets
             result = mongo.db.chat_messages.delete_many({"user_id": user_id})
+            archived_count = message_archiver.delete_user(user_id)
+            sessions_count = self.sessions.delete_user(user_id)
+            # The rolling summary and its interaction_history copies are derived from the deleted messages
+            mongo.db.users.update_one(
+                {"user_id": user_id},
+                {
+                    "$unset": {"conversation_summary": ""},
+                    "$pull": {"interaction_history": {"summary": {"$exists": True}}},
+                }
+            )
+            self.context_cache.invalidate(user_id)
             
             return {
                 "deleted_count": result.deleted_count,
+                "archived_buckets_deleted": archived_count,
+                "sessions_deleted": sessions_count,
                 "user_id": user_id,
                 "status": "success"
             }
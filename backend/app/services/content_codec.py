@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+消息内容编解码模块
+- CONTENT_CODEC_ENABLED=true 时，chat_messages 的 content 超过 CONTENT_CODEC_MIN_BYTES 字节的写入前用 zstd 压缩，
+  存为带版本头的二进制；较短的内容和未启用时仍存为字符串
+- 可使用在自己的聊天语料上训练的字典（scripts/train_content_dict.py），短小的中文消息压缩率明显更高
+- 读取时 decode 对字符串原样返回、对二进制按头部选择解压方式，新旧数据可以混存，关闭压缩后旧数据仍可读取
+- 未安装 zstandard 时不压缩；读取已压缩的内容则需要安装
+
+二进制格式（BSON 自定义子类型 0x80）：
+    [版本 1字节][方法 1字节][字典ID 4字节，大端，无字典为0][zstd 帧]
+"""
+
+import os
+import struct
+import threading
+from typing import Any, Dict, Optional
+
+import bson
+
+from ..config import Config
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
+CODEC_VERSION = 1
+METHOD_ZSTD = 1
+METHOD_ZSTD_DICT = 2
+BINARY_SUBTYPE = 0x80
+HEADER = struct.Struct(">BBI")
+# 字典文件命名为 <字典ID>.zdict
+DICT_SUFFIX = ".zdict"
+
+
+class ContentCodec:
+    """
+    消息内容编解码器
+    字典在首次使用时从 CONTENT_CODEC_DICT_DIR 加载：目录中的所有字典都可用于解压，
+    CONTENT_CODEC_DICT_ID 指定的字典用于压缩（未指定时不使用字典）
+    zstd 的压缩/解压对象不是线程安全的，按线程缓存
+    """
+
+    def __init__(self, enabled: bool = None, level: int = None, min_bytes: int = None,
+                 dict_dir: str = None, dict_id: int = None):
+        enabled = Config.CONTENT_CODEC_ENABLED if enabled is None else enabled
+        self.enabled = enabled and zstandard is not None
+        self.level = level if level is not None else Config.CONTENT_CODEC_LEVEL
+        self.min_bytes = min_bytes if min_bytes is not None else Config.CONTENT_CODEC_MIN_BYTES
+        self.dict_dir = dict_dir if dict_dir is not None else Config.CONTENT_CODEC_DICT_DIR
+        self.dict_id = dict_id if dict_id is not None else Config.CONTENT_CODEC_DICT_ID
+        self._dicts: Optional[Dict[int, Any]] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def dictionaries(self) -> Dict[int, Any]:
+        """已加载的字典 {字典ID: ZstdCompressionDict}"""
+        if self._dicts is None:
+            with self._lock:
+                if self._dicts is None:
+                    self._dicts = self._load_dictionaries()
+        return self._dicts
+
+    def _load_dictionaries(self) -> Dict[int, Any]:
+        dicts = {}
+        if zstandard is None or not self.dict_dir or not os.path.isdir(self.dict_dir):
+            return dicts
+        for filename in sorted(os.listdir(self.dict_dir)):
+            if not filename.endswith(DICT_SUFFIX):
+                continue
+            with open(os.path.join(self.dict_dir, filename), "rb") as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            dicts[dictionary.dict_id()] = dictionary
+        if self.dict_id and self.dict_id not in dicts:
+            print(f"[ContentCodec] Dictionary {self.dict_id} not found in {self.dict_dir}, compressing without it")
+        return dicts
+
+    def add_dictionary(self, data: bytes) -> int:
+        """注册一个字典（训练脚本和性能测试使用），返回字典ID"""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        with self._lock:
+            dicts = dict(self._dicts if self._dicts is not None else self._load_dictionaries())
+            dicts[dictionary.dict_id()] = dictionary
+            self._dicts = dicts
+        # 丢弃各线程缓存的压缩器，下次使用时按新字典创建
+        self._local = threading.local()
+        return dictionary.dict_id()
+
+    def _compressor(self):
+        """当前线程的压缩器，返回 (压缩器, 方法, 字典ID)"""
+        cached = getattr(self._local, "compressor", None)
+        if cached is None:
+            dictionary = self.dictionaries.get(self.dict_id) if self.dict_id else None
+            if dictionary is not None:
+                cached = (zstandard.ZstdCompressor(level=self.level, dict_data=dictionary,
+                                                   write_content_size=True, write_checksum=False),
+                          METHOD_ZSTD_DICT, self.dict_id)
+            else:
+                cached = (zstandard.ZstdCompressor(level=self.level, write_content_size=True),
+                          METHOD_ZSTD, 0)
+            self._local.compressor = cached
+        return cached
+
+    def _decompressor(self, dict_id: int):
+        """当前线程使用指定字典的解压器"""
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id:
+                dictionary = self.dictionaries.get(dict_id)
+                if dictionary is None:
+                    raise ValueError(f"Content dictionary {dict_id} is not available")
+                decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            else:
+                decompressor = zstandard.ZstdDecompressor()
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def encode(self, content: str) -> Any:
+        """
+        写入前编码消息内容
+
+        Returns:
+            未启用、内容过短或压缩后没有变小时返回原字符串，否则返回带版本头的 bson.Binary
+        """
+        if not self.enabled or not isinstance(content, str):
+            return content
+        raw = content.encode("utf-8")
+        if len(raw) < self.min_bytes:
+            return content
+        compressor, method, dict_id = self._compressor()
+        data = HEADER.pack(CODEC_VERSION, method, dict_id) + compressor.compress(raw)
+        if len(data) >= len(raw):
+            return content
+        return bson.Binary(data, BINARY_SUBTYPE)
+
+    def decode(self, value: Any) -> str:
+        """
+        读取时解码消息内容（字符串原样返回）
+
+        Raises:
+            ValueError: 版本或方法未知、所需字典不存在
+            RuntimeError: 内容已压缩但未安装 zstandard
+        """
+        if value is None or isinstance(value, str):
+            return value
+        data = memoryview(value)
+        version, method, dict_id = HEADER.unpack_from(data)
+        if version != CODEC_VERSION or method not in (METHOD_ZSTD, METHOD_ZSTD_DICT):
+            raise ValueError(f"Unknown content codec header: version={version} method={method}")
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed message content")
+        return self._decompressor(dict_id).decompress(data[HEADER.size:]).decode("utf-8")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "min_bytes": self.min_bytes,
+            "dict_id": self.dict_id or None,
+            "dictionaries": sorted(self.dictionaries),
+        }
+
+
+def decode_content(value: Any) -> str:
+    """解码 chat_messages 文档中的 content 字段（读取路径统一使用）"""
+    return content_codec.decode(value)
+
+
+# 进程级共享的编解码器
+content_codec = ContentCodec()
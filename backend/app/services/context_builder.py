@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+上下文窗口构建模块
+- 在本地估算token数，按配置的token预算从最新到最旧填充历史消息
+- 过长的单条消息会被截断，放不下的更早消息会被丢弃
+- 已安装 tiktoken 时使用精确计数，否则使用针对中英文混合文本的近似估算
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..config import Config
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖
+    tiktoken = None
+
+
+# 每条消息在 chat 格式中的固定开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 整个请求的固定开销（assistant 回复的起始标记）
+REPLY_PRIMING_TOKENS = 3
+TRUNCATION_MARKER = "…"
+
+
+class TokenCounter:
+    """
+    token计数器
+    优先使用 tiktoken；不可用时按字符类别估算：
+    CJK字符和emoji约1个token，其余字符约4个字符1个token
+    """
+
+    def __init__(self, encoding_name: str = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding_name or Config.TOKEN_ENCODING)
+            except Exception as e:
+                print(f"[TokenCounter] Failed to load tiktoken encoding, falling back to estimation: {str(e)}")
+
+    @staticmethod
+    def _char_cost(ch: str) -> float:
+        """单个字符的估算token开销"""
+        return 1.0 if ord(ch) >= 0x2E80 else 0.25
+
+    def count(self, text: str) -> int:
+        """统计文本的token数"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        narrow_chars = sum(1 for ch in text if ord(ch) < 0x2E80)
+        return int((len(text) - narrow_chars) + narrow_chars / 4 + 0.999)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """把文本截断到不超过 max_tokens 个token（保留开头部分）"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        budget = max_tokens - 1  # 为截断标记预留
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:budget]) + TRUNCATION_MARKER
+        cost = 0.0
+        for index, ch in enumerate(text):
+            cost += self._char_cost(ch)
+            if cost > budget:
+                return text[:index] + TRUNCATION_MARKER
+        return text
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        """统计一条chat消息的token数（含固定开销）"""
+        return self.count(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """上下文构建结果"""
+
+    def __init__(self, messages: List[Dict[str, str]], tokens_used: int, token_budget: int,
+                 history_included: int, history_dropped: int, history_truncated: int):
+        self.messages = messages
+        self.tokens_used = tokens_used
+        self.token_budget = token_budget
+        self.history_included = history_included
+        self.history_dropped = history_dropped
+        self.history_truncated = history_truncated
+
+    def to_dict(self) -> Dict[str, int]:
+        """返回统计信息（不含消息内容）"""
+        return {
+            "tokens_used": self.tokens_used,
+            "token_budget": self.token_budget,
+            "history_included": self.history_included,
+            "history_dropped": self.history_dropped,
+            "history_truncated": self.history_truncated,
+        }
+
+
+class ContextWindowBuilder:
+    """
+    上下文窗口构建器
+    系统消息和当前用户消息总是保留，剩余预算从最新的历史消息开始向前填充
+    """
+
+    def __init__(self, token_budget: int = None, max_message_tokens: int = None,
+                 counter: Optional[TokenCounter] = None, system_cache_size: int = None):
+        self.token_budget = token_budget if token_budget is not None else Config.CHAT_CONTEXT_TOKEN_BUDGET
+        self.max_message_tokens = max_message_tokens if max_message_tokens is not None else Config.CHAT_CONTEXT_MAX_MESSAGE_TOKENS
+        self.counter = counter or TokenCounter()
+        # 系统提示词来自模板缓存，取值有限，缓存其token数避免每轮重新计数
+        self.system_cache_size = system_cache_size if system_cache_size is not None else Config.PROMPT_CACHE_SIZE
+        self._system_tokens: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count_system_message(self, message: Dict[str, str]) -> int:
+        """统计系统消息的token数，结果按内容缓存"""
+        content = message.get("content") or ""
+        if self.system_cache_size <= 0:
+            return self.counter.count_message(message)
+        with self._lock:
+            tokens = self._system_tokens.get(content)
+            if tokens is not None:
+                self._system_tokens.move_to_end(content)
+                return tokens
+        tokens = self.counter.count_message(message)
+        with self._lock:
+            self._system_tokens[content] = tokens
+            while len(self._system_tokens) > self.system_cache_size:
+                self._system_tokens.popitem(last=False)
+        return tokens
+
+    def build(self, system_messages: List[Dict[str, str]], history: List[Dict[str, str]],
+              message: str) -> ContextWindow:
+        """
+        构建发送给模型的消息列表
+
+        Args:
+            system_messages: 系统消息（不参与裁剪）
+            history: 按时间正序的历史消息
+            message: 当前用户消息
+
+        Returns:
+            ContextWindow: 消息列表及token使用统计
+        """
+        current = {"role": "user", "content": message}
+        used = REPLY_PRIMING_TOKENS + self.counter.count_message(current)
+        used += sum(self.count_system_message(item) for item in system_messages)
+
+        selected = []
+        truncated = 0
+        history = history or []
+        for item in reversed(history):
+            tokens = self.counter.count_message(item)
+            is_truncated = tokens - MESSAGE_OVERHEAD_TOKENS > self.max_message_tokens
+            if is_truncated:
+                item = {"role": item["role"], "content": self.counter.truncate(item.get("content") or "", self.max_message_tokens)}
+                tokens = self.counter.count_message(item)
+            if used + tokens > self.token_budget:
+                # 放不下时停止填充，避免历史中间出现断档
+                break
+            selected.append(item)
+            used += tokens
+            truncated += is_truncated
+
+        selected.reverse()
+        messages = list(system_messages) + selected + [current]
+        return ContextWindow(
+            messages=messages,
+            tokens_used=used,
+            token_budget=self.token_budget,
+            history_included=len(selected),
+            history_dropped=len(history) - len(selected),
+            history_truncated=truncated,
+        )
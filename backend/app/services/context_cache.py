@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+会话上下文缓存模块
+- 按 user_id 缓存最近N条聊天记录和用户画像，避免每轮对话重复查询MongoDB
+- save_message 写入成功后直接更新缓存（write-through）
+- LRU + TTL 淘汰，并限制缓存的用户数量
+
+注意：缓存是进程内的，gunicorn 多个 worker 之间互不共享，
+TTL 用于限制同一用户请求落到不同 worker 时看到旧数据的时间窗口
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+
+
+class ConversationContext:
+    """单个用户的缓存上下文"""
+
+    def __init__(self, history_size: int, expires_at: float):
+        self.history = None  # deque，None 表示历史尚未加载
+        self.history_size = history_size
+        self.profile = None  # 用户画像结果，None 表示尚未加载
+        self.expires_at = expires_at
+
+
+class ConversationContextCache:
+    """
+    会话上下文缓存
+    线程安全，同一进程内的同步与异步聊天服务共用一个实例
+    """
+
+    def __init__(self, max_users: int = None, ttl: float = None,
+                 history_size: int = None, enabled: bool = None):
+        self.max_users = max_users if max_users is not None else Config.CONTEXT_CACHE_MAX_USERS
+        self.ttl = ttl if ttl is not None else Config.CONTEXT_CACHE_TTL
+        self.history_size = history_size if history_size is not None else Config.CONTEXT_CACHE_HISTORY_SIZE
+        self.enabled = enabled if enabled is not None else Config.CONTEXT_CACHE_ENABLED
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_entry(self, user_id: str) -> Optional[ConversationContext]:
+        """获取未过期的缓存条目并标记为最近使用（调用方需持有锁）"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _get_or_create_entry(self, user_id: str) -> ConversationContext:
+        """获取或创建缓存条目，超出容量时淘汰最久未使用的用户（调用方需持有锁）"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            entry = ConversationContext(self.history_size, time.monotonic() + self.ttl)
+            self._entries[user_id] = entry
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get_history(self, user_id: str, limit: int) -> Optional[List[Dict[str, str]]]:
+        """
+        获取缓存的聊天历史
+
+        Args:
+            user_id: 用户ID
+            limit: 需要的最大消息条数
+
+        Returns:
+            按时间正序的 OpenAI 格式消息列表；未命中时返回 None
+        """
+        if not self.enabled or limit > self.history_size:
+            return None
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None or entry.history is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            history = list(entry.history)
+        return history[-limit:] if limit else []
+
+    def set_history(self, user_id: str, history: List[Dict[str, str]]):
+        """写入从数据库加载的最近聊天历史（按时间正序）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._get_or_create_entry(user_id)
+            entry.history = deque(history, maxlen=self.history_size)
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的用户画像结果，未命中时返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None or entry.profile is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry.profile)
+
+    def set_profile(self, user_id: str, profile: Dict[str, Any]):
+        """写入从数据库加载的用户画像结果"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._get_or_create_entry(user_id)
+            entry.profile = dict(profile)
+
+    def append_message(self, user_id: str, role: str, content: str, emotional_state: str = "neutral"):
+        """
+        消息写入数据库后同步更新缓存（write-through）
+        只更新已缓存的用户，未缓存的用户等下次读取时再从数据库加载
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None:
+                return
+            if entry.history is not None:
+                entry.history.append({"role": role, "content": content})
+            if entry.profile is not None:
+                # 与 ChatService._build_user_update 的规则保持一致
+                if role == "user" and emotional_state != "neutral":
+                    entry.profile["emotional_state"] = emotional_state
+                entry.profile.pop("is_new_user", None)
+
+    def update_profile(self, user_id: str, fields: Dict[str, Any]):
+        """更新已缓存的用户画像中的部分字段（未缓存时忽略）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is not None and entry.profile is not None:
+                entry.profile.update(fields)
+
+    def invalidate(self, user_id: str):
+        """删除指定用户的缓存"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "users": len(self._entries),
+                "max_users": self.max_users,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# 进程级共享的会话上下文缓存
+conversation_context_cache = ConversationContextCache()
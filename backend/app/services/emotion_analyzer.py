@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+情绪分析模块
+- 基于 Aho-Corasick 多模式匹配自动机，一次线性扫描找出所有情绪关键词
+- 关键词及权重来自 config/emotion_lexicon.py，返回所有情绪的加权得分
+- 安装了 pyahocorasick 时使用其C实现的自动机，否则使用纯Python实现
+- 只对ASCII字母做大小写折叠，不对中文文本调用 lower()
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config.emotion_lexicon import EMOTION_LEXICON, EMOTION_PRIORITY
+
+try:
+    import ahocorasick
+except ImportError:  # 可选依赖，未安装时使用纯Python自动机
+    ahocorasick = None
+
+NEUTRAL = "neutral"
+
+# 只折叠ASCII大写字母的转换表，中文等其他字符保持不变
+ASCII_LOWER = {code: code + 32 for code in range(ord("A"), ord("Z") + 1)}
+
+
+class AhoCorasickAutomaton:
+    """
+    Aho-Corasick 多模式匹配自动机
+    每个模式附带一个 payload，匹配时返回 (起始位置, 结束位置, payload)
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态的输出已沿失败链合并，匹配时无需再回溯
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        for pattern, payload in patterns:
+            self._add_pattern(pattern, payload)
+        self._build_fail_links()
+        self._add_case_aliases()
+
+    def _add_pattern(self, pattern: str, payload: Any):
+        """把模式插入字典树"""
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state].append((len(pattern), payload))
+
+    def _build_fail_links(self):
+        """按广度优先顺序计算失败指针，并合并输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _add_case_aliases(self):
+        """为小写ASCII字母的转移添加对应的大写转移，实现大小写不敏感匹配"""
+        for transitions in self._goto:
+            for ch, next_state in list(transitions.items()):
+                if "a" <= ch <= "z":
+                    transitions.setdefault(ch.upper(), next_state)
+
+    @property
+    def state_count(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str):
+        """
+        扫描文本，产出所有匹配（包括相互重叠的匹配）
+
+        Yields:
+            (start, end, payload)，end 为开区间
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                end = index + 1
+                for length, payload in output[state]:
+                    yield end - length, end, payload
+
+
+class NativeAhoCorasickAutomaton:
+    """
+    基于 pyahocorasick（C扩展）的自动机，接口与 AhoCorasickAutomaton 一致
+    C实现不支持大小写别名，构建时为含ASCII字母的模式登记所有大小写组合
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        grouped: Dict[str, List[Any]] = {}
+        for pattern, payload in patterns:
+            for variant in self._case_variants(pattern):
+                grouped.setdefault(variant, []).append(payload)
+        self._automaton = ahocorasick.Automaton()
+        for pattern, payloads in grouped.items():
+            self._automaton.add_word(pattern, (len(pattern), tuple(payloads)))
+        self._empty = not grouped
+        if not self._empty:
+            self._automaton.make_automaton()
+
+    @staticmethod
+    def _case_variants(pattern: str) -> List[str]:
+        """返回模式的所有ASCII大小写组合（关键词很短，组合数量可控）"""
+        variants = [""]
+        for ch in pattern:
+            cases = (ch, ch.upper()) if "a" <= ch <= "z" else (ch,)
+            variants = [prefix + case for prefix in variants for case in cases]
+        return variants if pattern else []
+
+    @property
+    def state_count(self) -> int:
+        return self._automaton.get_stats()["nodes_count"]
+
+    def iter_matches(self, text: str):
+        if self._empty:
+            return
+        for last_index, (length, payloads) in self._automaton.iter(text):
+            end = last_index + 1
+            for payload in payloads:
+                yield end - length, end, payload
+
+
+def build_automaton(patterns: Iterable[Tuple[str, Any]], native: bool = None):
+    """创建自动机，默认在安装了 pyahocorasick 时使用C实现"""
+    if native is None:
+        native = ahocorasick is not None
+    if native:
+        return NativeAhoCorasickAutomaton(patterns)
+    return AhoCorasickAutomaton(patterns)
+
+
+class EmotionAnalysis:
+    """单条文本（或一组文本）的情绪分析结果"""
+
+    def __init__(self, scores: Dict[str, float], keywords: List[str], priority: Tuple[str, ...]):
+        self.scores = scores
+        self.keywords = keywords
+        self._priority = priority
+
+    @property
+    def primary(self) -> str:
+        """得分最高的情绪；得分相同时按优先顺序选择，没有命中时为 neutral"""
+        best, best_score = NEUTRAL, 0.0
+        for emotion in self._priority:
+            score = self.scores.get(emotion, 0.0)
+            if score > best_score:
+                best, best_score = emotion, score
+        return best
+
+    @property
+    def distribution(self) -> Dict[str, float]:
+        """归一化后的情绪分布（得分之和为1，没有命中时全为0）"""
+        total = sum(self.scores.values())
+        if not total:
+            return dict.fromkeys(self.scores, 0.0)
+        return {emotion: round(score / total, 4) for emotion, score in self.scores.items()}
+
+    def labels(self, threshold: float = 0.0) -> List[str]:
+        """得分高于阈值的所有情绪（多标签），按得分从高到低排列"""
+        ranked = sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
+        return [emotion for emotion, score in ranked if score > threshold]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "primary": self.primary,
+            "scores": {emotion: round(score, 4) for emotion, score in self.scores.items()},
+            "distribution": self.distribution,
+            "keywords": self.keywords,
+        }
+
+
+class EmotionAnalyzer:
+    """
+    关键词情绪分析器
+    自动机在初始化时构建一次，之后每条消息只需一次线性扫描
+    """
+
+    def __init__(self, lexicon: Dict[str, Dict[str, float]] = None, priority: Tuple[str, ...] = None,
+                 native: bool = None):
+        self.lexicon = lexicon if lexicon is not None else EMOTION_LEXICON
+        # 优先顺序之外的情绪排在最后
+        priority = tuple(priority if priority is not None else EMOTION_PRIORITY)
+        self.priority = priority + tuple(emotion for emotion in self.lexicon if emotion not in priority)
+        patterns = [
+            (keyword.translate(ASCII_LOWER), (emotion, weight, keyword))
+            for emotion, keywords in self.lexicon.items()
+            for keyword, weight in keywords.items()
+        ]
+        self.automaton = build_automaton(patterns, native)
+
+    def _select_matches(self, text: str) -> List[Tuple[str, float, str]]:
+        """
+        找出文本中的关键词，去掉被更长关键词完全包含的匹配
+        例如「不开心」只计入 sad，不会再把其中的「开心」计入 happy
+
+        匹配按结束位置递增产出，保留下来的匹配互不包含，起止位置都递增，
+        因此只需要和栈顶比较
+        """
+        selected: List[Tuple[int, int, Tuple[str, float, str]]] = []
+        for start, end, payload in self.automaton.iter_matches(text):
+            if selected:
+                top_start, top_end, top_payload = selected[-1]
+                if top_start <= start and end <= top_end and (top_start, top_end) != (start, end):
+                    continue
+            while selected and selected[-1][0] >= start and selected[-1][1] <= end \
+                    and (selected[-1][0], selected[-1][1]) != (start, end):
+                selected.pop()
+            selected.append((start, end, payload))
+        return [payload for _, _, payload in selected]
+
+    def analyze(self, text: str) -> EmotionAnalysis:
+        """分析单条文本，返回所有情绪的加权得分"""
+        scores = dict.fromkeys(self.lexicon, 0.0)
+        keywords = []
+        if text:
+            for emotion, weight, keyword in self._select_matches(text):
+                scores[emotion] += weight
+                keywords.append(keyword)
+        return EmotionAnalysis(scores, keywords, self.priority)
+
+    def classify(self, text: str) -> str:
+        """返回文本的主要情绪标签"""
+        return self.analyze(text).primary
+
+    def analyze_batch(self, texts: Iterable[str]) -> List[EmotionAnalysis]:
+        """批量分析多条文本，返回与输入顺序一致的结果列表"""
+        return [self.analyze(text) for text in texts]
+
+    def analyze_history(self, messages: Iterable[Dict[str, Any]], role: Optional[str] = "user") -> Dict[str, Any]:
+        """
+        分析一段聊天历史
+
+        Args:
+            messages: OpenAI 格式或数据库格式的消息列表（需包含 role 和 content）
+            role: 只分析该角色的消息，为 None 时分析全部消息
+
+        Returns:
+            整体情绪（各消息得分累加）以及每条消息的主要情绪
+        """
+        contents = [
+            msg.get("content") or ""
+            for msg in messages
+            if role is None or msg.get("role") == role
+        ]
+        results = self.analyze_batch(contents)
+
+        totals = dict.fromkeys(self.lexicon, 0.0)
+        keywords = []
+        for result in results:
+            for emotion, score in result.scores.items():
+                totals[emotion] += score
+            keywords.extend(result.keywords)
+
+        overall = EmotionAnalysis(totals, keywords, self.priority).to_dict()
+        overall["message_count"] = len(results)
+        overall["per_message"] = [result.primary for result in results]
+        return overall
+
+
+# 进程级共享的情绪分析器（自动机只构建一次）
+emotion_analyzer = EmotionAnalyzer()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP连接池模块
+- 为每个模型维护一个进程级共享的 requests.Session
+- 复用 TCP/TLS 连接（keep-alive），避免每次调用都重新握手
+- 统计连接池指标：复用次数、新建连接数、等待连接耗时
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from ..config import Config
+
+
+class PoolMetrics:
+    """
+    连接池指标
+    线程安全地累计请求数、新建连接数和等待连接的耗时
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.new_connections = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def record_checkout(self, waited: float):
+        """记录一次从连接池取连接的操作"""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            if waited > self.max_wait_time:
+                self.max_wait_time = waited
+
+    def record_new_connection(self):
+        """记录一次新建连接"""
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回当前指标快照"""
+        with self._lock:
+            hits = max(self.checkouts - self.new_connections, 0)
+            return {
+                "requests": self.checkouts,
+                "hits": hits,
+                "new_connections": self.new_connections,
+                "hit_ratio": round(hits / self.checkouts, 4) if self.checkouts else 0.0,
+                "wait_time_total": round(self.wait_time, 4),
+                "wait_time_avg": round(self.wait_time / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_time_max": round(self.max_wait_time, 4),
+            }
+
+
+def _timed_pool_class(base):
+    """生成会向 PoolMetrics 上报指标的 urllib3 连接池类"""
+
+    class TimedConnectionPool(base):
+        metrics: PoolMetrics = None
+
+        def _get_conn(self, timeout=None):
+            start = time.perf_counter()
+            conn = super()._get_conn(timeout=timeout)
+            if self.metrics is not None:
+                self.metrics.record_checkout(time.perf_counter() - start)
+            return conn
+
+        def _new_conn(self):
+            if self.metrics is not None:
+                self.metrics.record_new_connection()
+            return super()._new_conn()
+
+    TimedConnectionPool.__name__ = f"Timed{base.__name__}"
+    return TimedConnectionPool
+
+
+TimedHTTPConnectionPool = _timed_pool_class(HTTPConnectionPool)
+TimedHTTPSConnectionPool = _timed_pool_class(HTTPSConnectionPool)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    带指标统计的 HTTPAdapter
+    将底层 urllib3 连接池替换为带计时功能的子类
+    """
+
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # 绑定当前 adapter 的指标对象，保证不同模型的统计互不干扰
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("HTTPPool", (TimedHTTPConnectionPool,), {"metrics": self.metrics}),
+            "https": type("HTTPSPool", (TimedHTTPSConnectionPool,), {"metrics": self.metrics}),
+        }
+
+
+class HTTPSessionPool:
+    """
+    进程级的HTTP会话池
+    每个模型（key）对应一个独立的 Session 和连接池，首次使用时惰性创建
+    """
+
+    def __init__(self, pool_size: int = None, pool_block: bool = None,
+                 connect_timeout: float = None, read_timeout: float = None):
+        self.pool_size = pool_size if pool_size is not None else Config.AZURE_HTTP_POOL_SIZE
+        self.pool_block = pool_block if pool_block is not None else Config.AZURE_HTTP_POOL_BLOCK
+        self.connect_timeout = connect_timeout if connect_timeout is not None else Config.AZURE_HTTP_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout if read_timeout is not None else Config.AZURE_HTTP_READ_TIMEOUT
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._metrics: Dict[str, PoolMetrics] = {}
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """requests 使用的 (连接超时, 读取超时)"""
+        return self.connect_timeout, self.read_timeout
+
+    def get_session(self, key: str) -> requests.Session:
+        """
+        获取指定模型的共享 Session
+
+        Args:
+            key: 模型名称（或其他连接池标识）
+
+        Returns:
+            requests.Session: 复用连接的会话对象
+        """
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                metrics = PoolMetrics()
+                adapter = PooledHTTPAdapter(
+                    metrics,
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    pool_block=self.pool_block,
+                    max_retries=0,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._metrics[key] = metrics
+                self._sessions[key] = session
+        return session
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """返回所有连接池的指标快照"""
+        with self._lock:
+            items = list(self._metrics.items())
+        stats = {key: metrics.snapshot() for key, metrics in items}
+        for key_stats in stats.values():
+            key_stats["pool_size"] = self.pool_size
+        return stats
+
+    def close(self):
+        """关闭所有会话，释放连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._metrics.clear()
+        for session in sessions:
+            session.close()
+
+
+# 进程级共享连接池，所有 OpenAIService 实例共用
+http_session_pool = HTTPSessionPool()
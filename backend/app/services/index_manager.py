@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+MongoDB索引管理模块
+- 应用启动时确保热点查询所需的索引存在
+- 通过 pymongo 命令监听器记录慢查询
+- 提供历史查询的执行计划统计，便于确认查询走了索引
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, monitoring
+
+from ..config import Config
+from .session_manager import SESSION_COLLECTION
+
+
+# 各集合必需的索引
+REQUIRED_INDEXES = {
+    "chat_messages": [
+        # get_history: find({"user_id"}).sort("timestamp", -1).limit(n)（使用该索引的前缀）
+        # get_history_page: 按 (timestamp, _id) 键集分页，排序与游标条件都走索引
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="user_id_timestamp_id_desc"),
+        # get_history（启用会话时）: find({"user_id", "session_id"}).sort("timestamp", -1).limit(n)
+        IndexModel([("session_id", ASCENDING), ("timestamp", DESCENDING)], name="session_id_timestamp_desc"),
+    ],
+    SESSION_COLLECTION: [
+        # 获取活跃会话 / 会话列表: find({"user_id"}).sort("last_active", -1)
+        IndexModel([("user_id", ASCENDING), ("last_active", DESCENDING)], name="user_id_last_active_desc"),
+    ],
+    "users": [
+        # get_user_profile / save_message 的 upsert
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    Config.ARCHIVE_COLLECTION: [
+        # 列出用户的归档月份: find({"user_id"}).sort("month", -1)
+        IndexModel([("user_id", ASCENDING), ("month", DESCENDING)], name="user_id_month_desc"),
+        # 归档保留期（ARCHIVE_RETENTION_DAYS > 0 时桶文档带 expires_at）
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    Config.REPORT_CACHE_COLLECTION: [
+        # 报告缓存过期清理（expireAfterSeconds=0 表示到 expires_at 即删除）
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # 按报告类型清除缓存
+        IndexModel([("report_type", ASCENDING)], name="report_type"),
+    ],
+    Config.REPORT_JOB_COLLECTION: [
+        # 启动时恢复未完成的任务: find({"status"}).sort("created_at", 1)
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # 过期任务记录清理
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+def _shape(value: Any) -> Any:
+    """只保留查询条件的结构，去掉具体取值，避免日志中出现用户数据"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(item) for item in value[:1]]
+    return "?"
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    慢查询监听器
+    记录耗时超过阈值的MongoDB命令（只保留最近的若干条）
+    """
+
+    # 需要记录的命令类型
+    TRACKED_COMMANDS = {"find", "aggregate", "count", "distinct", "insert", "update", "delete", "findAndModify"}
+
+    def __init__(self, threshold_ms: float = None, max_entries: int = 200):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else Config.MONGO_SLOW_QUERY_MS
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._slow_queries = deque(maxlen=max_entries)
+
+    def started(self, event):
+        if event.command_name not in self.TRACKED_COMMANDS:
+            return
+        command = event.command
+        with self._lock:
+            self._pending[event.request_id] = {
+                "command": event.command_name,
+                "collection": command.get(event.command_name),
+                "filter": _shape(command.get("filter", command.get("q", {}))),
+                "sort": _shape(command.get("sort")) if command.get("sort") else None,
+            }
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool = False):
+        with self._lock:
+            info = self._pending.pop(event.request_id, None)
+        if info is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        if duration_ms < self.threshold_ms:
+            return
+        info.update({
+            "duration_ms": round(duration_ms, 2),
+            "failed": failed,
+            "at": datetime.now().isoformat(),
+        })
+        with self._lock:
+            self._slow_queries.append(info)
+        print(f"[MongoDB] Slow {info['command']} on {info['collection']}: {info['duration_ms']}ms filter={info['filter']}")
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """返回最近的慢查询记录（最新的在前）"""
+        with self._lock:
+            items = list(self._slow_queries)
+        return list(reversed(items))[:limit]
+
+
+# 进程级慢查询监听器，需在创建 MongoClient 之前注册
+slow_query_listener = SlowQueryListener()
+_listener_registered = False
+
+
+def register_slow_query_listener():
+    """注册慢查询监听器（只注册一次）"""
+    global _listener_registered
+    if not _listener_registered:
+        monitoring.register(slow_query_listener)
+        _listener_registered = True
+
+
+class IndexManager:
+    """
+    索引管理器
+    负责创建必需索引、查询索引状态与执行计划
+    """
+
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from ..extensions import mongo
+        return mongo.db
+
+    def ensure_indexes(self) -> Dict[str, Any]:
+        """
+        确保所有必需索引存在（create_indexes 是幂等的）
+
+        Returns:
+            Dict: {集合名: {"indexes": [...]} 或 {"error": "..."}}
+        """
+        results = {}
+        for collection_name, indexes in REQUIRED_INDEXES.items():
+            try:
+                names = self.db[collection_name].create_indexes(indexes)
+                results[collection_name] = {"indexes": names}
+            except Exception as e:
+                # 例如 users 中已有重复的 user_id 时唯一索引会创建失败
+                print(f"[IndexManager] Failed to create indexes on {collection_name}: {str(e)}")
+                results[collection_name] = {"error": str(e)}
+        return results
+
+    def list_indexes(self) -> Dict[str, List[Dict[str, Any]]]:
+        """列出受管理集合上的现有索引"""
+        indexes = {}
+        for collection_name in REQUIRED_INDEXES:
+            indexes[collection_name] = [
+                {"name": info["name"], "key": list(info["key"].items()), "unique": info.get("unique", False)}
+                for info in self.db[collection_name].list_indexes()
+            ]
+        return indexes
+
+    def enable_profiling(self, slow_ms: int = None) -> Dict[str, Any]:
+        """
+        开启MongoDB服务端慢查询分析器（profile level 1）
+        需要数据库用户具有相应权限
+        """
+        slow_ms = int(slow_ms if slow_ms is not None else Config.MONGO_SLOW_QUERY_MS)
+        return self.db.command("profile", 1, slowms=slow_ms)
+
+    def get_profiled_queries(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """读取服务端 system.profile 中最近的慢查询"""
+        cursor = self.db["system.profile"].find(
+            {"ns": {"$regex": r"\.(chat_messages|users)$"}},
+            {"op": 1, "ns": 1, "millis": 1, "planSummary": 1, "keysExamined": 1,
+             "docsExamined": 1, "nreturned": 1, "ts": 1, "_id": 0}
+        ).sort("ts", -1).limit(limit)
+        return list(cursor)
+
+    @staticmethod
+    def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+        """按从外到内的顺序展开执行计划的各个阶段"""
+        stages = []
+        while plan:
+            stage = plan.get("stage")
+            if plan.get("indexName"):
+                stage = f"{stage}({plan['indexName']})"
+            stages.append(stage)
+            plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+        return stages
+
+    def explain_history_query(self, user_id: str, limit: int = 20) -> Dict[str, Any]:
+        """
+        获取 get_history 查询的执行计划统计
+
+        Returns:
+            Dict: 获胜计划的阶段、扫描的索引键/文档数、返回条数和耗时
+        """
+        start = time.perf_counter()
+        explain = self.db.chat_messages.find(
+            {"user_id": user_id}
+        ).sort("timestamp", -1).limit(limit).explain()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # MongoDB 7 的SBE引擎把计划包在 queryPlan 中
+        winning_plan = winning_plan.get("queryPlan", winning_plan)
+        stages = self._plan_stages(winning_plan)
+        execution = explain.get("executionStats", {})
+
+        return {
+            "stages": stages,
+            "uses_index": any(stage and stage.startswith("IXSCAN") for stage in stages),
+            "has_blocking_sort": "SORT" in stages,
+            "keys_examined": execution.get("totalKeysExamined"),
+            "docs_examined": execution.get("totalDocsExamined"),
+            "returned": execution.get("nReturned"),
+            "execution_time_ms": execution.get("executionTimeMillis"),
+            "explain_round_trip_ms": round(elapsed_ms, 2),
+        }
+
+
+def ensure_indexes_on_startup():
+    """在 create_app 中调用：创建必需索引，失败时只记录日志不阻止启动"""
+    manager = IndexManager()
+    results = manager.ensure_indexes()
+    print(f"[IndexManager] Index bootstrap finished: {results}")
+    if Config.MONGO_PROFILE_SLOW_QUERIES:
+        try:
+            manager.enable_profiling()
+        except Exception as e:
+            print(f"[IndexManager] Failed to enable profiling: {str(e)}")
+    return results
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务队列模块
+- 基于线程池在请求路径之外执行耗时任务（如对话摘要）
+- 同一个 key 的任务在执行完之前不会重复提交
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from ..config import Config
+
+
+class BackgroundJobQueue:
+    """
+    进程内后台任务队列
+    线程池在首次提交任务时创建，gunicorn fork 之后的子进程会重新创建
+    """
+
+    def __init__(self, name: str, max_workers: int = None):
+        self.name = name
+        self.max_workers = max_workers if max_workers is not None else Config.JOB_QUEUE_WORKERS
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._running: Dict[str, Future] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+
+    def print_log(self, message: str):
+        """打印日志信息"""
+        print(f"[{self.name}] {message}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取当前进程的线程池（调用方需持有锁）"""
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._running = {}
+            self._pid = os.getpid()
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, func: Callable, *args, key: str = None, **kwargs) -> Optional[Future]:
+        """
+        提交任务
+
+        Args:
+            func: 任务函数
+            key: 去重键；同一 key 的任务仍在排队或执行时，新提交会被忽略
+
+        Returns:
+            Future；因去重被忽略时返回 None
+        """
+        with self._lock:
+            if key is not None and key in self._running:
+                self.deduplicated += 1
+                return None
+            future = self._get_executor().submit(self._run, func, args, kwargs)
+            self.submitted += 1
+            if key is not None:
+                self._running[key] = future
+        # 任务可能已经完成，此时回调会立即执行，因此要在释放锁之后注册
+        if key is not None:
+            future.add_done_callback(lambda _: self._release(key, future))
+        return future
+
+    def _release(self, key: str, future: Future):
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+
+    def _run(self, func: Callable, args, kwargs) -> Any:
+        try:
+            result = func(*args, **kwargs)
+            self.completed += 1
+            return result
+        except Exception as e:
+            self.failed += 1
+            self.print_log(f"Job {getattr(func, '__name__', func)} failed: {str(e)}")
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池，默认等待正在执行的任务完成"""
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回任务队列统计信息"""
+        with self._lock:
+            running = len(self._running)
+        return {
+            "workers": self.max_workers,
+            "active_keys": running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+        }
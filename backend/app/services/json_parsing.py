@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+JSON解析工具模块
+- IncrementalJSONObjectParser：逐块读取大模型的流式输出，每当顶层对象的一个字段完整后立即返回该字段
+  （可跳过 ```json 代码块标记等前缀文字），用于报告的流式分段推送
+- extract_json_object：从完整的回复中单次扫描提取第一个完整的JSON对象（有无代码块标记均可），
+  输出被截断时尝试补全
+- validate_schema：按报告的字段定义校验解析结果
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 影响结构的字符：字符串边界、转义、对象/数组边界、顶层字段分隔符
+_STRUCTURAL_CHARS = re.compile(r'["\\{}\[\],]')
+# 字符串内部只需要关心结束引号和转义
+_STRING_CHARS = re.compile(r'["\\]')
+
+
+class IncrementalJSONObjectParser:
+    """
+    顶层JSON对象的增量解析器
+
+    用法：
+        parser = IncrementalJSONObjectParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...  # 顶层字段 key 已完整
+        if parser.done:
+            report = parser.result
+
+    只扫描新到达的字符，并丢弃已解析字段的文本，整个解析过程是线性的
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # 下一个待扫描字符的位置
+        self._member_start = 0  # 当前顶层字段在缓冲区中的起始位置
+        self._depth = 0
+        self._in_string = False
+        self.started = False  # 是否已遇到顶层对象的 "{"
+        self.done = False  # 顶层对象是否已结束
+        self.result: Dict[str, Any] = {}
+        self.errors: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段文本
+
+        Returns:
+            本段文本中完成的顶层字段列表 [(key, value), ...]
+        """
+        if self.done or not text:
+            return []
+        self._buffer += text
+        sections: List[Tuple[str, Any]] = []
+        buffer = self._buffer
+        pos = self._pos
+
+        while not self.done:
+            if not self.started:
+                pos = buffer.find("{", pos)
+                if pos < 0:
+                    # 顶层对象尚未开始，前缀文字无需保留
+                    pos = len(buffer)
+                    break
+                self.started = True
+                self._depth = 1
+                self._member_start = pos + 1
+                pos += 1
+                continue
+
+            match = (_STRING_CHARS if self._in_string else _STRUCTURAL_CHARS).search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            index = match.start()
+
+            if char == "\\":
+                if index + 1 >= len(buffer):
+                    # 转义的下一个字符还没到达，下次从反斜杠处重新扫描
+                    pos = index
+                    break
+                pos = index + 2
+                continue
+
+            pos = index + 1
+            if char == '"':
+                self._in_string = not self._in_string
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._member_start:index], sections)
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                self._emit(buffer[self._member_start:index], sections)
+                self._member_start = pos
+
+        # 丢弃已解析的部分，缓冲区只保留当前未完成的字段
+        if self.started and not self.done:
+            self._buffer = buffer[self._member_start:]
+            self._pos = pos - self._member_start
+            self._member_start = 0
+        else:
+            self._buffer = "" if self.done else buffer[pos:]
+            self._pos = 0
+        return sections
+
+    def _emit(self, member: str, sections: List[Tuple[str, Any]]):
+        """解析一个完整的顶层字段 "key": value"""
+        member = member.strip()
+        if not member:
+            return
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError as e:
+            self.errors.append(f"{member[:40]}...: {str(e)}")
+            return
+        for key, value in parsed.items():
+            self.result[key] = value
+            sections.append((key, value))
+
+
+class JSONExtractionError(ValueError):
+    """回复中找不到可解析的JSON对象"""
+
+
+# 截断补全时最多回退的字段分隔符个数
+MAX_REPAIR_CUTS = 8
+
+
+def _close(text: str, stack: List[str]) -> str:
+    """按未闭合的括号顺序补全结尾"""
+    return text + "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def _repair_truncated(text: str, stack: List[str], in_string: bool,
+                      cuts: List[Tuple[int, Tuple[str, ...]]]) -> Optional[Any]:
+    """
+    补全被截断的JSON
+    先尝试直接闭合当前位置（补上未结束的字符串和括号），失败后依次回退到之前的逗号处闭合，
+    即丢弃最后一个不完整的字段或数组元素
+    """
+    candidate = text + '"' if in_string else text
+    candidate = candidate.rstrip()
+    if candidate.endswith(":"):
+        # 只有键没有值，回退到最近的分隔符
+        candidate = ""
+    candidate = candidate.rstrip(",")
+    if candidate:
+        try:
+            return json.loads(_close(candidate, stack))
+        except ValueError:
+            pass
+    for index, cut_stack in reversed(cuts[-MAX_REPAIR_CUTS:]):
+        try:
+            return json.loads(_close(text[:index], list(cut_stack)))
+        except ValueError:
+            continue
+    return None
+
+
+def extract_json_object(text: str, repair: bool = True) -> Tuple[Dict[str, Any], bool]:
+    """
+    从大模型回复中提取第一个完整的JSON对象
+
+    纯JSON（json_response 模式）直接解析；否则单次扫描找到第一个括号平衡的对象，
+    忽略前后的说明文字和 ```json 代码块标记。对象未闭合（输出被 max_tokens 截断）时尝试补全
+
+    Args:
+        text: 大模型的完整回复
+        repair: 是否尝试补全被截断的对象
+
+    Returns:
+        (对象, 是否经过补全)
+
+    Raises:
+        JSONExtractionError: 找不到可解析的JSON对象
+    """
+    if not text:
+        raise JSONExtractionError("Empty response")
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            result = json.loads(stripped)
+            if isinstance(result, dict):
+                return result, False
+        except ValueError:
+            pass
+
+    start = text.find("{")
+    while start >= 0:
+        stack: List[str] = []
+        cuts: List[Tuple[int, Tuple[str, ...]]] = []
+        in_string = False
+        pos = start
+        closed_at = None
+        while True:
+            match = (_STRING_CHARS if in_string else _STRUCTURAL_CHARS).search(text, pos)
+            if match is None:
+                break
+            char = match.group()
+            index = match.start()
+            pos = index + 1
+            if char == "\\":
+                pos = index + 2
+            elif char == '"':
+                in_string = not in_string
+            elif char in "{[":
+                stack.append(char)
+            elif char in "}]":
+                if not stack or (char == "}") != (stack[-1] == "{"):
+                    # 括号不匹配，说明这里不是JSON
+                    break
+                stack.pop()
+                if not stack:
+                    closed_at = pos
+                    break
+            elif char == ",":
+                cuts.append((index, tuple(stack)))
+
+        if closed_at is not None:
+            try:
+                result = json.loads(text[start:closed_at])
+                if isinstance(result, dict):
+                    return result, False
+            except ValueError:
+                pass
+        elif repair and stack and match is None:
+            # 扫描到结尾对象仍未闭合：输出被截断
+            result = _repair_truncated(text[start:], stack, in_string,
+                                       [(index - start, cut_stack) for index, cut_stack in cuts])
+            if isinstance(result, dict):
+                return result, True
+        # 这个 "{" 不是有效对象的开头，继续找下一个
+        start = text.find("{", start + 1)
+
+    raise JSONExtractionError("No JSON object found in response")
+
+
+def validate_schema(data: Dict[str, Any], schema: Dict[str, Any], optional: Tuple[str, ...] = ()) -> List[str]:
+    """
+    按字段定义校验报告
+
+    Args:
+        data: 解析出的报告
+        schema: {字段名: 类型或类型元组}；类型为 list 时可写成 (list, 元素类型)，
+                为 dict 时可写成嵌套的字段定义
+        optional: 可以缺省的顶层字段（存在时仍校验类型）
+
+    Returns:
+        错误列表，为空表示通过
+    """
+    errors = []
+    for key, expected in schema.items():
+        if key not in data:
+            if key not in optional:
+                errors.append(f"missing field {key}")
+            continue
+        value = data[key]
+        if isinstance(expected, dict):
+            if not isinstance(value, dict):
+                errors.append(f"{key} should be an object")
+            else:
+                errors.extend(f"{key}.{error}" for error in validate_schema(value, expected))
+        elif isinstance(expected, tuple) and len(expected) == 2 and expected[0] is list:
+            if not isinstance(value, list):
+                errors.append(f"{key} should be an array")
+            elif not all(isinstance(item, expected[1]) for item in value):
+                errors.append(f"{key} has items of unexpected type")
+        elif not isinstance(value, expected):
+            errors.append(f"{key} has unexpected type {type(value).__name__}")
+    return errors
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+聊天记录冷热分层模块
+- chat_messages 只保留最近 ARCHIVE_HOT_DAYS 天的消息（热数据），保证日常对话用到的索引和文档留在内存中
+- 更早的消息按 (用户, 月份) 归档到 chat_archive 集合的桶文档中：每次归档追加一个分块，
+  分块是一批消息的 BSON 经 zlib 压缩后的二进制，桶上记录消息数和时间范围
+- 开启对话摘要时只归档已经折叠进摘要的消息（summarized_until 之前），避免摘要缺少原文
+- ARCHIVE_RETENTION_DAYS > 0 时桶文档带 expires_at，由 TTL 索引在该月结束后N天删除
+- 由 scripts/archive_messages.py（定时任务）或 POST /api/admin/archive/run 触发
+
+归档与删除不在一个事务中：归档分块写入后、删除原消息前中断时，重跑会再次归档这些消息，
+读取时按消息ID去重
+"""
+
+import hashlib
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import bson
+from pymongo.errors import DuplicateKeyError
+
+from ..config import Config
+
+# 分块格式版本，变更序列化或压缩方式时递增
+CHUNK_FORMAT = 1
+
+
+def month_key(timestamp: datetime) -> str:
+    """消息所属的月份，如 "2026-01" """
+    return timestamp.strftime("%Y-%m")
+
+
+def month_end(month: str) -> datetime:
+    """月份结束的时间（下个月第一天零点）"""
+    year, month_number = map(int, month.split("-"))
+    return datetime(year + month_number // 12, month_number % 12 + 1, 1)
+
+
+def encode_chunk(messages: List[Dict[str, Any]], level: int = None) -> bytes:
+    """把一批消息文档序列化为压缩后的分块数据"""
+    level = Config.ARCHIVE_COMPRESSION_LEVEL if level is None else level
+    return zlib.compress(bson.encode({"messages": messages}), level)
+
+
+def decode_chunk(data: bytes) -> List[Dict[str, Any]]:
+    """解压分块数据，返回消息文档列表"""
+    return bson.decode(zlib.decompress(data))["messages"]
+
+
+class MessageArchiver:
+    """
+    冷数据归档器
+    archive_user 处理单个用户；run 按 users.archived_until 找出需要归档的用户并逐个处理
+    """
+
+    name = "MessageArchiver"
+
+    def __init__(self, db=None, hot_days: int = None, retention_days: int = None,
+                 batch_messages: int = None, collection_name: str = None):
+        self._db = db
+        self.hot_days = hot_days if hot_days is not None else Config.ARCHIVE_HOT_DAYS
+        self.retention_days = retention_days if retention_days is not None else Config.ARCHIVE_RETENTION_DAYS
+        self.batch_messages = batch_messages if batch_messages is not None else Config.ARCHIVE_BATCH_MESSAGES
+        self.collection_name = collection_name or Config.ARCHIVE_COLLECTION
+
+    def print_log(self, message: str):
+        """打印日志信息"""
+        print(f"[{self.name}] {message}")
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from ..extensions import mongo
+        return mongo.db
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    def cutoff(self, now: datetime = None) -> datetime:
+        """早于该时间的消息视为冷数据"""
+        return (now or datetime.now()) - timedelta(days=self.hot_days)
+
+    def _user_cutoff(self, user_id: str, cutoff: datetime) -> Optional[datetime]:
+        """开启对话摘要时，归档截止点不超过摘要已覆盖的时间"""
+        if not Config.SUMMARY_ENABLED:
+            return cutoff
+        user_doc = self.db.users.find_one({"user_id": user_id}, {"conversation_summary": 1}) or {}
+        summarized_until = (user_doc.get("conversation_summary") or {}).get("summarized_until")
+        if summarized_until is None:
+            # 从未生成摘要的用户（消息很少或长期不活跃）直接按时间归档
+            return cutoff
+        # MongoDB 的时间精度为毫秒，+1ms 使 $lt 包含 summarized_until 这一条
+        return min(cutoff, summarized_until + timedelta(milliseconds=1))
+
+    def _append_chunk(self, user_id: str, month: str, messages: List[Dict[str, Any]], now: datetime) -> bool:
+        """
+        把一批同月消息追加到用户该月的桶中
+
+        Returns:
+            bool: 是否新写入（同一分块已存在时返回 False）
+        """
+        ids = [str(message["_id"]) for message in messages]
+        chunk_id = hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()
+        chunk = {
+            "chunk_id": chunk_id,
+            "format": CHUNK_FORMAT,
+            "count": len(messages),
+            "first_timestamp": messages[0]["timestamp"],
+            "last_timestamp": messages[-1]["timestamp"],
+            "data": bson.Binary(encode_chunk(messages)),
+            "archived_at": now,
+        }
+        on_insert: Dict[str, Any] = {"user_id": user_id, "month": month}
+        if self.retention_days > 0:
+            on_insert["expires_at"] = month_end(month) + timedelta(days=self.retention_days)
+        try:
+            # 过滤条件排除已包含该分块的桶：分块已存在时 upsert 会因 _id 重复而失败，不会重复追加
+            self.collection.update_one(
+                {"_id": f"{user_id}:{month}", "chunks.chunk_id": {"$ne": chunk_id}},
+                {
+                    "$setOnInsert": on_insert,
+                    "$push": {"chunks": chunk},
+                    "$inc": {"message_count": len(messages)},
+                    "$min": {"first_timestamp": chunk["first_timestamp"]},
+                    "$max": {"last_timestamp": chunk["last_timestamp"]},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def archive_user(self, user_id: str, now: datetime = None) -> Dict[str, Any]:
+        """
+        归档一个用户的冷消息
+
+        Returns:
+            Dict: {"user_id", "archived", "months", "complete"}；
+                  complete 为 False 表示本次达到 batch_messages 上限，还有待归档的消息
+        """
+        now = now or datetime.now()
+        cutoff = self._user_cutoff(user_id, self.cutoff(now))
+        messages = list(
+            self.db.chat_messages.find({"user_id": user_id, "timestamp": {"$lt": cutoff}})
+            .sort("timestamp", 1).limit(self.batch_messages)
+        )
+
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages:
+            by_month.setdefault(month_key(message["timestamp"]), []).append(message)
+        for month, month_messages in by_month.items():
+            self._append_chunk(user_id, month, month_messages, now)
+        if messages:
+            # 先写归档再删除原消息，中断时最多产生可去重的重复数据，不会丢消息
+            self.db.chat_messages.delete_many({"_id": {"$in": [message["_id"] for message in messages]}})
+
+        complete = len(messages) < self.batch_messages
+        if complete:
+            self.db.users.update_one({"user_id": user_id}, {"$set": {"archived_until": cutoff}})
+        return {"user_id": user_id, "archived": len(messages), "months": sorted(by_month), "complete": complete}
+
+    def run(self, max_users: int = None, now: datetime = None) -> Dict[str, Any]:
+        """
+        归档所有需要归档的用户（上次归档截止点早于今天的截止点一天以上，或从未归档）
+
+        Returns:
+            Dict: 处理的用户数、归档的消息数和耗时
+        """
+        now = now or datetime.now()
+        stale_before = self.cutoff(now) - timedelta(days=1)
+        query = {"$or": [{"archived_until": {"$exists": False}}, {"archived_until": {"$lt": stale_before}}]}
+        cursor = self.db.users.find(query, {"user_id": 1})
+        if max_users:
+            cursor = cursor.limit(max_users)
+        # 先取出用户列表，处理过程中会更新 users 文档，且长时间运行时游标可能超时
+        user_ids = [user_doc["user_id"] for user_doc in cursor]
+
+        started = time.perf_counter()
+        users = archived = failed = 0
+        for user_id in user_ids:
+            try:
+                while True:
+                    result = self.archive_user(user_id, now)
+                    archived += result["archived"]
+                    if result["complete"]:
+                        break
+                users += 1
+            except Exception as e:
+                failed += 1
+                self.print_log(f"Failed to archive messages for user {user_id}: {str(e)}")
+        elapsed = round(time.perf_counter() - started, 3)
+        self.print_log(f"Archived {archived} messages for {users} users in {elapsed}s ({failed} failed)")
+        return {"users": users, "archived": archived, "failed": failed, "elapsed_seconds": elapsed}
+
+    def list_months(self, user_id: str) -> List[Dict[str, Any]]:
+        """列出用户已归档的月份（不读取分块数据）"""
+        cursor = self.collection.find(
+            {"user_id": user_id},
+            {"month": 1, "message_count": 1, "first_timestamp": 1, "last_timestamp": 1, "expires_at": 1},
+        ).sort("month", -1)
+        return [
+            {
+                "month": doc["month"],
+                "message_count": doc.get("message_count", 0),
+                "first_timestamp": doc["first_timestamp"].isoformat(),
+                "last_timestamp": doc["last_timestamp"].isoformat(),
+                "expires_at": doc["expires_at"].isoformat() if doc.get("expires_at") else None,
+            }
+            for doc in cursor
+        ]
+
+    def load_month(self, user_id: str, month: str) -> List[Dict[str, Any]]:
+        """解压用户某个月的归档消息（按时间正序，按消息ID去重）"""
+        bucket = self.collection.find_one({"_id": f"{user_id}:{month}"}, {"chunks.data": 1})
+        if bucket is None:
+            return []
+        messages: Dict[str, Dict[str, Any]] = {}
+        for chunk in bucket.get("chunks", []):
+            for message in decode_chunk(chunk["data"]):
+                messages[str(message["_id"])] = message
+        return sorted(messages.values(), key=lambda message: (message["timestamp"], str(message["_id"])))
+
+    def delete_user(self, user_id: str) -> int:
+        """删除用户的全部归档（清空聊天记录时调用）"""
+        return self.collection.delete_many({"user_id": user_id}).deleted_count
+
+    def stats(self) -> Dict[str, Any]:
+        """归档配置与归档集合的汇总（会扫描归档集合的元数据字段）"""
+        totals = list(self.collection.aggregate([
+            {"$group": {"_id": None, "buckets": {"$sum": 1}, "messages": {"$sum": "$message_count"}}}
+        ]))
+        return {
+            "collection": self.collection_name,
+            "hot_days": self.hot_days,
+            "retention_days": self.retention_days,
+            "buckets": totals[0]["buckets"] if totals else 0,
+            "messages": totals[0]["messages"] if totals else 0,
+        }
+
+
+# 进程级共享的归档器
+message_archiver = MessageArchiver()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指标模块
+- 请求延迟（按路由）、Azure OpenAI 首字耗时与总耗时、MongoDB 操作耗时、SSE 流持续时间
+- gunicorn 多 worker：设置 PROMETHEUS_MULTIPROC_DIR 后每个进程把指标写入该目录下的文件，
+  /metrics 汇总所有进程的数据（目录的创建与清理见 gunicorn.conf.py）
+- 未安装 prometheus_client 或 METRICS_ENABLED=false 时所有记录操作为空操作
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Tuple
+
+from ..config import Config
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # prometheus_client 为可选依赖
+    prometheus_client = None
+
+# 直方图分桶（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+STREAM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+class Metrics:
+    """
+    进程内的指标集合
+    直方图在导入时创建；多进程模式下 prometheus_client 在导入时根据 PROMETHEUS_MULTIPROC_DIR 选择存储方式，
+    因此该环境变量必须在进程启动前设置
+    """
+
+    def __init__(self, enabled: bool = None):
+        enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self.enabled = enabled and prometheus_client is not None
+        if not self.enabled:
+            return
+        histogram = prometheus_client.Histogram
+        self.request_duration = histogram(
+            "http_request_duration_seconds", "HTTP request latency by route (until the response starts)",
+            ("method", "route", "status"), buckets=REQUEST_BUCKETS)
+        self.azure_ttft = histogram(
+            "azure_openai_ttft_seconds", "Azure OpenAI time to first streamed token (including retries)",
+            ("model", "endpoint"), buckets=REQUEST_BUCKETS)
+        self.azure_duration = histogram(
+            "azure_openai_request_duration_seconds", "Azure OpenAI call duration (including retries)",
+            ("model", "endpoint", "stream", "outcome"), buckets=REQUEST_BUCKETS)
+        self.mongo_duration = histogram(
+            "mongo_operation_duration_seconds", "MongoDB operation latency on chat hot paths",
+            ("operation", "outcome"), buckets=MONGO_BUCKETS)
+        self.stream_duration = histogram(
+            "sse_stream_duration_seconds", "Server-sent event stream duration",
+            ("route", "outcome"), buckets=STREAM_BUCKETS)
+
+    @property
+    def multiprocess_mode(self) -> bool:
+        return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        """记录一次HTTP请求的耗时"""
+        if self.enabled:
+            self.request_duration.labels(method, route, str(status)).observe(seconds)
+
+    def observe_azure(self, model: Optional[str], endpoint: Optional[str], stream: bool, success: bool,
+                      seconds: Optional[float], ttft: Optional[float] = None):
+        """记录一次Azure OpenAI调用的总耗时和（流式调用的）首字耗时"""
+        if not self.enabled:
+            return
+        model = model or "unknown"
+        endpoint = endpoint or "other"
+        if seconds is not None:
+            self.azure_duration.labels(model, endpoint, "true" if stream else "false",
+                                       "success" if success else "error").observe(seconds)
+        if ttft is not None:
+            self.azure_ttft.labels(model, endpoint).observe(ttft)
+
+    @contextmanager
+    def time_mongo(self, operation: str):
+        """统计 with 块内MongoDB操作的耗时（同步和 await 的操作都可以）"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        finally:
+            self.mongo_duration.labels(operation, outcome).observe(time.perf_counter() - started)
+
+    def observe_stream(self, route: str, outcome: str, seconds: float):
+        """记录一条SSE流的持续时间；outcome 为 completed / disconnected / error"""
+        if self.enabled:
+            self.stream_duration.labels(route, outcome).observe(seconds)
+
+    def track_stream(self, route: str, chunks: Iterable) -> Iterator:
+        """包装SSE生成器，流结束（包括客户端断开）时记录持续时间"""
+        started = time.perf_counter()
+        outcome = "disconnected"
+        try:
+            yield from chunks
+            outcome = "completed"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.observe_stream(route, outcome, time.perf_counter() - started)
+
+    def render(self) -> Tuple[bytes, str]:
+        """
+        生成 Prometheus 文本格式的指标
+
+        Returns:
+            (内容, Content-Type)
+        """
+        if self.multiprocess_mode:
+            # 每次抓取时从各进程的文件汇总
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# 进程级共享的指标
+metrics = Metrics()
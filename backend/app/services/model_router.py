@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+模型路由模块
+- 每个逻辑模型（如 4o）可以对应多个 Azure 部署（不同区域 / 不同资源）
+- 按部署统计延迟和错误率的指数滑动平均（EWMA）以及当前并发数，每次请求选择得分最优的部署
+- 主模型的部署全部熔断或并发已满时，按配置降级到备用模型（如 gpt-35-turbo）
+
+部署配置（环境变量）：
+    AZURE_AI_ENDPOINT_4O / AZURE_AI_API_KEY_4O       主部署（与原配置相同）
+    AZURE_AI_ENDPOINT_4O_2 / AZURE_AI_API_KEY_4O_2   追加部署，编号从2开始连续递增
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import Config
+from .resilience import CircuitBreakerRegistry, circuit_breakers
+
+# 逻辑模型名称与环境变量后缀的对应关系
+MODEL_ENV_SUFFIXES = {
+    "4o": "4O",
+    "gpt-4": "GPT4",
+    "gpt-35-turbo": "GPT35",
+}
+
+# 追加部署的最大编号
+MAX_EXTRA_DEPLOYMENTS = 9
+
+# 错误率高于该值的部署视为不健康，只在没有其他选择时使用
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+class Deployment:
+    """
+    单个 Azure 部署及其运行统计
+    name 同时用作HTTP连接池和熔断器的标识；主部署的 name 与模型名称相同
+    """
+
+    def __init__(self, name: str, model: str, endpoint: str, api_key: str):
+        self.name = name
+        self.model = model
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        # 普通请求记录总耗时，流式请求记录首字节耗时，两者分开统计
+        self.latency_ewma: Dict[str, Optional[float]] = {"complete": None, "stream": None}
+        self.error_ewma = 0.0
+
+    def score(self, kind: str) -> float:
+        """越小越好：延迟 × (1 + 并发数) / 成功率；尚无延迟数据的部署优先，用于探索"""
+        latency = self.latency_ewma.get(kind)
+        if latency is None:
+            latency = self.latency_ewma["complete"] or self.latency_ewma["stream"] or 0.0
+        return latency * (1 + self.in_flight) / max(1.0 - self.error_ewma, 0.05)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency_ewma": {kind: round(value, 4) if value is not None else None
+                             for kind, value in self.latency_ewma.items()},
+            "error_rate_ewma": round(self.error_ewma, 4),
+        }
+
+
+def load_deployments_from_env(primary_keys: Dict[str, str] = None,
+                              primary_endpoints: Dict[str, str] = None) -> Dict[str, List[Deployment]]:
+    """
+    从环境变量读取所有模型的部署
+
+    Args:
+        primary_keys / primary_endpoints: 主部署的密钥和端点（默认读取 AZURE_AI_API_KEY_<模型> 等）
+
+    Returns:
+        {模型名称: [Deployment, ...]}，未配置的部署会被跳过
+    """
+    deployments: Dict[str, List[Deployment]] = {}
+    for model, suffix in MODEL_ENV_SUFFIXES.items():
+        primary_key = (primary_keys or {}).get(model, os.getenv(f"AZURE_AI_API_KEY_{suffix}", ""))
+        endpoint = (primary_endpoints or {}).get(model, os.getenv(f"AZURE_AI_ENDPOINT_{suffix}", ""))
+        items = []
+        if primary_key and endpoint:
+            items.append(Deployment(model, model, endpoint, primary_key))
+        for index in range(2, MAX_EXTRA_DEPLOYMENTS + 2):
+            endpoint = os.getenv(f"AZURE_AI_ENDPOINT_{suffix}_{index}", "")
+            if not endpoint:
+                break
+            # 追加部署未单独配置密钥时沿用主部署的密钥
+            api_key = os.getenv(f"AZURE_AI_API_KEY_{suffix}_{index}", "") or primary_key
+            if api_key:
+                items.append(Deployment(f"{model}#{index}", model, endpoint, api_key))
+        deployments[model] = items
+    return deployments
+
+
+def parse_fallbacks(value: str) -> Dict[str, List[str]]:
+    """解析降级配置，如 "4o=gpt-35-turbo,gpt-4=4o|gpt-35-turbo" """
+    fallbacks: Dict[str, List[str]] = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        model, targets = item.split("=", 1)
+        fallbacks[model.strip()] = [target.strip() for target in targets.split("|") if target.strip()]
+    return fallbacks
+
+
+class ModelRouter:
+    """
+    模型路由器
+    线程安全，进程内的同步与异步客户端共用一个实例
+    """
+
+    def __init__(self, breakers: CircuitBreakerRegistry = None, fallbacks: Dict[str, List[str]] = None,
+                 max_in_flight: int = None, ewma_alpha: float = None):
+        self.breakers = breakers if breakers is not None else circuit_breakers
+        self.fallbacks = fallbacks if fallbacks is not None else parse_fallbacks(Config.AZURE_MODEL_FALLBACKS)
+        self.max_in_flight = max_in_flight if max_in_flight is not None else Config.AZURE_ROUTER_MAX_IN_FLIGHT
+        self.ewma_alpha = ewma_alpha if ewma_alpha is not None else Config.AZURE_ROUTER_EWMA_ALPHA
+        self._lock = threading.Lock()
+        self._deployments: Dict[str, List[Deployment]] = {}
+        self.fallback_requests = 0
+
+    def configure(self, deployments: Dict[str, List[Deployment]]):
+        """
+        设置部署列表
+        端点和密钥未变化的部署保留已有的统计数据（多个 OpenAIService 实例会重复调用）
+        """
+        with self._lock:
+            existing = {item.name: item for items in self._deployments.values() for item in items}
+            configured = {}
+            for model, items in deployments.items():
+                merged = []
+                for item in items:
+                    previous = existing.get(item.name)
+                    if previous is not None and previous.endpoint == item.endpoint and previous.api_key == item.api_key:
+                        merged.append(previous)
+                    else:
+                        merged.append(item)
+                configured[model] = merged
+            self._deployments = configured
+
+    def has_model(self, model: str) -> bool:
+        """模型自身是否配置了部署"""
+        with self._lock:
+            return bool(self._deployments.get(model))
+
+    def can_serve(self, model: str) -> bool:
+        """模型自身或其备用模型是否配置了部署"""
+        return any(self.has_model(candidate) for candidate in [model] + self.fallbacks.get(model, []))
+
+    def models(self) -> List[str]:
+        with self._lock:
+            return list(self._deployments.keys())
+
+    def _is_saturated(self, deployment: Deployment) -> bool:
+        return 0 < self.max_in_flight <= deployment.in_flight
+
+    def _partition(self, model: str, kind: str, excluded: set) -> Tuple[List[Deployment], List[Deployment]]:
+        """
+        把某个模型未满的部署分为 (健康, 降级) 两组，组内按得分排序（调用方需持有锁）
+        本次调用中已失败过的部署和错误率过高的部署属于降级组
+        """
+        preferred, degraded = [], []
+        for deployment in self._deployments.get(model, []):
+            if self._is_saturated(deployment):
+                continue
+            if deployment.name in excluded or deployment.error_ewma >= UNHEALTHY_ERROR_RATE:
+                degraded.append(deployment)
+            else:
+                preferred.append(deployment)
+        preferred.sort(key=lambda item: item.score(kind))
+        degraded.sort(key=lambda item: (item.name in excluded, item.score(kind)))
+        return preferred, degraded
+
+    def _ranked(self, model: str, kind: str, exclude: Iterable[str]) -> List[Deployment]:
+        """
+        按优先级排列候选部署：
+        主模型健康部署 → 备用模型健康部署 → 主模型降级部署 → 备用模型降级部署
+        """
+        excluded = set(exclude)
+        healthy, degraded = [], []
+        with self._lock:
+            for candidate_model in [model] + self.fallbacks.get(model, []):
+                preferred, fallback = self._partition(candidate_model, kind, excluded)
+                healthy.extend(preferred)
+                degraded.extend(fallback)
+        return healthy + degraded
+
+    def acquire(self, model: str, kind: str = "complete", exclude: Iterable[str] = ()) -> Optional[Deployment]:
+        """
+        为一次请求选择部署，并占用一个并发名额
+
+        Args:
+            model: 请求的逻辑模型
+            kind: "complete"（普通请求）或 "stream"（流式请求）
+            exclude: 本次调用中已经失败过的部署，优先换用其他部署
+
+        Returns:
+            选中的部署（可能属于备用模型）；所有部署都熔断或并发已满时返回None
+        """
+        for deployment in self._ranked(model, kind, exclude):
+            # allow_request 会占用半开状态的探测名额，因此只对真正要使用的部署调用
+            if not self.breakers.get(deployment.name).allow_request():
+                continue
+            with self._lock:
+                deployment.in_flight += 1
+                deployment.requests += 1
+                if deployment.model != model:
+                    self.fallback_requests += 1
+            return deployment
+        return None
+
+    def release(self, deployment: Deployment, latency: Optional[float], success: bool, kind: str = "complete"):
+        """
+        请求结束后归还并发名额并更新统计
+
+        Args:
+            latency: 耗时秒数；失败时可传 None，只更新错误率
+            success: 上游是否健康地完成了请求（4xx 客户端错误也视为成功）
+        """
+        alpha = self.ewma_alpha
+        with self._lock:
+            deployment.in_flight = max(deployment.in_flight - 1, 0)
+            deployment.error_ewma += alpha * ((0.0 if success else 1.0) - deployment.error_ewma)
+            if not success:
+                deployment.failures += 1
+            if latency is not None:
+                previous = deployment.latency_ewma.get(kind)
+                deployment.latency_ewma[kind] = latency if previous is None else previous + alpha * (latency - previous)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各部署的路由统计与熔断状态"""
+        with self._lock:
+            snapshot = {
+                item.name: item.to_dict()
+                for items in self._deployments.values()
+                for item in items
+            }
+            fallback_requests = self.fallback_requests
+        for name, item in snapshot.items():
+            item["circuit"] = self.breakers.get(name).state
+        return {
+            "deployments": snapshot,
+            "fallbacks": self.fallbacks,
+            "fallback_requests": fallback_requests,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+# 进程级共享的模型路由器
+model_router = ModelRouter()
+
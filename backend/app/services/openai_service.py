@@ -2,13 +2,20 @@
 """
 OpenAI Azure API服务
 - 封装与OpenAI Azure API的交互逻辑
+- 每次调用的token用量、耗时和首字耗时记录到用量计量器（usage_meter）和 Prometheus 指标
 """
 
 import os
 import time
 import requests
 import json
-from typing import List, Dict, Tuple, Optional, Generator
+from typing import List, Dict, Tuple, Optional, Generator, Mapping
+from ..config import Config
+from .http_pool import http_session_pool
+from .metrics import metrics
+from .model_router import Deployment, load_deployments_from_env, model_router
+from .resilience import Deadline, RetryPolicy
+from .usage_meter import usage_meter
 
 class OpenAIService:
     """
@@ -35,7 +42,20 @@ class OpenAIService:
         self.default_temperature = 0.7
         self.default_max_tokens = 2048
         self.default_top_p = 1
-        self.default_model = "4o"
+        self.default_model = Config.AZURE_DEFAULT_MODEL
+        
+        # 进程级共享的HTTP连接池（按部署区分，复用keep-alive连接）
+        self.http_pool = http_session_pool
+        
+        # 进程级共享的模型路由器：每个模型可有多个部署，按延迟和错误率选择，必要时降级到备用模型
+        self.router = model_router
+        self.router.configure(load_deployments_from_env(self.AZURE_AI_API_KEY_MAP, self.AZURE_AI_MODEL_ENDPOINT))
+        
+        # 容错：429/5xx 重试策略（熔断器按部署维护在路由器中）
+        self.retry_policy = RetryPolicy()
+        
+        # 进程级共享的用量计量器
+        self.usage_meter = usage_meter
     
     def print_log(self, message: str):
         """
@@ -51,7 +71,11 @@ class OpenAIService:
         max_tokens: int = None,
         json_response: bool = False,
         model: str = None,
-        top_p: float = None
+        top_p: float = None,
+        deadline: Deadline = None,
+        timeout: float = None,
+        user_id: str = None,
+        endpoint: str = None
     ) -> Tuple[Optional[str], int]:
         """
         调用Azure GPT模型进行对话
@@ -63,58 +87,33 @@ class OpenAIService:
             json_response: 是否返回JSON格式
             model: 使用的模型名称
             top_p: top_p参数
+            deadline: 截止时间（可在多次调用之间传递），包含所有重试
+            timeout: 未传入 deadline 时本次调用的总超时秒数，默认 AZURE_REQUEST_DEADLINE
+            user_id: 发起调用的用户（用量统计）
+            endpoint: 调用来源，如 "chat.message_sync"（用量统计）
             
         Returns:
             Tuple[回复内容, 使用的token数量]
         """
-        # 使用默认值
-        temperature = temperature if temperature is not None else self.default_temperature
-        max_tokens = max_tokens if max_tokens is not None else self.default_max_tokens
-        model = model if model is not None else self.default_model
-        top_p = top_p if top_p is not None else self.default_top_p
-        
-        # 验证模型是否支持
-        if model not in self.AZURE_AI_API_KEY_MAP:
-            self.print_log(f"不支持的模型: {model}")
-            return None, 0
-            
-        # 获取API密钥和端点
-        api_key = self.AZURE_AI_API_KEY_MAP[model]
-        endpoint = self.AZURE_AI_MODEL_ENDPOINT[model]
-        
-        if not api_key or not endpoint:
-            self.print_log(f"模型 {model} 的API密钥或端点未配置")
+        request = self._prepare_request(message_list, temperature, max_tokens, model, top_p,
+                                        json_response=json_response)
+        if request is None:
             return None, 0
-        
-        # 设置请求头
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": api_key,
-        }
-        
-        # 设置响应格式
-        response_format = {"type": "text"}  # 返回文本格式
-        if json_response:
-            response_format = {"type": "json_object"}
-        
-        # 构造请求体
-        payload = {
-            "messages": message_list,
-            "temperature": temperature,
-            "response_format": response_format,
-            "top_p": top_p,
-            "max_tokens": max_tokens
-        }
+        model, payload = request
         
         self.print_log(f"调用Azure OpenAI模型 {model}，消息数量: {len(message_list)}")
         
         start_time = time.time()  # 记录开始时间
         
-        # 发送请求并处理响应
+        # 发送请求（含路由、重试与熔断）并处理响应
+        result = self._post_with_retry(model, payload, Deadline.resolve(deadline, timeout))
+        if result is None:
+            self._record_usage(endpoint, user_id, model, latency=time.time() - start_time, success=False)
+            return None, 0
+        deployment, response, latency = result
+        self.router.release(deployment, latency, True)
+        
         try:
-            response = requests.post(endpoint, headers=headers, json=payload)
-            response.raise_for_status()  # 检查请求是否成功
-            
             res = response.json()
             
             end_time = time.time()  # 记录结束时间
@@ -123,18 +122,125 @@ class OpenAIService:
             
             token = res["usage"]["total_tokens"]
             self.print_log(f"使用了 {token} 个tokens")
+            self._record_usage(endpoint, user_id, deployment.model, deployment.name,
+                                    prompt_tokens=res["usage"].get("prompt_tokens", 0),
+                                    completion_tokens=res["usage"].get("completion_tokens", 0),
+                                    latency=elapsed_time)
             
             return res["choices"][0]["message"]["content"], token
             
-        except requests.RequestException as e:
-            self.print_log(f"API请求失败: {e}")
-            return None, 0
-        except KeyError as e:
+        except (KeyError, IndexError, TypeError, ValueError) as e:
             self.print_log(f"响应格式错误: {e}")
-            return None, 0
         except Exception as e:
             self.print_log(f"未知错误: {e}")
-            return None, 0
+        self._record_usage(endpoint, user_id, deployment.model, deployment.name,
+                                latency=time.time() - start_time, success=False)
+        return None, 0
+    
+    def _record_usage(self, endpoint: str = None, user_id: str = None, model: str = None,
+                      deployment: str = None, **fields):
+        """记录一次调用的用量（参数见 UsageMeter.record），同时记录耗时指标"""
+        self.usage_meter.record(endpoint, user_id, model, deployment, **fields)
+        metrics.observe_azure(model, endpoint, fields.get("stream", False), fields.get("success", True),
+                              fields.get("latency"), fields.get("ttft"))
+    
+    def _check_response(self, breaker, status_code: int,
+                        headers: Mapping[str, str]) -> Tuple[str, Optional[float]]:
+        """
+        根据响应状态码更新熔断器，判断下一步动作（同步与异步客户端共用）
+        
+        Returns:
+            (动作, Retry-After秒数)；动作为 "ok"（成功）、"retry"（可重试）或 "fail"（不可重试）
+        """
+        if status_code < 400:
+            breaker.record_success()
+            return "ok", None
+        if self.retry_policy.is_retryable_status(status_code):
+            breaker.record_failure()
+            return "retry", self.retry_policy.parse_retry_after(headers)
+        # 其他4xx说明请求本身有问题，上游是健康的
+        breaker.record_success()
+        return "fail", None
+    
+    def _acquire_deployment(self, model: str, kind: str, tried: List[str], deadline: Deadline) -> Optional[Deployment]:
+        """
+        检查截止时间并通过路由器选择部署
+        
+        Returns:
+            选中的部署；超过截止时间或所有部署都熔断/并发已满时返回None（快速失败）
+        """
+        if deadline.expired:
+            self.print_log(f"Deadline exceeded before calling model {model}")
+            return None
+        deployment = self.router.acquire(model, kind, exclude=tried)
+        if deployment is None:
+            self.print_log(f"No available deployment for model {model} (circuit open or saturated), failing fast")
+            return None
+        if deployment.model != model:
+            self.print_log(f"Model {model} unavailable, falling back to {deployment.model}")
+        return deployment
+    
+    @staticmethod
+    def _build_headers(deployment: Deployment) -> Dict[str, str]:
+        """构造请求头"""
+        return {
+            "Content-Type": "application/json",
+            "api-key": deployment.api_key,
+        }
+    
+    def _post_with_retry(self, model: str, payload: Dict, deadline: Deadline,
+                         stream: bool = False) -> Optional[Tuple[Deployment, requests.Response, float]]:
+        """
+        发送请求，对 429/5xx、连接错误和超时按退避策略重试，重试时优先换用其他部署
+        
+        Returns:
+            (部署, 成功的响应, 耗时)；调用方负责调用 router.release 归还并发名额，流式响应还需关闭。
+            失败、熔断或超过截止时间时返回None
+        """
+        kind = "stream" if stream else "complete"
+        tried: List[str] = []
+        attempt = 0
+        while True:
+            attempt += 1
+            deployment = self._acquire_deployment(model, kind, tried, deadline)
+            if deployment is None:
+                return None
+            breaker = self.router.breakers.get(deployment.name)
+            
+            retry_after = None
+            started = time.monotonic()
+            try:
+                session = self.http_pool.get_session(deployment.name)
+                response = session.post(deployment.endpoint, headers=self._build_headers(deployment), json=payload,
+                                        stream=stream, timeout=deadline.clamp(*self.http_pool.timeout))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                self.router.release(deployment, None, False, kind)
+                error = str(e)
+            except requests.RequestException as e:
+                breaker.release_probe()
+                self.router.release(deployment, None, True, kind)
+                self.print_log(f"API请求失败: {e}")
+                return None
+            else:
+                latency = time.monotonic() - started
+                action, retry_after = self._check_response(breaker, response.status_code, response.headers)
+                if action == "ok":
+                    return deployment, response, latency
+                self.router.release(deployment, latency, action == "fail", kind)
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                response.close()
+                if action == "fail":
+                    self.print_log(f"API请求失败: {error}")
+                    return None
+            
+            tried.append(deployment.name)
+            delay = self.retry_policy.next_delay(attempt, deadline, retry_after)
+            if delay is None:
+                self.print_log(f"API请求失败（{deployment.name}，第{attempt}次尝试，不再重试）: {error}")
+                return None
+            self.print_log(f"API请求失败（{deployment.name}，第{attempt}次尝试），{delay:.2f} 秒后重试: {error}")
+            time.sleep(delay)
     
     def chat(self, messages: List[Dict], **kwargs) -> Tuple[Optional[str], int]:
         """
@@ -185,11 +291,7 @@ class OpenAIService:
         Returns:
             bool: 模型是否可用
         """
-        return (
-            model in self.AZURE_AI_API_KEY_MAP and 
-            bool(self.AZURE_AI_API_KEY_MAP[model]) and
-            bool(self.AZURE_AI_MODEL_ENDPOINT.get(model))
-        )
+        return self.router.has_model(model)
     
     def get_available_models(self) -> List[str]:
         """
@@ -198,28 +300,47 @@ class OpenAIService:
         Returns:
             List[str]: 可用模型列表
         """
-        return [model for model in self.AZURE_AI_API_KEY_MAP.keys() if self.is_model_available(model)]
+        return [model for model in self.router.models() if self.is_model_available(model)]
     
-    def call_azure_gpt_stream(
-        self, 
-        message_list: List[Dict], 
+    def get_pool_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        获取各模型HTTP连接池的统计指标
+        
+        Returns:
+            Dict: {模型名称: {requests, hits, new_connections, wait_time_*...}}
+        """
+        return self.http_pool.get_stats()
+    
+    def get_circuit_stats(self) -> Dict[str, Dict]:
+        """
+        获取各部署熔断器的状态
+        
+        Returns:
+            Dict: {部署名称: {state, consecutive_failures, rejected...}}
+        """
+        return self.router.breakers.stats()
+    
+    def get_router_stats(self) -> Dict:
+        """
+        获取模型路由统计（各部署的延迟/错误率滑动平均、并发数和降级次数）
+        """
+        return self.router.stats()
+    
+    def _prepare_request(
+        self,
+        message_list: List[Dict],
         temperature: float = None,
         max_tokens: int = None,
         model: str = None,
-        top_p: float = None
-    ) -> Generator[str, None, None]:
+        top_p: float = None,
+        json_response: bool = False,
+        stream: bool = False
+    ) -> Optional[Tuple[str, Dict]]:
         """
-        调用Azure GPT模型进行流式对话
+        准备请求的模型和请求体（同步与异步客户端共用），端点与密钥在每次尝试时由路由器选择
         
-        Args:
-            message_list: 消息列表，格式为 [{"role": "user", "content": "消息内容"}, ...]
-            temperature: 温度参数，控制回复的随机性 (0-1)
-            max_tokens: 最大token数
-            model: 使用的模型名称
-            top_p: top_p参数
-            
-        Yields:
-            str: 流式返回的文本片段
+        Returns:
+            (模型名称, 请求体)；模型不可用时返回None
         """
         # 使用默认值
         temperature = temperature if temperature is not None else self.default_temperature
@@ -229,64 +350,194 @@ class OpenAIService:
         
         # 验证模型是否支持
         if model not in self.AZURE_AI_API_KEY_MAP:
-            self.print_log(f"Unsupported model: {model}")
-            return
-            
-        # 获取API密钥和端点
-        api_key = self.AZURE_AI_API_KEY_MAP[model]
-        endpoint = self.AZURE_AI_MODEL_ENDPOINT[model]
-        
-        if not api_key or not endpoint:
-            self.print_log(f"API key or endpoint not configured for model {model}")
-            return
+            self.print_log(f"不支持的模型: {model}")
+            return None
         
-        # 设置请求头
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": api_key,
-        }
+        # 模型及其备用模型都没有配置部署
+        if not self.router.can_serve(model):
+            self.print_log(f"模型 {model} 的API密钥或端点未配置")
+            return None
         
-        # 构造请求体，启用流式输出
+        # 构造请求体
         payload = {
             "messages": message_list,
             "temperature": temperature,
             "top_p": top_p,
-            "max_tokens": max_tokens,
-            "stream": True
+            "max_tokens": max_tokens
         }
+        if stream:
+            # 启用流式输出
+            payload["stream"] = True
+            if Config.AZURE_STREAM_INCLUDE_USAGE:
+                # 流的最后一个数据块携带 usage（需要 api-version 2024-09-01 及以上）
+                payload["stream_options"] = {"include_usage": True}
+        else:
+            # 设置响应格式
+            payload["response_format"] = {"type": "json_object" if json_response else "text"}
+        
+        return model, payload
+    
+    def _prepare_stream_request(
+        self,
+        message_list: List[Dict],
+        temperature: float = None,
+        max_tokens: int = None,
+        model: str = None,
+        top_p: float = None
+    ) -> Optional[Tuple[str, Dict]]:
+        """
+        准备流式请求的模型和请求体（同步与异步客户端共用）
+        
+        Returns:
+            (模型名称, 请求体)；模型不可用时返回None
+        """
+        request = self._prepare_request(message_list, temperature, max_tokens, model, top_p, stream=True)
+        if request is not None:
+            self.print_log(f"Calling Azure OpenAI model {request[0]} with streaming, message count: {len(message_list)}")
+        return request
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """
+        解析一行SSE数据
         
-        self.print_log(f"Calling Azure OpenAI model {model} with streaming, message count: {len(message_list)}")
+        Returns:
+            (是否已结束, 文本片段或None, usage或None)
+        """
+        if not line.startswith('data: '):
+            return False, None, None
+        data = line[6:]  # 移除 'data: ' 前缀
         
+        if data.strip() == '[DONE]':
+            return True, None, None
+            
         try:
-            # 发送流式请求
-            response = requests.post(endpoint, headers=headers, json=payload, stream=True)
-            response.raise_for_status()
+            json_data = json.loads(data)
+        except json.JSONDecodeError:
+            return False, None, None
+        if 'choices' in json_data and len(json_data['choices']) > 0:
+            delta = json_data['choices'][0].get('delta', {})
+            if 'content' in delta:
+                return False, delta['content'], None
+        # 开启 include_usage 时，最后一个数据块的 choices 为空，只携带 usage
+        return False, None, json_data.get('usage')
+    
+    def _record_stream_usage(self, message_list: List[Dict], model: str, deployment: Optional[Deployment],
+                             started: float, ttft: Optional[float], pieces: List[str],
+                             stream_usage: Optional[Dict], success: bool,
+                             user_id: str = None, endpoint: str = None, usage: Dict = None):
+        """
+        记录一次流式调用的用量（同步与异步客户端共用）
+        流中没有 usage 时在本地计数，并标记为估算值
+        
+        Args:
+            started: 发起请求时的 time.monotonic()
+            ttft: 首字耗时（秒），没有收到任何文本时为 None
+            pieces: 已收到的文本片段
+            stream_usage: 流中返回的 usage
+            usage: 调用方传入的字典，填充本次调用的token用量
+        """
+        if stream_usage:
+            prompt_tokens = stream_usage.get("prompt_tokens", 0)
+            completion_tokens = stream_usage.get("completion_tokens", 0)
+        else:
+            prompt_tokens = self.usage_meter.count_prompt_tokens(message_list)
+            completion_tokens = self.usage_meter.count_completion_tokens("".join(pieces))
+        latency = time.monotonic() - started
+        if usage is not None:
+            usage.update({
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "estimated": not stream_usage,
+                "ttft": ttft,
+                "latency": latency,
+            })
+        self._record_usage(endpoint, user_id, deployment.model if deployment else model,
+                                deployment.name if deployment else None,
+                                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                latency=latency, ttft=ttft, stream=True, success=success,
+                                estimated=not stream_usage)
+    
+    def call_azure_gpt_stream(
+        self, 
+        message_list: List[Dict], 
+        temperature: float = None,
+        max_tokens: int = None,
+        model: str = None,
+        top_p: float = None,
+        deadline: Deadline = None,
+        timeout: float = None,
+        user_id: str = None,
+        endpoint: str = None,
+        usage: Dict = None
+    ) -> Generator[str, None, None]:
+        """
+        调用Azure GPT模型进行流式对话
+        
+        Args:
+            message_list: 消息列表，格式为 [{"role": "user", "content": "消息内容"}, ...]
+            temperature: 温度参数，控制回复的随机性 (0-1)
+            max_tokens: 最大token数
+            model: 使用的模型名称
+            top_p: top_p参数
+            deadline: 截止时间，约束建立流（收到响应头）之前的所有尝试
+            timeout: 未传入 deadline 时的超时秒数，默认 AZURE_REQUEST_DEADLINE
+            user_id: 发起调用的用户（用量统计）
+            endpoint: 调用来源，如 "chat.message"（用量统计）
+            usage: 传入字典时，流结束后填充本次调用的token用量（见 _record_stream_usage）
             
+        Yields:
+            str: 流式返回的文本片段
+        """
+        request = self._prepare_stream_request(message_list, temperature, max_tokens, model, top_p)
+        if request is None:
+            return
+        model, payload = request
+        
+        # 只在收到响应头之前重试，开始输出后不再重试，避免重复内容
+        started = time.monotonic()
+        result = self._post_with_retry(model, payload, Deadline.resolve(deadline, timeout), stream=True)
+        if result is None:
+            self._record_stream_usage(message_list, model, None, started, None, [], None, False,
+                                      user_id, endpoint, usage)
+            return
+        deployment, response, latency = result
+        
+        success = True
+        ttft = None
+        pieces: List[str] = []
+        stream_usage = None
+        try:
             # 处理流式响应
             for line in response.iter_lines():
                 if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data = line[6:]  # 移除 'data: ' 前缀
-                        
-                        if data.strip() == '[DONE]':
-                            break
-                            
-                        try:
-                            json_data = json.loads(data)
-                            if 'choices' in json_data and len(json_data['choices']) > 0:
-                                delta = json_data['choices'][0].get('delta', {})
-                                if 'content' in delta:
-                                    yield delta['content']
-                        except json.JSONDecodeError:
-                            continue
+                    done, content, line_usage = self._parse_stream_line(line.decode('utf-8'))
+                    if done:
+                        break
+                    if line_usage:
+                        stream_usage = line_usage
+                    if content is not None:
+                        if ttft is None:
+                            ttft = time.monotonic() - started
+                        pieces.append(content)
+                        yield content
                             
         except requests.RequestException as e:
+            # 流中断计入熔断器和路由统计的失败次数
+            success = False
+            self.router.breakers.get(deployment.name).record_failure()
             self.print_log(f"API request failed: {e}")
             return
         except Exception as e:
             self.print_log(f"Unknown error: {e}")
             return
+        finally:
+            # 无论正常结束还是客户端提前断开，都要关闭响应，将连接归还连接池
+            response.close()
+            self.router.release(deployment, latency, success, "stream")
+            self._record_stream_usage(message_list, model, deployment, started, ttft, pieces, stream_usage,
+                                      success, user_id, endpoint, usage)
     
     def chat_stream(self, messages: List[Dict], **kwargs) -> Generator[str, None, None]:
         """
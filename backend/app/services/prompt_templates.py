@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+系统提示词模板模块
+- 每个人设的提示词只编译一次：固定的人设前缀 + 用户信息/情绪/情绪变化三个可选段落
+- 渲染结果按 (人设, 用户画像字段, 当前情绪, 历史情绪) 缓存在有界LRU中
+- 人设前缀放在最前面且逐字节不变，便于 Azure OpenAI 的提示词前缀缓存命中
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import Config
+
+# 用户画像中参与提示词渲染的字段及其显示名称（顺序即渲染顺序）
+PROFILE_FIELDS = (
+    ("age_range", "年龄段"),
+    ("personality", "性格特点"),
+    ("communication_style", "沟通偏好"),
+    ("interests", "兴趣爱好"),
+)
+
+PROFILE_HEADER = "\n\n## 用户信息：\n"
+PROFILE_LINE = "- {label}: {value}\n"
+EMOTION_SECTION = "\n\n## 当前用户情绪状态: {emotion}\n请特别关注用户的情绪，给予相应的情感支持和理解。"
+CONTINUITY_SECTION = "\n\n## 情绪变化提醒: 用户之前的情绪状态是{previous}，现在是{emotion}，请关注这种变化并给予适当的关怀。"
+
+NEUTRAL = "neutral"
+
+
+class PersonaPromptTemplate:
+    """
+    单个人设的已编译提示词模板
+    static_prefix 即人设的 SYSTEM_PROMPT，所有渲染结果都以它开头
+    """
+
+    def __init__(self, persona):
+        self.persona_key = type(persona).__name__
+        self.static_prefix = persona.SYSTEM_PROMPT
+
+    @staticmethod
+    def profile_fields(user_profile: Optional[Dict[str, Any]]) -> Optional[Tuple[Tuple[str, str], ...]]:
+        """
+        提取参与渲染的画像字段
+
+        Returns:
+            ((显示名称, 值), ...)；没有画像时返回 None（与空画像不同，空画像仍会渲染标题）
+        """
+        if not user_profile:
+            return None
+        return tuple(
+            (label, str(user_profile[key]))
+            for key, label in PROFILE_FIELDS
+            if user_profile.get(key)
+        )
+
+    def render(self, profile_fields: Optional[Tuple[Tuple[str, str], ...]],
+               emotional_state: str, user_emotional_history: str) -> str:
+        """渲染完整的系统提示词"""
+        parts = [self.static_prefix]
+
+        # 根据用户画像调整提示词
+        if profile_fields is not None:
+            parts.append(PROFILE_HEADER)
+            parts.extend(PROFILE_LINE.format(label=label, value=value) for label, value in profile_fields)
+
+        # 根据情绪状态调整回应方式
+        if emotional_state != NEUTRAL:
+            parts.append(EMOTION_SECTION.format(emotion=emotional_state))
+
+        # 如果用户历史情绪状态与当前不同，提供连续性关怀
+        if user_emotional_history != NEUTRAL and user_emotional_history != emotional_state:
+            parts.append(CONTINUITY_SECTION.format(previous=user_emotional_history, emotion=emotional_state))
+
+        return "".join(parts)
+
+
+class PromptTemplateCache:
+    """
+    系统提示词渲染缓存
+    线程安全，进程内所有聊天服务共用一个实例
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size if max_size is not None else Config.PROMPT_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._templates: Dict[str, PersonaPromptTemplate] = {}
+        self._rendered: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_template(self, persona) -> PersonaPromptTemplate:
+        """获取人设的已编译模板（每个人设只编译一次）"""
+        persona_key = type(persona).__name__
+        template = self._templates.get(persona_key)
+        if template is None:
+            with self._lock:
+                template = self._templates.setdefault(persona_key, PersonaPromptTemplate(persona))
+        return template
+
+    def render(self, persona, user_profile: Dict = None, emotional_state: str = NEUTRAL,
+               user_emotional_history: str = NEUTRAL) -> str:
+        """
+        获取渲染后的系统提示词，命中缓存时直接返回
+
+        Args:
+            persona: 人设配置对象（如 XinErPersona()）
+            user_profile: 用户画像
+            emotional_state: 当前消息的情绪
+            user_emotional_history: 用户之前的情绪状态
+        """
+        template = self.get_template(persona)
+        profile_fields = template.profile_fields(user_profile)
+        # 画像字段元组本身可哈希，直接作为键的一部分，避免每次请求计算摘要
+        key = (template.persona_key, profile_fields, emotional_state, user_emotional_history)
+
+        if self.max_size > 0:
+            with self._lock:
+                prompt = self._rendered.get(key)
+                if prompt is not None:
+                    self._rendered.move_to_end(key)
+                    self.hits += 1
+                    return prompt
+                self.misses += 1
+
+        prompt = template.render(profile_fields, emotional_state, user_emotional_history)
+
+        if self.max_size > 0:
+            with self._lock:
+                self._rendered[key] = prompt
+                self._rendered.move_to_end(key)
+                while len(self._rendered) > self.max_size:
+                    self._rendered.popitem(last=False)
+                    self.evictions += 1
+        return prompt
+
+    def clear(self):
+        """清空渲染缓存（人设配置变更后调用）"""
+        with self._lock:
+            self._templates.clear()
+            self._rendered.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "templates": len(self._templates),
+                "entries": len(self._rendered),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# 进程级共享的系统提示词缓存
+prompt_template_cache = PromptTemplateCache()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+报告结果缓存模块
+- 按 (报告类型, 规范化后的输入, 提示词版本) 的哈希缓存生成成功的报告，相同答案不再重复调用大模型
+- 后端可选：进程内LRU（memory）或 MongoDB 集合 + TTL 索引（mongo，多个 worker 共享）
+- 同一进程内相同输入的并发请求只调用一次大模型，其余请求等待其结果
+- 提示词变化时版本号随之变化，旧结果自然失效；也可通过管理接口显式清除
+"""
+
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..config import Config
+from .resilience import Deadline
+
+
+def normalize_input(value: Any) -> Any:
+    """
+    规范化报告输入：字符串做 NFKC 归一并合并空白，字典按键排序（由序列化完成）
+    使只在空白、全半角上不同的答案得到相同的缓存键
+    """
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFKC", value).split())
+    if isinstance(value, dict):
+        return {str(key): normalize_input(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(item) for item in value]
+    return value
+
+
+def fingerprint(text: str) -> str:
+    """计算文本的短摘要，用作提示词版本"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def make_cache_key(report_type: str, payload: Any, prompt_version: str) -> str:
+    """根据报告类型、输入和提示词版本生成缓存键"""
+    normalized = json.dumps(normalize_input(payload), sort_keys=True, ensure_ascii=False,
+                            separators=(",", ":"), default=str)
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{report_type}:{prompt_version}:{digest}"
+
+
+class MemoryReportCacheBackend:
+    """进程内LRU后端（gunicorn 多个 worker 之间互不共享）"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = max_entries if max_entries is not None else Config.REPORT_CACHE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else Config.REPORT_CACHE_TTL
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict]]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, report_type: str, result: Dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, report_type, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, report_type: str = None) -> int:
+        with self._lock:
+            if report_type is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            keys = [key for key, entry in self._entries.items() if entry[1] == report_type]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions}
+
+
+class MongoReportCacheBackend:
+    """
+    MongoDB 后端
+    过期由 expires_at 上的 TTL 索引清理（见 index_manager.REQUIRED_INDEXES），
+    TTL 监视器约每分钟运行一次，因此读取时也会检查 expires_at
+    """
+
+    name = "mongo"
+
+    def __init__(self, collection_name: str = None, ttl: float = None):
+        self.collection_name = collection_name or Config.REPORT_CACHE_COLLECTION
+        self.ttl = ttl if ttl is not None else Config.REPORT_CACHE_TTL
+
+    @property
+    def collection(self):
+        from ..extensions import mongo
+        return mongo.db[self.collection_name]
+
+    def get(self, key: str) -> Optional[Dict]:
+        doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now()}}, {"result": 1})
+        return doc["result"] if doc else None
+
+    def set(self, key: str, report_type: str, result: Dict):
+        now = datetime.now()
+        self.collection.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "report_type": report_type,
+                "result": result,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl),
+            },
+            upsert=True,
+        )
+
+    def invalidate(self, report_type: str = None) -> int:
+        query = {"report_type": report_type} if report_type else {}
+        return self.collection.delete_many(query).deleted_count
+
+    def stats(self) -> Dict[str, Any]:
+        return {"collection": self.collection_name}
+
+
+def create_backend(name: str = None):
+    """按名称创建缓存后端；"none" 或未知名称返回 None（不缓存）"""
+    name = (name if name is not None else Config.REPORT_CACHE_BACKEND).lower()
+    if name == "memory":
+        return MemoryReportCacheBackend()
+    if name == "mongo":
+        return MongoReportCacheBackend()
+    return None
+
+
+class ReportCache:
+    """
+    报告结果缓存
+    后端读写出错时只记录日志并当作未命中，不影响报告生成
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else create_backend()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def print_log(self, message: str):
+        print(f"[ReportCache] {message}")
+
+    def _lookup(self, key: str) -> Optional[Dict]:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            self.print_log(f"Cache read failed: {e}")
+            return None
+
+    def _store(self, key: str, report_type: str, result: Dict):
+        try:
+            self.backend.set(key, report_type, result)
+            with self._lock:
+                self.stores += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            self.print_log(f"Cache write failed: {e}")
+
+    def get(self, report_type: str, payload: Any, prompt_version: str) -> Optional[Dict]:
+        """查询缓存的报告，未命中或未启用时返回 None（计入命中率统计）"""
+        if not self.enabled:
+            return None
+        result = self._lookup(make_cache_key(report_type, payload, prompt_version))
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def set(self, report_type: str, payload: Any, prompt_version: str, result: Dict):
+        """保存生成成功的报告（如流式生成完成后）"""
+        if self.enabled:
+            self._store(make_cache_key(report_type, payload, prompt_version), report_type, result)
+
+    def get_or_compute(self, report_type: str, payload: Any, prompt_version: str,
+                       compute: Callable[[], Dict], is_cacheable: Callable[[Dict], bool] = None,
+                       deadline: Deadline = None) -> Dict:
+        """
+        获取缓存的报告，未命中时调用 compute 生成
+
+        Args:
+            report_type: 报告类型（如 "big_five"）
+            payload: 生成报告的输入（答案列表或报告数据）
+            prompt_version: 提示词版本，提示词变化后旧缓存不再命中
+            compute: 生成报告的函数
+            is_cacheable: 判断结果是否可缓存，默认只缓存 status 为 success 且未经补全的结果
+            deadline: 调用方的截止时间，等待同一输入的请求时最多等到截止时间；默认按 AZURE_REQUEST_DEADLINE
+
+        Returns:
+            报告结果
+        """
+        if not self.enabled:
+            return compute()
+        # 默认只缓存成功的结果；截断后补全的报告内容不完整，不缓存
+        is_cacheable = is_cacheable or (lambda result: result.get("status") == "success" and not result.get("repaired"))
+        key = make_cache_key(report_type, payload, prompt_version)
+
+        result = self._lookup(key)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+            return result
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                # 本线程负责生成
+                pending = self._inflight[key] = threading.Event()
+                self.misses += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            # 等待同一输入的请求生成完毕后重新查缓存；对方生成失败或超过截止时间时自行生成
+            # （compute 共用同一截止时间，已到期时会立即失败）
+            pending.wait(Deadline.resolve(deadline).remaining())
+            result = self._lookup(key)
+            if result is None:
+                return compute()
+            with self._lock:
+                self.hits += 1
+            return result
+
+        try:
+            result = compute()
+            if is_cacheable(result):
+                self._store(key, report_type, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    def invalidate(self, report_type: str = None) -> int:
+        """
+        清除缓存（修改提示词或切换模型后调用）
+
+        Args:
+            report_type: 只清除该类型的报告；为空时清除全部
+
+        Returns:
+            清除的条目数
+        """
+        if not self.enabled:
+            return 0
+        removed = self.backend.invalidate(report_type)
+        with self._lock:
+            self.invalidations += 1
+        self.print_log(f"Invalidated {removed} cached report(s) of type {report_type or 'all'}")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "backend": self.backend.name if self.enabled else "none",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "coalesced": self.coalesced,
+                "stores": self.stores,
+                "errors": self.errors,
+                "invalidations": self.invalidations,
+            }
+        if self.enabled:
+            try:
+                stats.update(self.backend.stats())
+            except Exception as e:
+                stats["backend_error"] = str(e)
+        return stats
+
+
+# 进程级共享的报告缓存
+report_cache = ReportCache()
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+报告异步任务模块
+- 报告生成接口可以只创建任务并立即返回 job_id，由后台线程池调用 ReportService 生成报告
+- 任务保存在 MongoDB（report_jobs 集合）中，客户端通过 GET /api/report/jobs/<id> 轮询状态和结果
+- 服务重启后，未完成的任务会在启动时重新入队；领取任务是原子操作，多个 worker 不会重复执行
+- 可选回调：任务结束后向 callback_url POST 任务结果（只允许 REPORT_JOB_WEBHOOK_HOSTS 中的主机）
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from pymongo import ReturnDocument
+
+from ..config import Config
+from .job_queue import BackgroundJobQueue
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# 各报告类型的必填字段、可选字段及对应的 ReportService 调用
+# run(service, payload, progress)：progress(阶段名, 阶段结果) 用于多阶段报告保存部分结果
+REPORT_JOB_TYPES: Dict[str, Dict[str, Any]] = {
+    "big_five": {
+        "fields": ("answers",),
+        "run": lambda service, payload, progress: service.generate_big_five_report(payload["answers"]),
+    },
+    "core_values": {
+        "fields": ("answers",),
+        "run": lambda service, payload, progress: service.generate_core_values_report(payload["answers"]),
+    },
+    "holistic": {
+        "fields": ("core_values_data", "big_five_data"),
+        "run": lambda service, payload, progress: service.generate_holistic_report(
+            payload["core_values_data"], payload["big_five_data"]),
+    },
+    "holistic_pipeline": {
+        "fields": ("answers",),
+        "optional_fields": ("core_values_answers",),
+        "run": lambda service, payload, progress: service.generate_holistic_pipeline(
+            payload["answers"], payload.get("core_values_answers"), on_stage=progress),
+    },
+}
+
+
+def register_report_job_type(report_type: str, fields: tuple, run: Callable[[Any, Dict, Callable], Dict],
+                             optional_fields: tuple = ()):
+    """注册新的报告任务类型"""
+    REPORT_JOB_TYPES[report_type] = {"fields": tuple(fields), "optional_fields": tuple(optional_fields), "run": run}
+
+
+class ReportJobManager:
+    """
+    报告任务管理器
+    进程内共享一个实例；任务执行在 BackgroundJobQueue 线程池中，LLM调用是IO密集型，线程即可
+    """
+
+    def __init__(self, report_service=None, db=None, job_queue: BackgroundJobQueue = None):
+        self._report_service = report_service
+        self._db = db
+        self.job_queue = job_queue or BackgroundJobQueue("ReportJobQueue", Config.REPORT_JOB_WORKERS)
+        self.webhooks_sent = 0
+        self.webhooks_failed = 0
+
+    def print_log(self, message: str):
+        """打印日志信息"""
+        print(f"[ReportJobs] {message}")
+
+    @property
+    def worker_id(self) -> str:
+        """当前进程的标识（gunicorn fork 之后 pid 会变化，因此每次读取）"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def report_service(self):
+        if self._report_service is None:
+            from .report_service import ReportService
+            self._report_service = ReportService()
+        return self._report_service
+
+    @property
+    def collection(self):
+        if self._db is not None:
+            return self._db[Config.REPORT_JOB_COLLECTION]
+        from ..extensions import mongo
+        return mongo.db[Config.REPORT_JOB_COLLECTION]
+
+    @staticmethod
+    def validate_webhook(callback_url: str):
+        """校验回调地址，不合法时抛出 ValueError"""
+        parsed = urlparse(callback_url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError("callback_url must be an absolute http(s) URL")
+        allowed = {host.strip().lower() for host in Config.REPORT_JOB_WEBHOOK_HOSTS.split(",") if host.strip()}
+        if parsed.hostname.lower() not in allowed:
+            raise ValueError(f"callback_url host {parsed.hostname} is not allowed")
+
+    def submit(self, report_type: str, payload: Dict[str, Any], callback_url: str = None,
+               user_id: str = None) -> Dict[str, Any]:
+        """
+        创建报告任务并入队
+
+        Args:
+            report_type: 报告类型（见 REPORT_JOB_TYPES）
+            payload: 生成报告所需的参数（与同步接口的请求体相同）
+            callback_url: 任务结束后回调的地址（可选）
+            user_id: 提交任务的用户（可选，仅用于记录）
+
+        Returns:
+            Dict: 任务信息（不含结果）
+
+        Raises:
+            ValueError: 报告类型未知、缺少必填字段或回调地址不合法
+        """
+        spec = REPORT_JOB_TYPES.get(report_type)
+        if spec is None:
+            raise ValueError(f"Unknown report type: {report_type}")
+        missing = [field for field in spec["fields"] if not payload.get(field)]
+        if missing:
+            raise ValueError(f"{', '.join(missing)} {'is' if len(missing) == 1 else 'are'} required")
+        if callback_url:
+            self.validate_webhook(callback_url)
+
+        now = datetime.now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "report_type": report_type,
+            "payload": {
+                field: payload[field]
+                for field in spec["fields"] + spec.get("optional_fields", ())
+                if payload.get(field) is not None
+            },
+            "status": QUEUED,
+            "attempts": 0,
+            "user_id": user_id,
+            "callback_url": callback_url,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=Config.REPORT_JOB_TTL),
+        }
+        self.collection.insert_one(job)
+        self.job_queue.submit(self.run, job["_id"], key=job["_id"])
+        self.print_log(f"Job {job['_id']} ({report_type}) queued")
+        return self.to_view(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态和结果；任务不存在时返回 None"""
+        job = self.collection.find_one({"_id": job_id}, {"payload": 0})
+        return self.to_view(job) if job else None
+
+    @staticmethod
+    def to_view(job: Dict[str, Any]) -> Dict[str, Any]:
+        """把任务文档转换为接口返回格式"""
+        view = {
+            "job_id": job["_id"],
+            "report_type": job["report_type"],
+            "status": job["status"],
+            "attempts": job.get("attempts", 0),
+        }
+        for field in ("created_at", "started_at", "finished_at"):
+            if job.get(field):
+                view[field] = job[field].isoformat()
+        if job.get("partial"):
+            view["partial"] = job["partial"]
+        if job.get("result") is not None:
+            view["result"] = job["result"]
+        if job.get("error"):
+            view["error"] = job["error"]
+        return view
+
+    def run(self, job_id: str):
+        """领取并执行任务（在线程池中执行）"""
+        job = self.collection.find_one_and_update(
+            {"_id": job_id, "status": QUEUED},
+            {"$set": {"status": RUNNING, "started_at": datetime.now(), "worker": self.worker_id},
+             "$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            # 已被其他 worker 领取或已结束
+            return
+
+        if job["attempts"] > Config.REPORT_JOB_MAX_ATTEMPTS:
+            # 多次在执行中被中断（如 worker 崩溃）的任务不再重试
+            result = {"error": f"Job abandoned after {job['attempts'] - 1} interrupted attempt(s)"}
+        else:
+            spec = REPORT_JOB_TYPES.get(job["report_type"])
+            started = time.monotonic()
+            try:
+                result = spec["run"](self.report_service, job["payload"],
+                                     lambda stage, stage_result: self._record_progress(job_id, stage, stage_result))
+            except Exception as e:
+                result = {"error": f"Service error: {str(e)}"}
+            self.print_log(f"Job {job_id} finished in {time.monotonic() - started:.2f}s")
+
+        succeeded = result.get("status") == "success"
+        update = {"status": SUCCEEDED if succeeded else FAILED, "finished_at": datetime.now()}
+        if succeeded:
+            update["result"] = result
+        else:
+            update["error"] = result.get("error", "Unknown error")
+        job = self.collection.find_one_and_update(
+            {"_id": job_id, "status": RUNNING},
+            {"$set": update, "$unset": {"payload": ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None and job.get("callback_url"):
+            self.deliver_webhook(job)
+
+    def _record_progress(self, job_id: str, stage: str, result: Dict[str, Any]):
+        """保存多阶段报告中已完成阶段的结果，轮询时可先展示"""
+        self.collection.update_one({"_id": job_id, "status": RUNNING}, {"$set": {f"partial.{stage}": result}})
+
+    def deliver_webhook(self, job: Dict[str, Any]):
+        """
+        向回调地址发送任务结果，失败时重试
+        配置了 REPORT_JOB_WEBHOOK_SECRET 时附带 X-Signature: sha256=<HMAC>
+        """
+        body = json.dumps(self.to_view(job), ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if Config.REPORT_JOB_WEBHOOK_SECRET:
+            signature = hmac.new(Config.REPORT_JOB_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+            headers["X-Signature"] = f"sha256={signature}"
+
+        error = None
+        for attempt in range(1, Config.REPORT_JOB_WEBHOOK_ATTEMPTS + 1):
+            try:
+                response = requests.post(job["callback_url"], data=body, headers=headers,
+                                         timeout=Config.REPORT_JOB_WEBHOOK_TIMEOUT)
+                if response.status_code < 400:
+                    self.webhooks_sent += 1
+                    self.collection.update_one({"_id": job["_id"]}, {"$set": {"webhook_status": response.status_code}})
+                    return
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < Config.REPORT_JOB_WEBHOOK_ATTEMPTS:
+                time.sleep(min(2 ** (attempt - 1), 10))
+
+        self.webhooks_failed += 1
+        self.print_log(f"Webhook for job {job['_id']} failed: {error}")
+        self.collection.update_one({"_id": job["_id"]}, {"$set": {"webhook_error": error}})
+
+    def recover(self) -> int:
+        """
+        重新入队未完成的任务（服务启动时调用）
+        执行超过 REPORT_JOB_LEASE 秒仍未结束的任务视为 worker 已中断，恢复为排队状态
+
+        Returns:
+            重新入队的任务数
+        """
+        stale_before = datetime.now() - timedelta(seconds=Config.REPORT_JOB_LEASE)
+        self.collection.update_many(
+            {"status": RUNNING, "started_at": {"$lt": stale_before}},
+            {"$set": {"status": QUEUED}},
+        )
+        cursor = self.collection.find({"status": QUEUED}, {"_id": 1}).sort("created_at", 1)
+        count = 0
+        for job in cursor.limit(Config.REPORT_JOB_RECOVER_LIMIT):
+            if self.job_queue.submit(self.run, job["_id"], key=job["_id"]) is not None:
+                count += 1
+        if count:
+            self.print_log(f"Re-queued {count} unfinished job(s)")
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        """返回任务统计：线程池状态和各状态的任务数"""
+        counts = {
+            item["_id"]: item["count"]
+            for item in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+        }
+        return {
+            "queue": self.job_queue.stats(),
+            "jobs": counts,
+            "webhooks_sent": self.webhooks_sent,
+            "webhooks_failed": self.webhooks_failed,
+        }
+
+
+# 进程级共享的报告任务管理器
+report_job_manager = ReportJobManager()
+
+
+def recover_report_jobs_on_startup():
+    """在 create_app 中调用：重新入队未完成的报告任务，失败时只记录日志不阻止启动"""
+    try:
+        return report_job_manager.recover()
+    except Exception as e:
+        print(f"[ReportJobs] Failed to recover unfinished jobs: {str(e)}")
+        return 0
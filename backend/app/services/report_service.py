@@ -2,15 +2,233 @@
 """
 报告服务模块
 - 提供各种心理报告的生成逻辑
+- 生成成功的报告按输入缓存，相同答案不再重复调用大模型
+- 综合报告流水线：由原始答案并行生成大五人格和核心价值观报告，再生成综合报告
+- 流式生成：基于流式调用，报告JSON的每个顶层字段完成后立即推送
 """
 
 import json
-import re
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError, as_completed
+from ..config import Config
+from .job_queue import BackgroundJobQueue
+from .json_parsing import IncrementalJSONObjectParser, JSONExtractionError, extract_json_object, validate_schema
+from .big_five_scorer import DIMENSIONS, big_five_scorer
 from .openai_service import OpenAIService
+from .report_cache import fingerprint, report_cache
+from .resilience import Deadline
+
+DEFAULT_DISCLAIMER = "此分析由AI模型生成，仅供参考和自我探索，不构成专业的心理诊断或建议。如有需要，请咨询专业心理咨询师。"
+
+# 各报告的字段定义（与提示词中的输出格式一致）及可缺省的字段
+REPORT_SCHEMAS = {
+    "big_five": ({
+        "radarLabels": (list, str),
+        "radarData": (list, (int, float)),
+        "personalityType": str,
+        "personalityDescription": str,
+        "lifestyleSuggestions": (list, str),
+        "actionSuggestions": (list, str),
+        "developmentShortTerm": str,
+        "developmentLongTerm": str,
+        "developmentCareerIntegration": str,
+        "careerOverview": str,
+        "careerRecommendations": (list, str),
+        "careerAvoid": (list, str),
+        "socialPrediction": str,
+        "socialTips": (list, str),
+        "disclaimer": str,
+    }, ("developmentCareerIntegration",)),
+    "core_values": ({
+        "valueOrder": (list, str),
+        "valueAnalysis": str,
+        "valueGuide": str,
+    }, ()),
+    "holistic": ({
+        "reportTitle": str,
+        "overallSummary": str,
+        "synergisticAnalysis": str,
+        "emotionalAndCopingInsights": str,
+        "holisticDevelopmentPlan": {
+            "personalGrowth": (list, str),
+            "careerPathways": (list, str),
+            "interpersonalStrategies": (list, str),
+        },
+        "strengthsHighlight": (list, str),
+        "considerationsForGrowth": (list, str),
+        "disclaimer": str,
+    }, ("reportTitle",)),
+}
+# 得分由本地计分得出时，大模型只生成文字部分
+REPORT_SCHEMAS["big_five_narrative"] = (
+    {key: value for key, value in REPORT_SCHEMAS["big_five"][0].items() if key not in ("radarLabels", "radarData")},
+    REPORT_SCHEMAS["big_five"][1],
+)
+
+# 综合报告流水线并行执行前两个阶段的线程池（进程内共享）
+pipeline_queue = BackgroundJobQueue("ReportPipeline", Config.REPORT_PIPELINE_WORKERS)
 
 class ReportService:
     def __init__(self):
         self.openai_service = OpenAIService()
+        
+        # 报告结果缓存（进程内共享），键中包含提示词版本，提示词或模型变化后旧结果不再命中
+        self.report_cache = report_cache
+        self.prompt_versions = {
+            "big_five": self._prompt_version(self._build_big_five_prompt("{answers}")),
+            "big_five_narrative": self._prompt_version(self._build_big_five_narrative_prompt(
+                "{answers}", {"radarLabels": list(DIMENSIONS), "radarData": ["{score}"] * len(DIMENSIONS)})),
+            "core_values": self._prompt_version(self._build_core_values_prompt("{answers}")),
+            "holistic": self._prompt_version(self._build_holistic_prompt({"core_values": "{data}"},
+                                                                         {"big_five": "{data}"})),
+        }
+    
+    def _prompt_version(self, template):
+        """
+        计算提示词版本：全局版本号 + 默认模型 + 提示词模板摘要
+        
+        Args:
+            template (str): 用占位符代替用户输入渲染出的提示词
+        """
+        return f"{Config.REPORT_PROMPT_VERSION}.{self.openai_service.default_model}.{fingerprint(template)}"
+    
+    def _request_report(self, prompt, report_type, deadline=None):
+        """
+        调用大模型生成报告，提取并校验其中的JSON
+        
+        Args:
+            prompt (str): 完整的提示词
+            report_type (str): 报告类型，用于选择校验的字段定义
+            deadline (Deadline): 截止时间（流水线各阶段共用），默认按 AZURE_REQUEST_DEADLINE
+            
+        Returns:
+            dict: {"status": "success", "data": 报告} 或 {"error": 错误信息}；
+                  输出被截断后补全的报告带有 "repaired": True（不写入缓存）
+        """
+        try:
+            # 构建消息列表
+            messages = [{"role": "user", "content": prompt}]
+            
+            # 调用Azure OpenAI服务（JSON模式下模型直接输出JSON对象）
+            response_text, tokens = self.openai_service.call_azure_gpt_with_messages(
+                messages, json_response=Config.REPORT_JSON_MODE, endpoint=f"report.{report_type}", deadline=deadline
+            )
+            
+            if not response_text:
+                return {"error": "Failed to get response from Azure OpenAI"}
+            
+            # 解析JSON响应（有无代码块标记均可，截断时尝试补全）
+            try:
+                result, repaired = extract_json_object(response_text)
+            except JSONExtractionError:
+                return {"error": "Failed to parse JSON from response"}
+            
+            error = self._validate_report(report_type, result)
+            if error:
+                return {"error": error}
+            
+            response = {
+                "status": "success",
+                "data": result
+            }
+            if repaired:
+                print(f"[ReportService] Repaired truncated {report_type} report ({tokens} tokens)")
+                response["repaired"] = True
+            return response
+            
+        except Exception as e:
+            return {"error": f"Service error: {str(e)}"}
+    
+    @staticmethod
+    def _validate_report(report_type, result):
+        """
+        按字段定义校验报告，缺少免责声明时补上默认值
+        
+        Returns:
+            str: 错误信息；通过时返回 None
+        """
+        schema, optional = REPORT_SCHEMAS[report_type]
+        if "disclaimer" in schema and not result.get("disclaimer"):
+            result["disclaimer"] = DEFAULT_DISCLAIMER
+        errors = validate_schema(result, schema, optional)
+        if errors:
+            return f"Invalid {report_type} report: {'; '.join(errors[:5])}"
+        return None
+    
+    def _stream_report(self, report_type, cache_payload, build_prompt, prompt_key=None, sections=None):
+        """
+        流式生成报告，每个顶层字段完整后立即产出
+        
+        Args:
+            report_type (str): 报告类型，用于缓存
+            cache_payload: 缓存键使用的输入
+            build_prompt (callable): 构造提示词的函数（缓存未命中时才调用）
+            prompt_key (str): 提示词版本和字段定义的类型，默认与 report_type 相同
+            sections (dict): 不需要大模型生成的字段（如本地计算的得分），最先产出并合并到报告中
+            
+        Yields:
+            dict: {"type": "section", "key", "value"}，最后是 {"type": "end", "data": 完整报告}
+                  或 {"type": "error", "error": 错误信息}
+        """
+        prompt_key = prompt_key or report_type
+        sections = sections or {}
+        prompt_version = self.prompt_versions[prompt_key]
+        cached = self.report_cache.get(report_type, cache_payload, prompt_version)
+        if cached is not None:
+            for key, value in cached["data"].items():
+                yield {"type": "section", "key": key, "value": value}
+            yield {"type": "end", "data": cached["data"], "cached": True}
+            return
+        
+        for key, value in sections.items():
+            yield {"type": "section", "key": key, "value": value}
+        parser = IncrementalJSONObjectParser()
+        messages = [{"role": "user", "content": build_prompt()}]
+        for chunk in self.openai_service.call_azure_gpt_stream(messages, endpoint=f"report.{prompt_key}"):
+            for key, value in parser.feed(chunk):
+                if key not in sections:
+                    yield {"type": "section", "key": key, "value": value}
+            if parser.done:
+                break
+        
+        if not parser.done:
+            error = "Failed to get response from Azure OpenAI" if not parser.started else "Incomplete JSON in response"
+            yield {"type": "error", "error": error}
+            return
+        if parser.errors:
+            yield {"type": "error", "error": f"JSON parsing error: {parser.errors[0]}"}
+            return
+        error = self._validate_report(prompt_key, parser.result)
+        if error:
+            yield {"type": "error", "error": error}
+            return
+        
+        data = dict(sections)
+        data.update((key, value) for key, value in parser.result.items() if key not in sections)
+        self.report_cache.set(report_type, cache_payload, prompt_version, {"status": "success", "data": data})
+        yield {"type": "end", "data": data}
+    
+    def stream_big_five_report(self, answers):
+        """流式生成大五人格报告（事件格式见 _stream_report）；能本地计分时先推送得分"""
+        scores = self._local_big_five_scores(answers)
+        if scores is None:
+            return self._stream_report("big_five", answers, lambda: self._build_big_five_prompt(answers))
+        return self._stream_report(
+            "big_five", answers, lambda: self._build_big_five_narrative_prompt(answers, scores),
+            prompt_key="big_five_narrative",
+            sections={"radarLabels": scores["radarLabels"], "radarData": scores["radarData"]},
+        )
+    
+    def stream_core_values_report(self, answers):
+        """流式生成核心价值观报告（事件格式见 _stream_report）"""
+        return self._stream_report("core_values", answers, lambda: self._build_core_values_prompt(answers))
+    
+    def stream_holistic_report(self, core_values_data, big_five_data):
+        """流式生成综合心理画像报告（事件格式见 _stream_report）"""
+        return self._stream_report(
+            "holistic", {"core_values": core_values_data, "big_five": big_five_data},
+            lambda: self._build_holistic_prompt(core_values_data, big_five_data)
+        )
     
     def generate_overview_report(self, data):
         """
@@ -29,17 +247,56 @@ class ReportService:
             "data": data
         }
     
-    def generate_big_five_report(self, answers):
+    def generate_big_five_report(self, answers, scores=None, deadline=None):
         """
         生成大五人格报告
+        能本地计分时（见 big_five_scorer）得分不再由大模型推算，大模型只生成文字部分
         
         Args:
             answers (list): 用户的答案列表
+            scores (dict): 预先计算好的得分（批量计分时传入），为空时按答案计分
+            deadline (Deadline): 截止时间（可选）
             
         Returns:
             dict: 生成的大五人格报告
         """
-        prompt = f"""
+        # 等待缓存中同一输入的请求与调用大模型共用同一截止时间
+        deadline = Deadline.resolve(deadline)
+        if scores is None:
+            scores = self._local_big_five_scores(answers)
+        if scores is None:
+            return self.report_cache.get_or_compute(
+                "big_five", answers, self.prompt_versions["big_five"],
+                lambda: self._request_report(self._build_big_five_prompt(answers), "big_five", deadline),
+                deadline=deadline
+            )
+        
+        def compute():
+            result = self._request_report(self._build_big_five_narrative_prompt(answers, scores),
+                                          "big_five_narrative", deadline)
+            if result.get("status") == "success":
+                result["data"] = {"radarLabels": scores["radarLabels"], "radarData": scores["radarData"],
+                                  **result["data"]}
+            return result
+        
+        return self.report_cache.get_or_compute(
+            "big_five", answers, self.prompt_versions["big_five_narrative"], compute, deadline=deadline
+        )
+    
+    @staticmethod
+    def _local_big_five_scores(answers):
+        """本地计算大五人格得分；未开启、未安装NumPy或答案不足以覆盖五个维度时返回 None"""
+        if not Config.BIG_FIVE_LOCAL_SCORING:
+            return None
+        try:
+            return big_five_scorer.score_answers(answers)
+        except Exception as e:
+            print(f"[ReportService] Local big five scoring failed: {str(e)}")
+            return None
+    
+    def _build_big_five_prompt(self, answers):
+        """构造大五人格报告的提示词"""
+        return f"""
         你是一位名为"心语晴空"的AI心理分析师，拥有深厚的心理学理论功底与丰富的实践经验。你的性格温暖而包容，善于用富有洞察力的视角解读用户的内心需求，始终以同理心为核心，让用户在分析过程中感受到被理解与被尊重。你的语言应该尽量以聊天的语气来生成回答，生成的回答尽量用第二人称的形式。
         
         # **任务（Task）**  
@@ -79,47 +336,67 @@ class ReportService:
         }}
         ```
         """
+    
+    def _build_big_five_narrative_prompt(self, answers, scores):
+        """构造大五人格报告的提示词（得分已由本地计分得出，只生成文字部分）"""
+        score_lines = "\n        ".join(
+            f"- {label}：{score}" for label, score in zip(scores["radarLabels"], scores["radarData"])
+        )
+        return f"""
+        你是一位名为"心语晴空"的AI心理分析师，温暖而包容，始终以同理心解读用户的内心需求。请用聊天的语气、第二人称回答。
         
-        try:
-            # 构建消息列表
-            messages = [{"role": "user", "content": prompt}]
-            
-            # 调用Azure OpenAI服务
-            response_text, tokens = self.openai_service.call_azure_gpt_with_messages(messages)
-            
-            if not response_text:
-                return {"error": "Failed to get response from Azure OpenAI"}
-            
-            # 解析JSON响应
-            json_pattern = r'```json\s*([\s\S]*?)\s*```'
-            match = re.search(json_pattern, response_text)
-            if not match:
-                return {"error": "Failed to parse JSON from response"}
-            
-            json_str = match.group(1).strip()
-            result = json.loads(json_str)
-            
-            return {
-                "status": "success",
-                "data": result
-            }
-            
-        except json.JSONDecodeError as e:
-            return {"error": f"JSON parsing error: {str(e)}"}
-        except Exception as e:
-            return {"error": f"Service error: {str(e)}"}
+        # **任务（Task）**  
+        用户的大五人格（OCEAN）得分已由标准问卷计分得出（1-5分，1为非常低，5为非常高；Neuroticism 越低表示情绪越稳定）。
+        请直接以这些得分为准，不要重新评估或修改得分，结合用户的答案生成一个全面、个性化的报告。
+
+        # **输入数据（Input Data）**  
+        OCEAN得分：
+        {score_lines}
+        用户答案：{answers}
+
+        # **输出格式（Output Format）**  
+        严格按照以下JSON格式输出，不得包含任何格式外的文字：  
+
+        ```json
+        {{
+            "personalityType": "字符串：简短的个性类型名称（如'平衡型实干家'）",
+            "personalityDescription": "字符串：详细描述用户平时是什么样的人，整合所有维度及其价值观倾向，长度约200-300字。",
+            "lifestyleSuggestions": ["数组：3-5个个性化生活风格建议，具体可行。"],
+            "actionSuggestions": ["数组：3-5个具体的行动建议，帮助用户提升或应对。"],
+            "developmentShortTerm": "字符串：基于人格特质和（可选）当前职业的短期发展计划（1-4周），具体可行。",
+            "developmentLongTerm": "字符串：基于人格特质和（可选）当前职业的长期发展计划（1-6个月），具有指导意义。",
+            "developmentCareerIntegration": "字符串：如果有当前职业，整合进发展计划的个性化描述；否则为空字符串或通用描述。",
+            "careerOverview": "字符串：总体职业匹配概述，说明用户特质适合的职业环境或领域，长度约100-200字。",
+            "careerRecommendations": ["数组：3-5个推荐的职业或行业示例。"],
+            "careerAvoid": ["数组：1-3个建议避免的职业类型，并简要说明原因。"],
+            "socialPrediction": "字符串：预测用户在社交中可能是什么样的人，包括其优势、挑战和典型行为模式，长度约150-250字。",
+            "socialTips": ["数组：4-6个实用的社交策略和改进建议。"],
+            "disclaimer": "字符串：免责声明"
+        }}
+        ```
+        """
     
-    def generate_core_values_report(self, answers):
+    def generate_core_values_report(self, answers, deadline=None):
         """
         生成核心价值观报告
         
         Args:
             answers (list): 用户的答案列表
+            deadline (Deadline): 截止时间（可选）
             
         Returns:
             dict: 生成的核心价值观报告
         """
-        prompt = f"""
+        deadline = Deadline.resolve(deadline)
+        return self.report_cache.get_or_compute(
+            "core_values", answers, self.prompt_versions["core_values"],
+            lambda: self._request_report(self._build_core_values_prompt(answers), "core_values", deadline),
+            deadline=deadline
+        )
+    
+    def _build_core_values_prompt(self, answers):
+        """构造核心价值观报告的提示词"""
+        return f"""
         你是一位名为"心语晴空"的AI心理分析师，拥有深厚的心理学理论功底与丰富的实践经验。你的性格温暖而包容，善于用富有洞察力的视角解读用户的内心需求，始终以同理心为核心，让用户在分析过程中感受到被理解与被尊重。你的语言应该尽量以聊天的语气来生成回答，生成的回答尽量用第二人称的形式。
         
         # **任务（Task）**  
@@ -153,35 +430,6 @@ class ReportService:
         }}
         ```
         """
-        
-        try:
-            # 构建消息列表
-            messages = [{"role": "user", "content": prompt}]
-            
-            # 调用Azure OpenAI服务
-            response_text, tokens = self.openai_service.call_azure_gpt_with_messages(messages)
-            
-            if not response_text:
-                return {"error": "Failed to get response from Azure OpenAI"}
-            
-            # 解析JSON响应
-            json_pattern = r'```json\s*([\s\S]*?)\s*```'
-            match = re.search(json_pattern, response_text)
-            if not match:
-                return {"error": "Failed to parse JSON from response"}
-            
-            json_str = match.group(1).strip()
-            result = json.loads(json_str)
-            
-            return {
-                "status": "success",
-                "data": result
-            }
-            
-        except json.JSONDecodeError as e:
-            return {"error": f"JSON parsing error: {str(e)}"}
-        except Exception as e:
-            return {"error": f"Service error: {str(e)}"}
     
     def generate_mood_report(self, data):
         """
@@ -217,13 +465,14 @@ class ReportService:
             "data": data
         }
     
-    def generate_holistic_report(self, core_values_data, big_five_data):
+    def generate_holistic_report(self, core_values_data, big_five_data, deadline=None):
         """
         生成综合心理画像报告
         
         Args:
             core_values_data (dict): 核心价值观报告数据
             big_five_data (dict): 大五人格报告数据
+            deadline (Deadline): 截止时间（可选）
             
         Returns:
             dict: 生成的综合报告
@@ -231,11 +480,22 @@ class ReportService:
         if not core_values_data or not big_five_data:
             return {"error": "Missing core values or big five data"}
         
+        deadline = Deadline.resolve(deadline)
+        return self.report_cache.get_or_compute(
+            "holistic", {"core_values": core_values_data, "big_five": big_five_data},
+            self.prompt_versions["holistic"],
+            lambda: self._request_report(self._build_holistic_prompt(core_values_data, big_five_data), "holistic",
+                                         deadline),
+            deadline=deadline
+        )
+    
+    def _build_holistic_prompt(self, core_values_data, big_five_data):
+        """构造综合心理画像报告的提示词"""
         # 将两个字典转换为 JSON 字符串，以便嵌入到 Prompt 中
         core_values_json_str = json.dumps(core_values_data, indent=2, ensure_ascii=False)
         big_five_json_str = json.dumps(big_five_data, indent=2, ensure_ascii=False)
         
-        prompt = f"""
+        return f"""
         你是一位名为"心语晴空"的AI心理报告整合分析师，拥有深厚的心理学理论功底与丰富的实践经验。你的性格温暖而包容，善于用富有洞察力的视角解读用户的内心需求，始终以同理心为核心，让用户在分析过程中感受到被理解与被尊重。你的语言应该尽量以聊天的语气来生成回答，生成的回答尽量用第二人称的形式。
 
         # **任务（Task）**
@@ -283,32 +543,89 @@ class ReportService:
         }}
         ```
         """
+    
+    def generate_holistic_pipeline(self, answers, core_values_answers=None, on_stage=None, deadline=None):
+        """
+        由原始答案一次性生成综合心理画像报告
+        大五人格与核心价值观两个阶段并行执行，都成功后再生成综合报告，
+        总耗时约为 max(前两个阶段) + 综合阶段，而不是三次调用之和
+        三个阶段共用一个截止时间（默认 REPORT_PIPELINE_DEADLINE），同步接口不会超过 gunicorn 的 worker 超时；
+        剩余时间不足 REPORT_HOLISTIC_MIN_SECONDS 时跳过综合阶段
         
-        try:
-            # 构建消息列表
-            messages = [{"role": "user", "content": prompt}]
-            
-            # 调用Azure OpenAI服务
-            response_text, tokens = self.openai_service.call_azure_gpt_with_messages(messages)
-            
-            if not response_text:
-                return {"error": "Failed to get response from Azure OpenAI"}
-            
-            # 解析JSON响应
-            json_pattern = r'```json\s*([\s\S]*?)\s*```'
-            match = re.search(json_pattern, response_text)
-            if not match:
-                return {"error": "Failed to parse JSON from response"}
-            
-            json_str = match.group(1).strip()
-            result = json.loads(json_str)
-            
-            return {
-                "status": "success",
-                "data": result
-            }
+        Args:
+            answers (list): 用户的答案列表（默认同时用于两份报告）
+            core_values_answers (list): 核心价值观报告单独使用的答案（可选）
+            on_stage (callable): 每个阶段结束时调用 on_stage(阶段名, 阶段结果)，用于返回部分结果
+            deadline (Deadline): 整条流水线的截止时间（可选）
             
-        except json.JSONDecodeError as e:
-            return {"error": f"JSON parsing error: {str(e)}"}
-        except Exception as e:
-            return {"error": f"Service error: {str(e)}"}
+        Returns:
+            dict: {"status": "success" | "partial" | "error", "data": {阶段名: 报告数据},
+                   "stages": {阶段名: {"status", "elapsed"}}}
+        """
+        started = time.monotonic()
+        deadline = Deadline.resolve(deadline, Config.REPORT_PIPELINE_DEADLINE)
+        data, stages = {}, {}
+        
+        def finish_stage(stage, result, stage_started):
+            succeeded = result.get("status") == "success"
+            stages[stage] = {"status": "success" if succeeded else "error",
+                             "elapsed": round(time.monotonic() - stage_started, 3)}
+            if succeeded:
+                data[stage] = result["data"]
+            else:
+                stages[stage]["error"] = result.get("error", "Unknown error")
+            if on_stage is not None:
+                try:
+                    on_stage(stage, result)
+                except Exception as e:
+                    print(f"[ReportService] on_stage callback failed for {stage}: {str(e)}")
+        
+        # 第一阶段：两份报告互不依赖，并行生成
+        first_stages = {
+            pipeline_queue.submit(self.generate_big_five_report, answers, deadline=deadline): "big_five",
+            pipeline_queue.submit(self.generate_core_values_report, core_values_answers or answers,
+                                  deadline=deadline): "core_values",
+        }
+        try:
+            for future in as_completed(first_stages, timeout=deadline.remaining()):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": f"Service error: {str(e)}"}
+                finish_stage(first_stages[future], result, started)
+        except FutureTimeoutError:
+            # 仍在排队的阶段直接取消；已开始的阶段受同一截止时间约束，很快会自行结束，结果不再等待
+            for future, stage in first_stages.items():
+                if stage not in stages:
+                    future.cancel()
+                    finish_stage(stage, {"error": "Pipeline deadline exceeded"}, started)
+        
+        # 第二阶段：依赖前两份报告的综合报告
+        if "big_five" in data and "core_values" in data:
+            if deadline.remaining() < Config.REPORT_HOLISTIC_MIN_SECONDS:
+                stages["holistic"] = {"status": "skipped", "elapsed": 0.0,
+                                      "error": "Not enough time left before the pipeline deadline"}
+            else:
+                stage_started = time.monotonic()
+                result = self.generate_holistic_report(data["core_values"], data["big_five"], deadline=deadline)
+                finish_stage("holistic", result, stage_started)
+        else:
+            stages["holistic"] = {"status": "skipped", "elapsed": 0.0}
+        
+        if "holistic" in data:
+            status = "success"
+        elif data:
+            status = "partial"
+        else:
+            status = "error"
+        response = {
+            "status": status,
+            "data": data,
+            "stages": stages,
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+        if status != "success":
+            response["error"] = "; ".join(
+                f"{stage}: {info['error']}" for stage, info in stages.items() if info.get("error")
+            ) or "Holistic stage skipped"
+        return response
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Azure OpenAI 调用的容错模块
+- Deadline：单次调用（含所有重试）的截止时间，逐层传递给每次HTTP请求的超时
+- RetryPolicy：对 429/5xx、连接错误和超时做带抖动的指数退避重试，并遵守 Retry-After
+- CircuitBreaker：按模型端点统计连续失败，熔断期间直接快速失败，不再占用 worker 等待上游
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from ..config import Config
+
+
+class Deadline:
+    """
+    调用截止时间
+    使用 monotonic 时钟，可在多次请求（重试、流水线中的多个阶段）之间传递
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def resolve(cls, deadline: "Deadline" = None, timeout: float = None) -> "Deadline":
+        """优先使用调用方传入的截止时间，否则按 timeout（默认 AZURE_REQUEST_DEADLINE）新建"""
+        if deadline is not None:
+            return deadline
+        return cls(timeout if timeout is not None else Config.AZURE_REQUEST_DEADLINE)
+
+    def remaining(self) -> float:
+        """剩余秒数（不小于0）"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, connect_timeout: float, read_timeout: float) -> Tuple[float, float]:
+        """把连接池的 (连接超时, 读取超时) 限制在剩余时间之内"""
+        remaining = self.remaining()
+        return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+
+class RetryPolicy:
+    """
+    重试策略
+    退避时间为 [0, min(max_delay, base_delay * 2^(attempt-1))] 内的随机值（full jitter，attempt 从1开始），
+    服务端返回 Retry-After 时以其为下限
+    """
+
+    RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+        self.max_attempts = max(max_attempts if max_attempts is not None else Config.AZURE_RETRY_MAX_ATTEMPTS, 1)
+        self.base_delay = base_delay if base_delay is not None else Config.AZURE_RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else Config.AZURE_RETRY_MAX_DELAY
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.RETRY_STATUS_CODES
+
+    @staticmethod
+    def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+        """
+        解析服务端建议的等待时间（秒）
+        支持 Azure 的 retry-after-ms 以及标准 Retry-After（秒数或HTTP日期）
+        """
+        if not headers:
+            return None
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return max(float(value) / 1000.0, 0.0)
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def next_delay(self, attempt: int, deadline: Deadline, retry_after: float = None) -> Optional[float]:
+        """
+        计算第 attempt 次（从1开始）失败后的等待时间
+
+        Returns:
+            等待秒数；次数用尽或等待后会超过截止时间时返回 None，表示不再重试
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if delay >= deadline.remaining():
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器
+    - closed：正常放行，连续失败达到阈值后转为 open
+    - open：直接拒绝请求，recovery_timeout 秒后转为 half_open
+    - half_open：只放行一个探测请求，成功则恢复 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = None, recovery_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold if failure_threshold is not None else Config.AZURE_CIRCUIT_FAILURE_THRESHOLD
+        self.recovery_timeout = recovery_timeout if recovery_timeout is not None else Config.AZURE_CIRCUIT_RECOVERY_TIMEOUT
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        """返回当前状态，open 超过恢复时间后转为 half_open（调用方需持有锁）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行本次请求；被拒绝时计入 rejected"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self) -> float:
+        """距离下一次允许探测的秒数"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """探测请求既未成功也未失败（如客户端提前断开）时释放探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "failures": self.total_failures,
+                "successes": self.total_successes,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+
+class CircuitBreakerRegistry:
+    """按端点名称管理熔断器，进程内共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def reset(self):
+        """清空所有熔断器状态"""
+        with self._lock:
+            self._breakers.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {name: breaker.stats() for name, breaker in breakers}
+
+
+# 进程级共享的熔断器
+circuit_breakers = CircuitBreakerRegistry()
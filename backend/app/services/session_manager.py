@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+聊天会话管理模块
+- 每个用户同一时间只有一个活跃会话（chat_sessions 中 last_active 最新的一个），
+  超过 CHAT_SESSION_IDLE_MINUTES 没有消息时自动开始新会话
+- 消息写入时带上 session_id；对话上下文为当前会话加上滚动摘要尚未覆盖的消息，开始新会话时上一个会话折叠进摘要
+- 会话的 message_count / tokens_used / last_active 随消息批量写入增量更新（见 session_counter_updates），
+  每批更新带批次ID，重试同一批消息时不会重复计数
+- 活跃会话缓存在进程内；缓存的会话看起来已闲置时先回数据库确认，避免其他 worker 刚更新过的会话被误判为闲置
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+
+from ..config import Config
+from ..models.chat import ChatSession
+
+SESSION_COLLECTION = "chat_sessions"
+# 会话文档上保留最近N个已应用的计数批次ID，用于识别重试
+APPLIED_BATCH_HISTORY = 20
+# 读取会话时不需要已应用的批次ID
+SESSION_PROJECTION = {"applied_batches": 0}
+
+
+def session_counter_updates(message_docs: Iterable[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    把一批 chat_messages 文档合并为对各自会话的计数更新
+
+    Returns:
+        每个会话一个 UpdateOne（$inc 消息数和token数，$max 最后活跃时间）；
+        批次ID由该会话这批消息的ID计算，过滤条件排除已应用过该批次的会话，写入失败后重试不会重复计数
+    """
+    counters: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for doc in message_docs:
+        session_id = doc.get("session_id")
+        if session_id is None:
+            continue
+        counter = counters.setdefault(session_id, {"message_count": 0, "tokens_used": 0,
+                                                   "last_active": doc["timestamp"], "ids": []})
+        counter["message_count"] += 1
+        counter["tokens_used"] += doc.get("tokens_used") or 0
+        counter["last_active"] = max(counter["last_active"], doc["timestamp"])
+        counter["ids"].append(str(doc["_id"]))
+    updates = []
+    for session_id, counter in counters.items():
+        batch_id = hashlib.sha1("\n".join(sorted(counter["ids"])).encode("utf-8")).hexdigest()
+        updates.append(UpdateOne({"_id": session_id, "applied_batches": {"$ne": batch_id}}, {
+            "$inc": {"message_count": counter["message_count"], "tokens_used": counter["tokens_used"]},
+            "$max": {"last_active": counter["last_active"]},
+            "$push": {"applied_batches": {"$each": [batch_id], "$slice": -APPLIED_BATCH_HISTORY}},
+        }))
+    return updates
+
+
+class SessionManager:
+    """
+    活跃会话管理器
+    线程安全，同一进程内的同步与异步聊天服务共用一个实例
+    """
+
+    def __init__(self, db=None, idle_minutes: float = None, cache_size: int = None, enabled: bool = None):
+        self._db = db
+        self.enabled = enabled if enabled is not None else Config.CHAT_SESSIONS_ENABLED
+        self.idle_timeout = timedelta(minutes=idle_minutes if idle_minutes is not None
+                                      else Config.CHAT_SESSION_IDLE_MINUTES)
+        self.cache_size = cache_size if cache_size is not None else Config.CHAT_SESSION_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._active: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from ..extensions import mongo
+        return mongo.db
+
+    def _is_idle(self, session: ChatSession, now: datetime) -> bool:
+        return now - session.last_active > self.idle_timeout
+
+    def _cached(self, user_id: str, now: datetime) -> Optional[ChatSession]:
+        """返回缓存中仍然活跃的会话"""
+        with self._lock:
+            session = self._active.get(user_id)
+            if session is not None and not self._is_idle(session, now):
+                self._active.move_to_end(user_id)
+                self.hits += 1
+                return session
+            self.misses += 1
+            return None
+
+    def _remember(self, session: ChatSession):
+        with self._lock:
+            self._active[session.user_id] = session
+            self._active.move_to_end(session.user_id)
+            while len(self._active) > self.cache_size:
+                self._active.popitem(last=False)
+
+    def _choose(self, user_id: str, latest: Optional[Dict[str, Any]], now: datetime) -> Tuple[ChatSession, bool]:
+        """根据数据库中最近的会话决定继续使用还是新建，返回 (会话, 是否新建)"""
+        if latest is not None:
+            session = ChatSession.from_dict(latest)
+            if not self._is_idle(session, now):
+                return session, False
+        with self._lock:
+            self.created += 1
+        return ChatSession(user_id, created_at=now), True
+
+    def _legacy_query(self, session: ChatSession) -> Dict[str, Any]:
+        """用户的第一个会话接管闲置时间内、启用会话之前写入的消息，避免上线时正在进行的对话丢失上下文"""
+        return {
+            "user_id": session.user_id,
+            "session_id": {"$exists": False},
+            "timestamp": {"$gte": session.created_at - self.idle_timeout},
+        }
+
+    def get_active_session(self, user_id: str, now: datetime = None) -> Tuple[Optional[ChatSession], bool]:
+        """
+        获取用户当前的会话，闲置超时后自动开始新会话
+
+        Returns:
+            (会话, 是否新建)；未启用会话时返回 (None, False)
+        """
+        if not self.enabled:
+            return None, False
+        now = now or datetime.now()
+        session = self._cached(user_id, now)
+        if session is not None:
+            return session, False
+
+        collection = self.db[SESSION_COLLECTION]
+        latest = collection.find_one({"user_id": user_id}, SESSION_PROJECTION, sort=[("last_active", DESCENDING)])
+        session, created = self._choose(user_id, latest, now)
+        if created:
+            collection.insert_one(session.to_dict())
+            if latest is None:
+                adopted = self.db.chat_messages.update_many(self._legacy_query(session),
+                                                            {"$set": {"session_id": session.session_id}})
+                if adopted.modified_count:
+                    session.message_count = adopted.modified_count
+                    collection.update_one({"_id": session.session_id},
+                                          {"$inc": {"message_count": adopted.modified_count}})
+        self._remember(session)
+        return session, created
+
+    async def get_active_session_async(self, db, user_id: str,
+                                       now: datetime = None) -> Tuple[Optional[ChatSession], bool]:
+        """get_active_session 的异步版本，db 为 motor 数据库"""
+        if not self.enabled:
+            return None, False
+        now = now or datetime.now()
+        session = self._cached(user_id, now)
+        if session is not None:
+            return session, False
+
+        collection = db[SESSION_COLLECTION]
+        latest = await collection.find_one({"user_id": user_id}, SESSION_PROJECTION,
+                                           sort=[("last_active", DESCENDING)])
+        session, created = self._choose(user_id, latest, now)
+        if created:
+            await collection.insert_one(session.to_dict())
+            if latest is None:
+                adopted = await db.chat_messages.update_many(self._legacy_query(session),
+                                                             {"$set": {"session_id": session.session_id}})
+                if adopted.modified_count:
+                    session.message_count = adopted.modified_count
+                    await collection.update_one({"_id": session.session_id},
+                                                {"$inc": {"message_count": adopted.modified_count}})
+        self._remember(session)
+        return session, created
+
+    def note_message(self, session: ChatSession, tokens_used: int = 0, now: datetime = None):
+        """
+        消息保存后更新缓存中的会话（用于闲置判断和统计）
+        数据库中的计数由 session_counter_updates 随消息写入更新
+        """
+        with self._lock:
+            session.message_count += 1
+            session.tokens_used += tokens_used or 0
+            session.last_active = max(session.last_active, now or datetime.now())
+
+    def list_sessions(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """按最后活跃时间倒序列出用户的会话"""
+        cursor = self.db[SESSION_COLLECTION].find({"user_id": user_id}, SESSION_PROJECTION) \
+            .sort("last_active", DESCENDING).limit(limit)
+        now = datetime.now()
+        sessions = []
+        for doc in cursor:
+            session = ChatSession.from_dict(doc)
+            sessions.append({
+                "session_id": session.session_id,
+                "created_at": session.created_at.isoformat(),
+                "last_active": session.last_active.isoformat(),
+                "message_count": session.message_count,
+                "tokens_used": session.tokens_used,
+                "active": not self._is_idle(session, now),
+            })
+        return sessions
+
+    def delete_user(self, user_id: str) -> int:
+        """删除用户的全部会话（清空聊天记录时调用），返回删除的会话数"""
+        with self._lock:
+            self._active.pop(user_id, None)
+        return self.db[SESSION_COLLECTION].delete_many({"user_id": user_id}).deleted_count
+
+    def clear(self):
+        """清空进程内缓存的活跃会话"""
+        with self._lock:
+            self._active.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回会话管理器统计信息"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "idle_minutes": self.idle_timeout.total_seconds() / 60,
+                "cached_sessions": len(self._active),
+                "hits": self.hits,
+                "misses": self.misses,
+                "created": self.created,
+            }
+
+
+# 进程级共享的会话管理器
+session_manager = SessionManager()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+对话摘要服务
+- 在后台任务队列中把较早的聊天记录折叠进每个用户的滚动摘要
+- 摘要保存在 users 文档的 conversation_summary 字段，并追加到 interaction_history（最多20条）
+- 聊天时发送「摘要 + 最近的对话」，而不是很长的原始历史
+- 开启会话时，最近 keep_recent 条只在当前会话内计算：会话因闲置结束后整段折叠进摘要（note_session_closed）；
+  折叠完成前，上下文仍包含摘要未覆盖的消息（见 ChatService._history_query）
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import Config
+from .content_codec import decode_content
+from .context_cache import conversation_context_cache
+from .job_queue import BackgroundJobQueue
+from .session_manager import SESSION_COLLECTION
+
+# 读取摘要覆盖范围时的投影
+SUMMARY_COVERAGE_PROJECTION = {"conversation_summary.summarized_until": 1}
+
+
+def summarized_until(user_doc: Optional[Dict[str, Any]]) -> Optional[datetime]:
+    """users 文档中摘要已覆盖到的消息时间；没有摘要时返回 None"""
+    return ((user_doc or {}).get("conversation_summary") or {}).get("summarized_until")
+
+
+SUMMARY_SYSTEM_PROMPT = """你是一个对话摘要助手。请把"已有摘要"和"新的对话记录"合并成一份新的摘要，供AI陪伴者在之后的聊天中回忆。
+要求：
+- 使用第三人称描述用户，保留用户的重要经历、情绪变化、人际关系、偏好和未完成的计划
+- 忽略寒暄和重复内容，不要编造对话中没有出现的信息
+- 用简洁的中文要点输出，总长度不超过{max_chars}字，不要输出其他内容"""
+
+
+class StubSummaryLLM:
+    """
+    本地摘要模型桩
+    不调用任何外部服务，输出可预测，用于测试和本地开发（SUMMARY_LLM=stub）
+    """
+
+    def chat(self, messages: List[Dict], **kwargs) -> Tuple[Optional[str], int]:
+        transcript = messages[-1]["content"]
+        lines = [line for line in transcript.splitlines() if line.startswith("用户：")]
+        summary = "；".join(line[len("用户："):][:30] for line in lines[-10:])
+        return f"用户近期提到：{summary}", 0
+
+
+class ConversationSummarizer:
+    """
+    滚动对话摘要器
+    每个用户累计一定轮数的对话后，在后台把最近 keep_recent 条之前的消息折叠进摘要
+    """
+
+    def __init__(self, llm=None, db=None, job_queue: BackgroundJobQueue = None, context_cache=None):
+        self.enabled = Config.SUMMARY_ENABLED
+        self.check_every = Config.SUMMARY_CHECK_EVERY
+        self.keep_recent = Config.SUMMARY_KEEP_RECENT
+        self.min_messages = Config.SUMMARY_MIN_MESSAGES
+        self.max_batch = Config.SUMMARY_MAX_BATCH
+        self.max_chars = Config.SUMMARY_MAX_CHARS
+        self._llm = llm
+        self._db = db
+        self.job_queue = job_queue or BackgroundJobQueue("ConversationSummarizer", Config.SUMMARY_WORKERS)
+        self.context_cache = context_cache
+        self._lock = threading.Lock()
+        self._turns = Counter()
+        # 清空聊天记录时递增，执行中的摘要任务据此放弃写入
+        self._generations = Counter()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            if Config.SUMMARY_LLM == "stub":
+                self._llm = StubSummaryLLM()
+            else:
+                from .openai_service import OpenAIService
+                self._llm = OpenAIService()
+        return self._llm
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from ..extensions import mongo
+        return mongo.db
+
+    def note_turn(self, user_id: str):
+        """
+        记录一轮对话，达到阈值时提交后台摘要任务
+        在请求路径上调用，只做内存计数
+        """
+        if not self.enabled or not user_id:
+            return
+        with self._lock:
+            self._turns[user_id] += 1
+            if self._turns[user_id] < self.check_every:
+                return
+            del self._turns[user_id]
+        self.job_queue.submit(self.summarize_user, user_id, key=user_id)
+
+    def note_session_closed(self, user_id: str):
+        """用户开始新会话时调用：把上一个会话剩余的消息折叠进摘要（后台执行）"""
+        if not self.enabled or not user_id:
+            return
+        with self._lock:
+            self._turns.pop(user_id, None)
+        self.job_queue.submit(self.summarize_user, user_id, key=user_id)
+
+    def _active_session_start(self, user_id: str) -> Optional[datetime]:
+        """用户当前（最近活跃）会话的开始时间；未启用会话时返回 None"""
+        if not Config.CHAT_SESSIONS_ENABLED:
+            return None
+        doc = self.db[SESSION_COLLECTION].find_one({"user_id": user_id}, {"created_at": 1},
+                                                   sort=[("last_active", -1)])
+        return doc.get("created_at") if doc else None
+
+    def forget_user(self, user_id: str):
+        """
+        清空用户聊天记录时调用：丢弃累计的轮数，并让已提交或执行中的摘要任务不再写入
+        users 文档中的摘要由调用方删除
+        """
+        with self._lock:
+            self._turns.pop(user_id, None)
+            self._generations[user_id] += 1
+
+    def _load_pending_messages(self, user_id: str, summarized_until: Optional[datetime],
+                               session_started: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        加载尚未摘要、且不在最近 keep_recent 条之内的消息（按时间正序）
+        传入当前会话的开始时间时，之前会话的消息都可以折叠，keep_recent 只在当前会话内计算
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if summarized_until is not None:
+            query["timestamp"] = {"$gt": summarized_until}
+
+        # 第 keep_recent 条最新消息的时间作为本次摘要的截止点
+        boundaries = [doc["timestamp"] for doc in
+                      self.db.chat_messages.find(query, {"timestamp": 1})
+                      .sort("timestamp", -1).skip(self.keep_recent).limit(1)]
+        if session_started is not None:
+            # 之前会话的最后一条消息
+            earlier = dict(query.get("timestamp", {}), **{"$lt": session_started})
+            boundaries += [doc["timestamp"] for doc in
+                           self.db.chat_messages.find(dict(query, timestamp=earlier), {"timestamp": 1})
+                           .sort("timestamp", -1).limit(1)]
+        if not boundaries:
+            return []
+        query["timestamp"] = dict(query.get("timestamp", {}), **{"$lte": max(boundaries)})
+        return list(
+            self.db.chat_messages.find(query, {"role": 1, "content": 1, "timestamp": 1})
+            .sort("timestamp", 1).limit(self.max_batch)
+        )
+
+    def _build_prompt(self, previous_summary: str, messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """构建摘要请求的消息列表"""
+        role_names = {"user": "用户", "assistant": "念念"}
+        transcript = "\n".join(
+            f"{role_names.get(msg.get('role'), msg.get('role'))}：{(decode_content(msg.get('content')) or '')[:500]}"
+            for msg in messages
+        )
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(max_chars=self.max_chars)},
+            {"role": "user", "content": f"已有摘要：\n{previous_summary or '（无）'}\n\n新的对话记录：\n{transcript}"},
+        ]
+
+    def summarize_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        把用户较早的消息折叠进滚动摘要（在后台线程中执行）
+
+        Returns:
+            新的摘要信息；没有足够的新消息或模型调用失败时返回 None
+        """
+        with self._lock:
+            generation = self._generations[user_id]
+        user_doc = self.db.users.find_one({"user_id": user_id}, {"conversation_summary": 1}) or {}
+        current = user_doc.get("conversation_summary") or {}
+
+        messages = self._load_pending_messages(user_id, current.get("summarized_until"),
+                                               self._active_session_start(user_id))
+        if len(messages) < self.min_messages:
+            return None
+
+        summary_text, _ = self.llm.chat(self._build_prompt(current.get("text", ""), messages),
+                                        temperature=0.3, max_tokens=1024, user_id=user_id, endpoint="chat.summary")
+        if not summary_text:
+            return None
+        summary_text = summary_text.strip()[:self.max_chars]
+        with self._lock:
+            if self._generations[user_id] != generation:
+                # 调用模型期间用户清空了聊天记录，摘要的内容已被删除
+                return None
+
+        now = datetime.now()
+        summary = {
+            "text": summary_text,
+            "summarized_until": messages[-1]["timestamp"],
+            "message_count": current.get("message_count", 0) + len(messages),
+            "updated_at": now,
+        }
+        self.db.users.update_one(
+            {"user_id": user_id},
+            {
+                "$set": {"conversation_summary": summary},
+                # 与 User.add_interaction_summary 一致，只保留最近20条
+                "$push": {"interaction_history": {"$each": [{"timestamp": now, "summary": summary_text}], "$slice": -20}},
+            },
+            upsert=True
+        )
+        if self.context_cache is not None:
+            self.context_cache.update_profile(user_id, {"conversation_summary": summary_text})
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        """返回摘要服务统计信息"""
+        return dict(self.job_queue.stats(), enabled=self.enabled, llm=Config.SUMMARY_LLM)
+
+
+# 进程级共享的对话摘要器
+conversation_summarizer = ConversationSummarizer(context_cache=conversation_context_cache)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+用量计量模块
+- 记录每次大模型调用的 prompt/completion token 数、上游耗时、首字耗时（TTFT）和调用来源（endpoint）
+- 流式调用优先使用流中返回的 usage（AZURE_STREAM_INCLUDE_USAGE），否则在本地计数（记为估算值）
+- 记录先进入内存队列，后台线程按 (分钟, 用户, 来源, 模型) 聚合后批量写入 MongoDB 时间序列集合
+- 提供按用户、按天汇总 token、费用和延迟的查询
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import Config
+from .context_builder import REPLY_PRIMING_TOKENS, TokenCounter
+from .write_behind import BatchWriter
+
+# 未传入调用来源时使用的名称
+UNKNOWN_ENDPOINT = "other"
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    解析模型单价配置
+
+    Args:
+        spec: 如 "4o=0.0025/0.01,gpt-35-turbo=0.0005/0.0015"（每1K prompt / completion token 的价格）
+
+    Returns:
+        {模型: (prompt单价, completion单价)}
+    """
+    prices = {}
+    for item in (spec or "").split(","):
+        model, _, value = item.partition("=")
+        prompt_price, _, completion_price = value.partition("/")
+        try:
+            prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError:
+            continue
+    return prices
+
+
+class UsageMeter(BatchWriter):
+    """
+    用量计量器
+    请求线程只调用 record() 把一条记录放进队列；后台线程每批把记录按分钟聚合，
+    一个 (分钟, 用户, 来源, 模型) 组合只写入一个文档
+    """
+
+    name = "UsageMeter"
+
+    def __init__(self, db=None, collection_name: str = None, prices: Dict[str, Tuple[float, float]] = None, **kwargs):
+        kwargs.setdefault("enabled", Config.USAGE_METERING_ENABLED)
+        kwargs.setdefault("batch_size", Config.USAGE_BATCH_SIZE)
+        kwargs.setdefault("flush_interval", Config.USAGE_FLUSH_INTERVAL)
+        super().__init__(**kwargs)
+        self._db = db
+        self.collection_name = collection_name or Config.USAGE_COLLECTION
+        self.prices = prices if prices is not None else parse_prices(Config.USAGE_PRICES)
+        self.token_counter = TokenCounter()
+        self._collection_ready = False
+        self.dropped = 0
+
+    @property
+    def collection(self):
+        if self._db is not None:
+            return self._db[self.collection_name]
+        from ..extensions import mongo
+        return mongo.db[self.collection_name]
+
+    def count_prompt_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """本地估算请求消息的 prompt token 数（流中没有 usage 时使用）"""
+        return sum(self.token_counter.count_message(message) for message in messages) + REPLY_PRIMING_TOKENS
+
+    def count_completion_tokens(self, text: str) -> int:
+        """本地估算回复的 completion token 数"""
+        return self.token_counter.count(text)
+
+    def record(self, endpoint: str = None, user_id: str = None, model: str = None, deployment: str = None,
+               prompt_tokens: int = 0, completion_tokens: int = 0, latency: float = None,
+               ttft: float = None, stream: bool = False, success: bool = True, estimated: bool = False) -> bool:
+        """
+        记录一次大模型调用
+
+        Args:
+            endpoint: 调用来源（如 "chat.message"、"report.big_five"）
+            user_id: 用户ID（报告等无用户的调用为空）
+            model: 实际使用的模型（降级后为备用模型）
+            deployment: 实际使用的部署
+            latency: 从发起请求到收到完整回复的秒数（含重试）
+            ttft: 流式调用从发起请求到收到第一个文本片段的秒数
+            estimated: token 数是否为本地估算值
+
+        Returns:
+            bool: 是否成功入队；未启用或队列已满时返回 False（记录被丢弃）
+        """
+        queued = self.submit({
+            "ts": datetime.now(),
+            "endpoint": endpoint or UNKNOWN_ENDPOINT,
+            "user_id": user_id,
+            "model": model,
+            "deployment": deployment,
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "latency": latency,
+            "ttft": ttft,
+            "stream": stream,
+            "success": success,
+            "estimated": estimated,
+        })
+        if not queued and self.enabled:
+            self.dropped += 1
+        return queued
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """按配置的单价计算费用；未配置单价的模型费用为0"""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def aggregate(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把一批记录按 (分钟, 用户, 来源, 模型) 聚合为时间序列文档"""
+        groups: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        for record in records:
+            minute = record["ts"].replace(second=0, microsecond=0)
+            key = (minute, record["user_id"], record["endpoint"], record["model"])
+            doc = groups.get(key)
+            if doc is None:
+                doc = groups[key] = {
+                    "ts": minute,
+                    "meta": {"user_id": record["user_id"], "endpoint": record["endpoint"], "model": record["model"]},
+                    "calls": 0, "errors": 0, "streamed": 0, "estimated": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0,
+                    "latency_sum": 0.0, "latency_count": 0, "latency_max": 0.0,
+                    "ttft_sum": 0.0, "ttft_count": 0, "ttft_max": 0.0,
+                }
+            doc["calls"] += 1
+            doc["errors"] += 0 if record["success"] else 1
+            doc["streamed"] += 1 if record["stream"] else 0
+            doc["estimated"] += 1 if record["estimated"] else 0
+            doc["prompt_tokens"] += record["prompt_tokens"]
+            doc["completion_tokens"] += record["completion_tokens"]
+            doc["total_tokens"] += record["prompt_tokens"] + record["completion_tokens"]
+            doc["cost"] += self.cost(record["model"], record["prompt_tokens"], record["completion_tokens"])
+            for field in ("latency", "ttft"):
+                if record[field] is not None:
+                    doc[f"{field}_sum"] += record[field]
+                    doc[f"{field}_count"] += 1
+                    doc[f"{field}_max"] = max(doc[f"{field}_max"], record[field])
+        return list(groups.values())
+
+    def ensure_collection(self):
+        """
+        创建时间序列集合（已存在时跳过）
+        过期由集合的 expireAfterSeconds 处理；MongoDB 5.0 以下不支持时间序列集合时退化为普通集合
+        """
+        if self._collection_ready:
+            return
+        db = self.collection.database
+        if self.collection_name not in db.list_collection_names():
+            try:
+                db.create_collection(
+                    self.collection_name,
+                    timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+                    expireAfterSeconds=Config.USAGE_RETENTION_DAYS * 86400,
+                )
+            except Exception as e:
+                self.print_log(f"Time-series collection unavailable, using a regular collection: {str(e)}")
+        # 按用户查询：find({"meta.user_id", "ts": {"$gte"}})
+        self.collection.create_index([("meta.user_id", 1), ("ts", -1)], name="user_id_ts")
+        self._collection_ready = True
+
+    def _write_batch(self, items):
+        self.ensure_collection()
+        self.collection.insert_many(self.aggregate(items), ordered=False)
+
+    def query(self, days: int = 7, user_id: str = None, endpoint: str = None,
+              group_by: Tuple[str, ...] = ("day",)) -> List[Dict[str, Any]]:
+        """
+        汇总用量
+
+        Args:
+            days: 统计最近N天（含今天）
+            user_id: 只统计该用户
+            endpoint: 只统计该来源
+            group_by: 分组字段，可选 "day"、"user_id"、"endpoint"、"model"
+
+        Returns:
+            每组的调用次数、错误数、token数、费用、平均/最大延迟和TTFT
+        """
+        # 先写入队列中的记录，保证查询包含刚刚发生的调用
+        self.flush()
+        since = (datetime.now() - timedelta(days=max(days, 1) - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        match: Dict[str, Any] = {"ts": {"$gte": since}}
+        if user_id is not None:
+            match["meta.user_id"] = user_id
+        if endpoint is not None:
+            match["meta.endpoint"] = endpoint
+
+        group_id = {}
+        for field in group_by:
+            group_id[field] = {"$dateToString": {"format": "%Y-%m-%d", "date": "$ts"}} if field == "day" \
+                else f"$meta.{field}"
+        sums = ("calls", "errors", "streamed", "estimated", "prompt_tokens", "completion_tokens", "total_tokens",
+                "cost", "latency_sum", "latency_count", "ttft_sum", "ttft_count")
+        group: Dict[str, Any] = {"_id": group_id}
+        group.update({field: {"$sum": f"${field}"} for field in sums})
+        group.update({field: {"$max": f"${field}"} for field in ("latency_max", "ttft_max")})
+
+        rows = []
+        for item in self.collection.aggregate([{"$match": match}, {"$group": group}]):
+            row = dict(item.pop("_id"))
+            latency_count, ttft_count = item.pop("latency_count"), item.pop("ttft_count")
+            latency_sum, ttft_sum = item.pop("latency_sum"), item.pop("ttft_sum")
+            row.update(item)
+            row["cost"] = round(row["cost"], 6)
+            row["latency_avg"] = round(latency_sum / latency_count, 3) if latency_count else None
+            row["ttft_avg"] = round(ttft_sum / ttft_count, 3) if ttft_count else None
+            rows.append(row)
+        rows.sort(key=lambda row: tuple(str(row.get(field)) for field in group_by))
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"collection": self.collection_name, "dropped": self.dropped,
+                      "priced_models": sorted(self.prices)})
+        return stats
+
+
+# 进程级共享的用量计量器
+usage_meter = UsageMeter()
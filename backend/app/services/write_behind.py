@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量写入（write-behind）模块
+- 请求线程只把待写入的数据放进内存队列，由后台线程批量写入MongoDB
+- 按数量阈值或时间阈值触发刷新，进程退出时把队列中剩余数据写完
+- 一批数据重试用尽后放回队列头部，数据库恢复后随下次刷新写入；只有队列放不下或进程正在退出时才丢弃
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ..config import Config
+from .metrics import metrics
+from .session_manager import SESSION_COLLECTION, session_counter_updates
+
+
+class BatchWriter:
+    """
+    后台批量写入器基类
+    子类实现 _write_batch(items) 完成实际的批量写入
+    """
+
+    name = "BatchWriter"
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None,
+                 max_queue: int = None, max_retries: int = 3, enabled: bool = True):
+        self.batch_size = batch_size if batch_size is not None else Config.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.WRITE_BEHIND_FLUSH_INTERVAL
+        self.max_queue = max_queue if max_queue is not None else Config.WRITE_BEHIND_MAX_QUEUE
+        self.max_retries = max_retries
+        self.enabled = enabled
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._buffer: List[Any] = []
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stopping = False
+
+        self.written = 0
+        self.failed = 0
+        self.requeued = 0
+        self.flushes = 0
+
+    def print_log(self, message: str):
+        """打印日志信息"""
+        print(f"[{self.name}] {message}")
+
+    def _ensure_worker(self):
+        """
+        惰性启动后台线程（调用方需持有锁）
+        gunicorn fork 出的子进程不会继承父进程的线程，因此按 pid 判断是否需要重新启动
+        """
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        if self._pid != os.getpid():
+            # fork 之后父进程的缓冲数据由父进程负责写入，子进程从空队列开始
+            self._buffer = []
+            self._on_reset()
+            self._stopping = False
+            self._pid = os.getpid()
+            atexit.register(self.shutdown)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _on_reset(self):
+        """fork 后清空子类维护的额外状态"""
+
+    def _on_enqueue(self, item: Any):
+        """入队时的回调（调用方持有锁）"""
+
+    def _on_dequeue(self, items: List[Any]):
+        """一批数据写入结束（成功或放弃）后的回调（调用方持有锁）"""
+
+    def submit(self, item: Any) -> bool:
+        """
+        将一条数据放入写入队列
+
+        Returns:
+            bool: 是否成功入队；未启用、正在关闭或队列已满时返回 False，调用方应同步写入
+        """
+        if not self.enabled:
+            return False
+        with self._cond:
+            if self._stopping or len(self._buffer) >= self.max_queue:
+                return False
+            self._ensure_worker()
+            self._buffer.append(item)
+            self._on_enqueue(item)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        """后台线程：等待数量或时间阈值后刷新"""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self) -> int:
+        """
+        立即把队列中的数据写入数据库
+
+        Returns:
+            int: 本次成功写入的条数
+        """
+        with self._flush_lock:
+            with self._cond:
+                items = self._buffer
+                self._buffer = []
+            if not items:
+                return 0
+
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    self._write_batch(items)
+                    self.written += len(items)
+                    self.flushes += 1
+                    # 写入结束后才出队，保证写入过程中 has_pending 等查询仍能看到这些数据
+                    with self._cond:
+                        self._on_dequeue(items)
+                    return len(items)
+                except Exception as e:
+                    self.print_log(f"Batch write failed (attempt {attempt}/{self.max_retries}, {len(items)} items): {str(e)}")
+                    if attempt < self.max_retries:
+                        time.sleep(min(0.1 * 2 ** attempt, 2.0))
+            self._requeue(items)
+            return 0
+
+    def _requeue(self, items: List[Any]):
+        """
+        重试用尽的一批数据放回队列头部，下次刷新时再写（数据库短暂不可用时不丢数据）
+        放回后超出 max_queue 的部分，以及正在关闭时的整批数据，计入 failed 并丢弃
+        """
+        with self._cond:
+            if self._stopping:
+                kept, dropped = [], items
+            else:
+                room = max(self.max_queue - len(self._buffer), 0)
+                kept, dropped = items[:room], items[room:]
+            self._buffer = kept + self._buffer
+            self.requeued += len(kept)
+            self.failed += len(dropped)
+            if dropped:
+                self._on_dequeue(dropped)
+        if dropped:
+            self.print_log(f"Dropped {len(dropped)} items after {self.max_retries} failed attempts")
+
+    def _write_batch(self, items: List[Any]):
+        raise NotImplementedError
+
+    def shutdown(self, timeout: float = 10.0):
+        """停止后台线程并写完队列中剩余的数据（可重复调用）"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        # 线程未及时退出或从未启动时，在当前线程中兜底写入
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回写入器统计信息"""
+        with self._cond:
+            pending = len(self._buffer)
+        return {
+            "enabled": self.enabled,
+            "pending": pending,
+            "written": self.written,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "flushes": self.flushes,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+        }
+
+
+class MessageWriteBehind(BatchWriter):
+    """
+    聊天消息的 write-behind 队列
+    - 消息用 insert_many 批量插入
+    - 同一用户的 users 文档更新（last_active / emotional_state）合并成一次 bulk_write
+    - 带 session_id 的消息按会话合并为一次计数更新（message_count / tokens_used / last_active）
+    """
+
+    name = "MessageWriteBehind"
+
+    def __init__(self, db=None, **kwargs):
+        kwargs.setdefault("enabled", Config.WRITE_BEHIND_ENABLED)
+        super().__init__(**kwargs)
+        self._db = db
+        self._pending_users = Counter()
+
+    @property
+    def db(self):
+        if self._db is not None:
+            return self._db
+        from ..extensions import mongo
+        return mongo.db
+
+    def enqueue(self, message_doc: Dict[str, Any], user_id: str, user_update: Dict[str, Any]) -> bool:
+        """
+        将一条消息及对应的用户文档更新放入队列
+
+        Args:
+            message_doc: chat_messages 文档
+            user_id: 用户ID
+            user_update: 需要 $set 到 users 文档的字段
+
+        Returns:
+            bool: 是否成功入队
+        """
+        return self.submit((message_doc, user_id, user_update))
+
+    def has_pending(self, user_id: str) -> bool:
+        """指定用户是否还有尚未写入的消息"""
+        with self._cond:
+            return self._pending_users.get(user_id, 0) > 0
+
+    def _on_reset(self):
+        self._pending_users = Counter()
+
+    def _on_enqueue(self, item):
+        self._pending_users[item[1]] += 1
+
+    def _on_dequeue(self, items):
+        for _, user_id, _ in items:
+            self._pending_users[user_id] -= 1
+            if self._pending_users[user_id] <= 0:
+                del self._pending_users[user_id]
+
+    @staticmethod
+    def coalesce_user_updates(items) -> Dict[str, Dict[str, Any]]:
+        """按用户合并 $set 字段，后写入的值覆盖先写入的值"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for _, user_id, user_update in items:
+            merged.setdefault(user_id, {}).update(user_update)
+        return merged
+
+    def _write_batch(self, items):
+        with metrics.time_mongo("save_message_batch"):
+            self._write_messages(items)
+
+    def _write_messages(self, items):
+        docs = [message_doc for message_doc, _, _ in items]
+        try:
+            self.db.chat_messages.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # 重试时已写入的消息会触发重复键错误（code 11000），可以忽略
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            if errors:
+                raise
+
+        updates = [
+            UpdateOne({"user_id": user_id}, {"$set": user_update}, upsert=True)
+            for user_id, user_update in self.coalesce_user_updates(items).items()
+        ]
+        if updates:
+            self.db.users.bulk_write(updates, ordered=False)
+
+        # 会话计数（消息数、token数、最后活跃时间）按会话合并后增量更新
+        session_updates = session_counter_updates(docs)
+        if session_updates:
+            self.db[SESSION_COLLECTION].bulk_write(session_updates, ordered=False)
+
+
+# 进程级共享的消息写入队列
+message_write_behind = MessageWriteBehind()
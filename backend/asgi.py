@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI应用入口文件
+- 流式聊天接口（POST /api/chat/message）由 asyncio 原生处理，空闲的流只占用一个协程
+- 其余接口通过 WsgiToAsgi 转交给 run.py 中的 Flask 应用，行为保持不变
+
+启动方式：
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 确保当前目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asgiref.wsgi import WsgiToAsgi
+
+from run import app as flask_app
+from app.extensions import close_async_db
+from app.routes.chat import clean_message_content
+from app.services.async_chat_service import AsyncChatService
+from app.services.async_openai_service import AsyncOpenAIService
+from app.services.metrics import metrics
+from app.services.write_behind import message_write_behind
+
+CHAT_STREAM_PATH = "/api/chat/message"
+
+STREAM_HEADERS = [
+    (b"content-type", b"text/plain; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"connection", b"keep-alive"),
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type"),
+]
+
+
+def sse_event(payload) -> bytes:
+    """编码一条SSE事件"""
+    if isinstance(payload, str):
+        return f"data: {payload}\n\n".encode("utf-8")
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+class ChatStreamingASGI:
+    """
+    ASGI应用
+    将流式聊天请求交给 AsyncChatService，其他请求交给 Flask
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        self.chat_service = AsyncChatService()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == CHAT_STREAM_PATH and scope["method"] == "POST":
+            await self.chat_message(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """处理进程启动与关闭，关闭时写完排队中的消息，再释放HTTP与MongoDB连接"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.to_thread(message_write_behind.shutdown)
+                await AsyncOpenAIService.aclose()
+                close_async_db()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def read_body(receive) -> bytes:
+        """读取完整的请求体"""
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        return body
+
+    @staticmethod
+    async def send_json(send, status: int, payload: dict):
+        """发送JSON响应"""
+        body = json.dumps(payload).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def chat_message(self, scope, receive, send):
+        """
+        AI聊天接口 - 流式输出（异步版本）
+        请求头: X-User-ID - 用户ID
+        请求体: {"message": "用户消息"}
+        """
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        user_id = headers.get("x-user-id", "")
+        if not user_id.strip():
+            return await self.send_json(send, 400, {"error": "X-User-ID header is required", "status": "error"})
+
+        try:
+            data = json.loads(await self.read_body(receive) or b"null")
+        except ValueError:
+            data = None
+        if not data:
+            return await self.send_json(send, 400, {"error": "Request body is required", "status": "error"})
+
+        raw_message = str(data.get("message", "")).strip()
+        if not raw_message:
+            return await self.send_json(send, 400, {"error": "Message is required", "status": "error"})
+
+        message = clean_message_content(raw_message)
+        if not message:
+            return await self.send_json(send, 400, {"error": "Message content is empty after cleaning", "status": "error"})
+
+        started = time.perf_counter()
+        # 后端自动查找聊天历史和用户画像
+        history_result = await self.chat_service.get_history_async(user_id)
+        profile_result = await self.chat_service.get_user_profile_async(user_id)
+
+        await send({"type": "http.response.start", "status": 200, "headers": STREAM_HEADERS})
+        metrics.observe_request("POST", CHAT_STREAM_PATH, 200, time.perf_counter() - started)
+        stream_started = time.perf_counter()
+        outcome = "disconnected"
+
+        async def send_chunk(payload):
+            await send({"type": "http.response.body", "body": sse_event(payload), "more_body": True})
+
+        try:
+            await send_chunk({"type": "start", "message": "Response started"})
+            async for chunk in self.chat_service.process_message_stream_async(
+                message,
+                history_result.get("history", []),
+                profile_result.get("persona_profile", {}),
+                user_id,
+                profile_result.get("emotional_state", "neutral"),
+                profile_result.get("conversation_summary"),
+            ):
+                if chunk:
+                    await send_chunk({"type": "content", "content": chunk})
+            await send_chunk({"type": "end", "message": "Response completed"})
+            outcome = "completed"
+        except Exception as e:
+            outcome = "error"
+            await send_chunk({"type": "error", "error": str(e)})
+        finally:
+            metrics.observe_stream(CHAT_STREAM_PATH, outcome, time.perf_counter() - stream_started)
+
+        await send({"type": "http.response.body", "body": sse_event("[DONE]"), "more_body": False})
+
+
+application = ChatStreamingASGI(flask_app)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn配置文件
+- gunicorn 启动时会自动加载当前目录下的 gunicorn.conf.py
+- 命令行参数（见 Dockerfile）优先级高于此文件
+- 多个 worker 的 Prometheus 指标写入 PROMETHEUS_MULTIPROC_DIR，由 /metrics 汇总
+"""
+
+import os
+import shutil
+
+# 必须在 worker 导入 prometheus_client 之前设置，fork 出的 worker 会继承该环境变量
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    """master 启动时清空上一次运行留下的指标文件"""
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def worker_exit(server, worker):
+    """worker退出时写完内存队列中尚未落库的数据"""
+    from app.services.usage_meter import usage_meter
+    from app.services.write_behind import message_write_behind
+    message_write_behind.shutdown()
+    usage_meter.shutdown()
+
+
+def child_exit(server, worker):
+    """
+    worker 退出后清理其指标文件（在 master 中调用）
+    只导入 prometheus_client，不导入 app 包：master 中不应创建蓝图、服务和连接池
+    """
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:  # prometheus_client 为可选依赖
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+聊天记录归档脚本
+- 把 chat_messages 中超过 ARCHIVE_HOT_DAYS 天的消息按 (用户, 月份) 压缩归档到 chat_archive（见 app/services/message_archive.py）
+- 可重复执行，适合放在定时任务中每天运行一次，例如：
+      30 4 * * *  cd /app/backend && python scripts/archive_messages.py
+- --user 只归档指定用户；--stats 只输出归档集合的汇总
+
+用法：
+    python scripts/archive_messages.py [--max-users 1000] [--hot-days 30]
+    python scripts/archive_messages.py --user 12345
+    python scripts/archive_messages.py --stats
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+
+from app.config import Config
+from app.services.message_archive import MessageArchiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive cold chat messages into monthly buckets")
+    parser.add_argument("--mongo-uri", default=Config.MONGO_URI)
+    parser.add_argument("--hot-days", type=int, default=None, help="覆盖 ARCHIVE_HOT_DAYS")
+    parser.add_argument("--max-users", type=int, default=None, help="本次最多处理的用户数")
+    parser.add_argument("--user", default=None, help="只归档该用户")
+    parser.add_argument("--stats", action="store_true", help="只输出归档汇总")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    archiver = MessageArchiver(db=client.get_default_database(), hot_days=args.hot_days)
+    try:
+        if args.stats:
+            result = archiver.stats()
+        elif args.user:
+            results = [archiver.archive_user(args.user)]
+            while not results[-1]["complete"]:
+                results.append(archiver.archive_user(args.user))
+            result = {"user_id": args.user, "archived": sum(item["archived"] for item in results),
+                      "months": sorted({month for item in results for month in item["months"]})}
+        else:
+            result = archiver.run(max_users=args.max_users)
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+消息内容压缩性能对比脚本
+- 对比原始UTF-8、逐条 zlib、ContentCodec 不带字典和带字典（在训练集上现训）四种存储方式
+- 输出留出集上的存储字节数（含编解码器头部、短消息不压缩）以及每条消息的编码/解码耗时
+- 语料来源与 train_content_dict.py 相同：--input 文件、--synthetic 合成语料或 MongoDB
+
+用法：
+    python scripts/bench_content_codec.py --synthetic [--samples 20000] [--min-bytes 64]
+    python scripts/bench_content_codec.py --input exported_messages.jsonl
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.models.chat import ChatMessage
+from app.services import content_codec as content_codec_module
+from app.services.content_codec import ContentCodec, zstandard
+from train_content_dict import load_corpus, split_corpus, train_dictionary
+
+
+def stored_size(value) -> int:
+    """字段在文档中占用的大致字节数（字符串按UTF-8，二进制按长度）"""
+    return len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+
+
+def bench_codec(encode, decode, texts: list, repeat: int):
+    """返回 (存储总字节数, 每条编码微秒, 每条解码微秒)，耗时取 repeat 次中的最好值"""
+    encoded = [encode(text) for text in texts]
+    assert [decode(value) for value in encoded] == texts
+    best_encode = best_decode = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            encode(text)
+        best_encode = min(best_encode, time.perf_counter() - started)
+        started = time.perf_counter()
+        for value in encoded:
+            decode(value)
+        best_decode = min(best_decode, time.perf_counter() - started)
+    return (sum(stored_size(value) for value in encoded),
+            best_encode / len(texts) * 1e6, best_decode / len(texts) * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat message content compression")
+    parser.add_argument("--mongo-uri", default=Config.MONGO_URI)
+    parser.add_argument("--input", default=None, help="语料文件（每行一条消息或JSONL）")
+    parser.add_argument("--synthetic", action="store_true", help="使用人设文本生成的合成语料")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--dict-size", type=int, default=32 * 1024)
+    parser.add_argument("--level", type=int, default=Config.CONTENT_CODEC_LEVEL)
+    parser.add_argument("--min-bytes", type=int, default=Config.CONTENT_CODEC_MIN_BYTES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if zstandard is None:
+        sys.exit("zstandard is not installed")
+    train, holdout = split_corpus(load_corpus(args))
+    started = time.perf_counter()
+    dictionary = train_dictionary(train, args.dict_size, level=args.level)
+    train_ms = (time.perf_counter() - started) * 1000
+
+    plain_codec = ContentCodec(enabled=True, level=args.level, min_bytes=args.min_bytes, dict_dir="", dict_id=0)
+    dict_codec = ContentCodec(enabled=True, level=args.level, min_bytes=args.min_bytes, dict_dir="")
+    dict_codec.dict_id = dict_codec.add_dictionary(dictionary.as_bytes())
+
+    codecs = [
+        ("raw utf-8", lambda text: text, lambda value: value),
+        ("zlib level 6", lambda text: zlib.compress(text.encode("utf-8"), 6),
+         lambda value: zlib.decompress(value).decode("utf-8")),
+        ("zstd", plain_codec.encode, plain_codec.decode),
+        ("zstd + dictionary", dict_codec.encode, dict_codec.decode),
+    ]
+    raw_bytes = sum(len(text.encode("utf-8")) for text in holdout)
+    print(f"messages: {len(train)} train / {len(holdout)} held out, "
+          f"avg {raw_bytes / len(holdout):.0f} bytes, min_bytes {args.min_bytes}, level {args.level}")
+    print(f"dictionary: {len(dictionary.as_bytes())} bytes, trained in {train_ms:.0f} ms")
+    for name, encode, decode in codecs:
+        size, encode_us, decode_us = bench_codec(encode, decode, holdout, args.repeat)
+        print(f"{name:<18}: {size:9d} bytes ({size / raw_bytes:6.1%}), "
+              f"encode {encode_us:6.2f} us, decode {decode_us:6.2f} us per message")
+
+    # 懒解码：只读取元数据的路径不付出解压成本（用带字典的编解码器替换进程级实例）
+    content_codec_module.content_codec = dict_codec
+    docs = [dict(ChatMessage("bench-user", text, "user").to_dict(), content=dict_codec.encode(text))
+            for text in holdout]
+    started = time.perf_counter()
+    messages = [ChatMessage.from_dict(doc) for doc in docs]
+    load_us = (time.perf_counter() - started) / len(docs) * 1e6
+    started = time.perf_counter()
+    assert [message.content for message in messages] == holdout
+    access_us = (time.perf_counter() - started) / len(docs) * 1e6
+    print(f"ChatMessage.from_dict: {load_us:.2f} us per message, first access to content: +{access_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
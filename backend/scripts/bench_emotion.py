@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+情绪分析性能对比脚本
+- 对比原关键词匹配实现（多次 any(keyword in text)）、相同词典下逐个关键词 count 的多标签实现
+  与 Aho-Corasick 实现（pyahocorasick C实现 / 纯Python实现）
+- 输出每条消息的平均耗时以及新旧实现结果一致的比例
+
+用法：
+    python scripts/bench_emotion.py [--messages 5000] [--repeat 5] [--length 60]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.emotion_lexicon import EMOTION_LEXICON
+from app.config.persona_config import XinErPersona
+from app.services.emotion_analyzer import EmotionAnalyzer, ahocorasick
+
+
+def legacy_analyze_emotion(message: str) -> str:
+    """原 ChatService._analyze_emotion 实现"""
+    sad_keywords = ["难过", "伤心", "痛苦", "失落", "沮丧", "哭", "眼泪"]
+    anxious_keywords = ["焦虑", "紧张", "担心", "害怕", "不安", "压力"]
+    happy_keywords = ["开心", "高兴", "快乐", "兴奋", "愉快", "满足"]
+    lonely_keywords = ["孤独", "寂寞", "一个人", "没人", "独自", "空虚"]
+
+    message_lower = message.lower()
+
+    if any(keyword in message_lower for keyword in sad_keywords):
+        return "sad"
+    elif any(keyword in message_lower for keyword in anxious_keywords):
+        return "anxious"
+    elif any(keyword in message_lower for keyword in happy_keywords):
+        return "happy"
+    elif any(keyword in message_lower for keyword in lonely_keywords):
+        return "lonely"
+    else:
+        return "neutral"
+
+
+def naive_scores(message: str) -> dict:
+    """与 EmotionAnalyzer 使用同一词典的逐关键词扫描（每个关键词一次 count）"""
+    return {
+        emotion: sum(message.count(keyword) * weight for keyword, weight in keywords.items())
+        for emotion, keywords in EMOTION_LEXICON.items()
+    }
+
+
+def build_corpus(count: int, length: int, seed: int = 42) -> list:
+    """用人设文本作为填充、随机插入情绪关键词，生成测试消息"""
+    rng = random.Random(seed)
+    filler = "".join(
+        text
+        for responses in XinErPersona.EMOTIONAL_RESPONSES.values()
+        for text in responses
+    )
+    keywords = [keyword for words in EMOTION_LEXICON.values() for keyword in words]
+
+    corpus = []
+    for _ in range(count):
+        start = rng.randrange(len(filler))
+        text = (filler[start:] + filler)[:length]
+        # 约三分之一的消息不含关键词
+        for _ in range(rng.choice((0, 1, 1, 2, 3))):
+            position = rng.randrange(len(text) + 1)
+            text = text[:position] + rng.choice(keywords) + text[position:]
+        corpus.append(text)
+    return corpus
+
+
+def bench(func, corpus: list, repeat: int) -> float:
+    """返回每条消息的最佳平均耗时（微秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark emotion analyzers")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--length", type=int, default=60, help="每条消息的大致字数")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.length)
+
+    started = time.perf_counter()
+    analyzer = EmotionAnalyzer()
+    build_ms = (time.perf_counter() - started) * 1000
+    backends = [("pure python", EmotionAnalyzer(native=False))]
+    if ahocorasick is not None:
+        backends.insert(0, ("pyahocorasick", analyzer))
+
+    legacy_us = bench(legacy_analyze_emotion, corpus, args.repeat)
+    naive_us = bench(naive_scores, corpus, args.repeat)
+
+    print(f"messages: {len(corpus)}, avg length: {sum(map(len, corpus)) / len(corpus):.1f} chars")
+    print(f"automaton: {analyzer.automaton.state_count} states, built in {build_ms:.2f} ms")
+    print(f"legacy keyword scan (first label)     : {legacy_us:8.2f} us/message")
+    print(f"naive count scan (all labels)        : {naive_us:8.2f} us/message")
+    for name, backend in backends:
+        analyze_us = bench(backend.analyze, corpus, args.repeat)
+        started = time.perf_counter()
+        backend.analyze_batch(corpus)
+        batch_us = (time.perf_counter() - started) / len(corpus) * 1e6
+        print(f"aho-corasick {name:<14} analyze : {analyze_us:8.2f} us/message "
+              f"({naive_us / analyze_us:.2f}x vs naive count), batch {batch_us:.2f} us/message")
+
+    legacy_labels = [legacy_analyze_emotion(text) for text in corpus]
+    new_labels = [analyzer.classify(text) for text in corpus]
+    agreement = sum(a == b for a, b in zip(legacy_labels, new_labels)) / len(corpus)
+    detected_legacy = sum(label != "neutral" for label in legacy_labels) / len(corpus)
+    detected_new = sum(label != "neutral" for label in new_labels) / len(corpus)
+
+    print(f"label agreement: {agreement:.1%} (non-neutral: legacy {detected_legacy:.1%}, new {detected_new:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+聊天历史转换性能对比脚本
+- 对比原 get_history 的转换路径（解码完整文档 -> ChatMessage.from_dict -> to_openai_format，
+  from_dict 每条消息都会先求值默认的 datetime.now()）与只解码投影字段后直接转换（openai_messages_from_docs）
+- 每条路径都包含BSON解码（模拟驱动），用 tracemalloc 统计每轮对话（加载一次上下文窗口）
+  分配的内存块数和字节数，并输出耗时
+- 另外对比带 __dict__ 的旧模型与 __slots__ 模型的单实例大小
+
+用法：
+    python scripts/bench_history.py [--window 50] [--turns 2000] [--length 80]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson import ObjectId
+
+from app.models.chat import HISTORY_PROJECTION, ChatMessage, openai_messages_from_docs
+
+
+class LegacyChatMessage:
+    """原 ChatMessage 实现（无 __slots__，from_dict 总是先求值 datetime.now()）"""
+
+    def __init__(self, user_id, content, role, message_id=None, timestamp=None,
+                 emotional_state="neutral", tokens_used=0):
+        self.message_id = message_id or str(ObjectId())
+        self.user_id = user_id
+        self.content = content
+        self.timestamp = timestamp or datetime.now()
+        self.role = role
+        self.emotional_state = emotional_state
+        self.tokens_used = tokens_used
+
+    def to_openai_format(self):
+        return {"role": self.role, "content": self.content}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            message_id=str(data.get("_id", "")),
+            user_id=data.get("user_id", ""),
+            content=data.get("content", ""),
+            timestamp=data.get("timestamp", datetime.now()),
+            role=data.get("role", "user"),
+            emotional_state=data.get("emotional_state", "neutral"),
+            tokens_used=data.get("tokens_used", 0)
+        )
+
+
+# 统计内存时每种路径连续执行的轮数（保留每轮创建的对象，避免空闲列表复用掩盖分配）
+MEASURE_ROUNDS = 20
+
+
+def legacy_turn(raw_docs):
+    """原 get_history：解码完整文档，逐条 from_dict 再 to_openai_format；返回本轮创建的所有对象"""
+    docs = [bson.decode(raw) for raw in raw_docs]
+    messages = [LegacyChatMessage.from_dict(doc) for doc in docs]
+    return docs, messages, [message.to_openai_format() for message in messages]
+
+
+def slotted_turn(raw_docs):
+    """__slots__ 模型：同样解码完整文档并创建模型对象"""
+    docs = [bson.decode(raw) for raw in raw_docs]
+    messages = [ChatMessage.from_dict(doc) for doc in docs]
+    return docs, messages, [message.to_openai_format() for message in messages]
+
+
+def fast_turn(raw_docs):
+    """当前 get_history：只解码投影字段，直接转换为 OpenAI 消息"""
+    docs = [bson.decode(raw) for raw in raw_docs]
+    return docs, openai_messages_from_docs(docs)
+
+
+def build_window(size: int, length: int, seed: int = 42):
+    """生成一个上下文窗口的完整文档和投影文档的BSON（模拟驱动收到的数据）"""
+    rng = random.Random(seed)
+    started = datetime(2026, 1, 1)
+    full, projected = [], []
+    for index in range(size):
+        role = "user" if index % 2 == 0 else "assistant"
+        content = "".join(chr(rng.randrange(0x4e00, 0x9fa5)) for _ in range(length))
+        doc = {
+            "_id": ObjectId(), "user_id": "bench-user", "content": content,
+            "timestamp": started + timedelta(seconds=index), "role": role,
+            "emotional_state": "neutral", "tokens_used": length,
+        }
+        full.append(bson.encode(doc))
+        projected.append(bson.encode({field: doc[field] for field, include in HISTORY_PROJECTION.items() if include}))
+    return full, projected
+
+
+def measure(turn, raw_docs, turns: int):
+    """
+    返回 (每轮分配的内存块数, 每轮分配的字节数, 每轮耗时微秒)
+    内存为连续 MEASURE_ROUNDS 轮、保留所有中间对象时的快照差值的平均
+    """
+    tracemalloc.start()
+    ignore_tracemalloc = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    before = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+    kept = [turn(raw_docs) for _ in range(MEASURE_ROUNDS)]
+    after = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in diff) / MEASURE_ROUNDS
+    size = sum(stat.size_diff for stat in diff) / MEASURE_ROUNDS
+    del kept
+
+    started = time.perf_counter()
+    for _ in range(turns):
+        turn(raw_docs)
+    elapsed_us = (time.perf_counter() - started) / turns * 1e6
+    return blocks, size, elapsed_us
+
+
+def instance_size(obj) -> int:
+    """实例本身加上 __dict__（如果有）的字节数"""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat history conversion")
+    parser.add_argument("--window", type=int, default=50, help="每轮加载的历史消息条数")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=80, help="每条消息的字数")
+    args = parser.parse_args()
+
+    full, projected = build_window(args.window, args.length)
+    assert legacy_turn(full)[-1] == fast_turn(projected)[-1]
+
+    paths = [
+        ("legacy from_dict (full docs)", legacy_turn, full),
+        ("slotted from_dict (full docs)", slotted_turn, full),
+        ("fast path (projected docs)", fast_turn, projected),
+    ]
+    print(f"window: {args.window} messages, {args.length} chars each, {args.turns} turns")
+    results = []
+    for name, turn, raw_docs in paths:
+        blocks, size, elapsed_us = measure(turn, raw_docs, args.turns)
+        results.append((blocks, size, elapsed_us))
+        print(f"{name:<30}: {blocks:7.0f} blocks, {size / 1024:7.1f} KiB, {elapsed_us:8.2f} us per turn")
+
+    (legacy_blocks, legacy_size, legacy_us), (fast_blocks, fast_size, fast_us) = results[0], results[-1]
+    print(f"fast path vs legacy: {legacy_blocks / fast_blocks:.2f}x fewer blocks, "
+          f"{legacy_size / fast_size:.2f}x fewer bytes, {legacy_us / fast_us:.2f}x faster per turn")
+
+    sample = bson.decode(full[0])
+    legacy = LegacyChatMessage.from_dict(sample)
+    slotted = ChatMessage.from_dict(sample)
+    print(f"instance size: legacy {instance_size(legacy)} bytes, slotted {instance_size(slotted)} bytes")
+
+
+if __name__ == "__main__":
+    main()
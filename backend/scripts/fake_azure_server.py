@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟 Azure OpenAI 服务
+- 兼容 chat/completions 的普通响应与流式（SSE）响应
+- 可配置延迟、失败率、失败状态码和 Retry-After，也可以按顺序预置每个请求的行为
+- --self-test 会在随机端口启动服务，验证 OpenAIService 的重试、熔断、截止时间和多部署路由逻辑
+
+用法：
+    python scripts/fake_azure_server.py --port 8001 --latency 0.2 --fail-rate 0.3 --fail-status 429
+    # 然后设置 AZURE_AI_ENDPOINT_4O=http://127.0.0.1:8001/openai/deployments/4o/chat/completions
+    #          AZURE_AI_API_KEY_4O=fake
+
+    python scripts/fake_azure_server.py --self-test
+
+运行中可通过控制接口预置后续请求的行为：
+    curl -X POST localhost:8001/_fake/script -d '[{"status": 429, "retry_after": 1}, {"status": 200}]'
+    curl localhost:8001/_fake/stats
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_REPLY = "你好呀～我在这里陪着你。"
+
+
+class FakeAzureServer(ThreadingHTTPServer):
+    """
+    模拟服务
+    每个请求的行为：优先取预置脚本中的下一项，否则按默认延迟和失败率随机决定
+    行为字段：status、retry_after（秒）、retry_after_ms、delay（秒）、content
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, fail_rate: float = 0.0,
+                 fail_status: int = 503, retry_after: Optional[float] = None, reply: str = DEFAULT_REPLY):
+        super().__init__(address, FakeAzureHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.reply = reply
+        self._lock = threading.Lock()
+        self._script = deque()
+        self.requests = 0
+        self.status_counts: Dict[str, int] = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def endpoint(self, deployment: str = "4o") -> str:
+        return f"{self.base_url}/openai/deployments/{deployment}/chat/completions?api-version=2024-02-01"
+
+    def enqueue(self, *behaviors: Dict[str, Any]):
+        """预置后续请求的行为（按顺序消费）"""
+        with self._lock:
+            self._script.extend(behaviors)
+
+    def reset(self):
+        with self._lock:
+            self._script.clear()
+            self.requests = 0
+            self.status_counts.clear()
+
+    def next_behavior(self) -> Dict[str, Any]:
+        with self._lock:
+            self.requests += 1
+            if self._script:
+                return dict(self._script.popleft())
+        if random.random() < self.fail_rate:
+            return {"status": self.fail_status, "retry_after": self.retry_after, "delay": self.latency}
+        return {"status": 200, "delay": self.latency}
+
+    def record_status(self, status: int):
+        with self._lock:
+            key = str(status)
+            self.status_counts[key] = self.status_counts.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "status_counts": dict(self.status_counts),
+                    "scripted_pending": len(self._script)}
+
+    def start(self) -> "FakeAzureServer":
+        """在后台线程中运行"""
+        threading.Thread(target=self.serve_forever, name="FakeAzureServer", daemon=True).start()
+        return self
+
+
+class FakeAzureHandler(BaseHTTPRequestHandler):
+    """请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    server: FakeAzureServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Any, extra_headers: Dict[str, str] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"null")
+
+    def do_GET(self):
+        if self.path.startswith("/_fake/stats"):
+            return self._send_json(200, self.server.stats())
+        self._send_json(404, {"error": {"code": "NotFound"}})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError:
+            return self._send_json(400, {"error": {"code": "BadRequest", "message": "invalid json"}})
+
+        if self.path.startswith("/_fake/script"):
+            self.server.enqueue(*(body or []))
+            return self._send_json(200, self.server.stats())
+        if "/chat/completions" not in self.path:
+            return self._send_json(404, {"error": {"code": "NotFound"}})
+        if not self.headers.get("api-key"):
+            self.server.record_status(401)
+            return self._send_json(401, {"error": {"code": "401", "message": "Access denied"}})
+
+        behavior = self.server.next_behavior()
+        if behavior.get("delay"):
+            time.sleep(behavior["delay"])
+
+        status = int(behavior.get("status", 200))
+        self.server.record_status(status)
+        if status != 200:
+            headers = {}
+            if behavior.get("retry_after") is not None:
+                headers["Retry-After"] = str(behavior["retry_after"])
+            if behavior.get("retry_after_ms") is not None:
+                headers["retry-after-ms"] = str(behavior["retry_after_ms"])
+            return self._send_json(status, {"error": {"code": str(status), "message": "fake failure"}}, headers)
+
+        content = behavior.get("content", self.server.reply)
+        prompt_tokens = sum(len(str(msg.get("content", ""))) for msg in (body or {}).get("messages", []))
+        if (body or {}).get("stream"):
+            include_usage = ((body or {}).get("stream_options") or {}).get("include_usage")
+            return self._send_stream(content, prompt_tokens if include_usage else None)
+
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                      "total_tokens": prompt_tokens + len(content)},
+        })
+
+    def _send_stream(self, content: str, prompt_tokens: Optional[int] = None):
+        """按字符分块返回SSE流（chunked编码）；传入 prompt_tokens 时最后附带只有 usage 的数据块"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        for piece in content:
+            event = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        if prompt_tokens is not None:
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content),
+                     "total_tokens": prompt_tokens + len(content)}
+            write_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def run_self_test() -> bool:
+    """验证 OpenAIService 的重试、熔断、截止时间和多部署路由逻辑"""
+    server = FakeAzureServer(("127.0.0.1", 0)).start()
+    backup = FakeAzureServer(("127.0.0.1", 0)).start()
+    os.environ["AZURE_AI_API_KEY_4O"] = "fake"
+    os.environ["AZURE_AI_ENDPOINT_4O"] = server.endpoint("4o")
+    # 自测不连接MongoDB，用量记录只保留在本地
+    os.environ.setdefault("USAGE_METERING_ENABLED", "false")
+
+    from app.services.model_router import Deployment, ModelRouter
+    from app.services.openai_service import OpenAIService
+    from app.services.resilience import CircuitBreakerRegistry, RetryPolicy
+
+    def make_service(max_attempts=3, failure_threshold=5, recovery_timeout=30.0,
+                     deployments=None, fallbacks=None):
+        service = OpenAIService()
+        service.print_log = lambda message: None
+        service.retry_policy = RetryPolicy(max_attempts=max_attempts, base_delay=0.05, max_delay=0.2)
+        # 每个用例使用独立的路由器和熔断器，默认只有一个 4o 部署且不降级
+        service.router = ModelRouter(CircuitBreakerRegistry(), fallbacks=fallbacks or {})
+        service.router.configure(deployments or {"4o": [Deployment("4o", "4o", server.endpoint("4o"), "fake")]})
+        for items in service.router._deployments.values():
+            for item in items:
+                service.router.breakers.get(item.name).failure_threshold = failure_threshold
+                service.router.breakers.get(item.name).recovery_timeout = recovery_timeout
+        return service
+
+    messages = [{"role": "user", "content": "hi"}]
+    results: List[bool] = []
+
+    def check(name: str, passed: bool, detail: str = ""):
+        results.append(passed)
+        print(f"[{'PASS' if passed else 'FAIL'}] {name}{' - ' + detail if detail else ''}")
+
+    # 1. 429 + Retry-After 后重试成功
+    server.reset()
+    server.enqueue({"status": 429, "retry_after": 0.3}, {"status": 200})
+    started = time.monotonic()
+    text, _ = make_service().chat(messages)
+    elapsed = time.monotonic() - started
+    check("429 honors Retry-After then succeeds", text == DEFAULT_REPLY and server.requests == 2 and elapsed >= 0.3,
+          f"requests={server.requests}, elapsed={elapsed:.2f}s")
+
+    # 2. 持续 503，重试次数用尽后返回 None
+    server.reset()
+    server.enqueue(*[{"status": 503}] * 5)
+    text, tokens = make_service(max_attempts=3).chat(messages)
+    check("5xx retries are bounded", text is None and tokens == 0 and server.requests == 3,
+          f"requests={server.requests}")
+
+    # 3. 400 不重试
+    server.reset()
+    server.enqueue({"status": 400})
+    text, _ = make_service().chat(messages)
+    check("4xx is not retried", text is None and server.requests == 1, f"requests={server.requests}")
+
+    # 4. 连续失败后熔断，之后的请求不再到达上游
+    server.reset()
+    server.enqueue(*[{"status": 500}] * 10)
+    service = make_service(max_attempts=1, failure_threshold=3, recovery_timeout=0.5)
+    for _ in range(3):
+        service.chat(messages)
+    before = server.requests
+    started = time.monotonic()
+    text, _ = service.chat(messages)
+    fast_fail = time.monotonic() - started
+    breaker = service.router.breakers.get("4o")
+    check("circuit opens and fails fast", text is None and server.requests == before and fast_fail < 0.05
+          and breaker.state == "open", f"state={breaker.state}, upstream requests={server.requests}")
+
+    # 5. 恢复时间后放行探测请求，成功则关闭熔断
+    server.reset()
+    time.sleep(0.6)
+    text, _ = service.chat(messages)
+    check("half-open probe closes the circuit", text == DEFAULT_REPLY and breaker.state == "closed",
+          f"state={breaker.state}")
+
+    # 6. 截止时间限制慢响应
+    server.reset()
+    server.enqueue({"status": 200, "delay": 3})
+    started = time.monotonic()
+    text, _ = make_service(max_attempts=1).chat(messages, timeout=1.0)
+    elapsed = time.monotonic() - started
+    check("deadline bounds a slow upstream", text is None and elapsed < 2.0, f"elapsed={elapsed:.2f}s")
+
+    # 7. 流式请求在开始输出前重试
+    server.reset()
+    server.enqueue({"status": 429, "retry_after_ms": 100}, {"status": 200})
+    streamed = "".join(make_service().chat_stream(messages))
+    check("stream retries before first byte", streamed == DEFAULT_REPLY and server.requests == 2,
+          f"requests={server.requests}")
+
+    # 8. 同一模型的第二个部署接管失败的请求
+    server.reset()
+    backup.reset()
+    server.enqueue({"status": 503})
+    service = make_service(deployments={"4o": [
+        Deployment("4o", "4o", server.endpoint("4o"), "fake"),
+        Deployment("4o#2", "4o", backup.endpoint("4o"), "fake"),
+    ]})
+    # 先让主部署的延迟统计更优，保证第一次尝试落在主部署上
+    service.router.release(service.router.acquire("4o"), 0.01, True)
+    service.router.release(service.router.acquire("4o", exclude=["4o"]), 1.0, True)
+    text, _ = service.chat(messages)
+    check("retry fails over to another deployment", text == DEFAULT_REPLY and server.requests == 1
+          and backup.requests == 1, f"primary={server.requests}, backup={backup.requests}")
+
+    # 9. 主模型熔断后降级到备用模型
+    server.reset()
+    backup.reset()
+    service = make_service(failure_threshold=1, recovery_timeout=30.0, fallbacks={"4o": ["gpt-35-turbo"]},
+                           deployments={
+                               "4o": [Deployment("4o", "4o", server.endpoint("4o"), "fake")],
+                               "gpt-35-turbo": [Deployment("gpt-35-turbo", "gpt-35-turbo",
+                                                           backup.endpoint("gpt-35-turbo"), "fake")],
+                           })
+    service.router.breakers.get("4o").record_failure()
+    text, _ = service.chat(messages)
+    stats = service.get_router_stats()
+    check("open circuit falls back to backup model", text == DEFAULT_REPLY and server.requests == 0
+          and backup.requests == 1 and stats["fallback_requests"] == 1,
+          f"primary={server.requests}, backup={backup.requests}, fallbacks={stats['fallback_requests']}")
+
+    # 10. 流式调用的用量：没有 usage 时本地计数，开启 include_usage 时使用流中返回的值
+    server.reset()
+    service = make_service()
+    local_usage, reported_usage = {}, {}
+    "".join(service.chat_stream(messages, usage=local_usage))
+    from app.config import Config
+    Config.AZURE_STREAM_INCLUDE_USAGE = True
+    try:
+        "".join(service.chat_stream(messages, usage=reported_usage))
+    finally:
+        Config.AZURE_STREAM_INCLUDE_USAGE = False
+    check("stream usage is counted locally or taken from the stream",
+          local_usage.get("estimated") and local_usage.get("completion_tokens", 0) > 0
+          and local_usage.get("ttft") is not None and reported_usage.get("estimated") is False
+          and reported_usage.get("completion_tokens") == len(DEFAULT_REPLY),
+          f"local={local_usage.get('total_tokens')}, reported={reported_usage.get('total_tokens')}")
+
+    server.shutdown()
+    backup.shutdown()
+    print(f"{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟秒数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="随机失败的比例 (0-1)")
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None, help="失败响应携带的 Retry-After 秒数")
+    parser.add_argument("--self-test", action="store_true", help="验证 OpenAIService 的容错逻辑后退出")
+    args = parser.parse_args()
+
+    if args.self_test:
+        sys.exit(0 if run_self_test() else 1)
+
+    server = FakeAzureServer((args.host, args.port), latency=args.latency, fail_rate=args.fail_rate,
+                             fail_status=args.fail_status, retry_after=args.retry_after)
+    print(f"Fake Azure OpenAI listening on {server.base_url}")
+    print(f"  AZURE_AI_ENDPOINT_4O={server.endpoint('4o')}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
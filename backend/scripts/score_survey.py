@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+问卷批量评分脚本
+- 逐行读取问卷导出文件（如 results/results.csv），把编号题目列映射为答案列表
+- 直接调用 ReportService 生成报告（不经过HTTP接口），并发数和每秒请求数可配置
+- 结果逐条写入 JSONL 文件或 MongoDB；已成功的受访者会被跳过，中断后重新运行即可续跑
+- --scores-only：只用本地计分器批量计算大五人格得分（整批向量化计算，不调用模型）
+
+用法：
+    python scripts/score_survey.py --report big_five --concurrency 8 --rate 4
+    python scripts/score_survey.py --report holistic_pipeline --sink mongo --collection survey_scores
+    python scripts/score_survey.py --scores-only          # 只计算整个样本的大五人格得分
+    python scripts/score_survey.py --dry-run --limit 3   # 只打印映射后的答案
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CSV = os.path.join("results", "results.csv")
+# 题目列：以 "数字." 开头，如 "4.我对人多的聚会感到乏味"
+QUESTION_COLUMN = re.compile(r"^\d+\.")
+# 选项填空列，如 "3.您的职业？[选项填空]"，内容合并到同一题的答案中
+FILL_IN_SUFFIX = "[选项填空]"
+
+# --scores-only 每批计分的受访者数
+SCORE_BATCH_SIZE = 1000
+SCORES_ONLY_REPORT = "big_five_scores"
+
+REPORT_RUNNERS = {
+    "big_five": lambda service, answers: service.generate_big_five_report(answers),
+    "core_values": lambda service, answers: service.generate_core_values_report(answers),
+    "holistic_pipeline": lambda service, answers: service.generate_holistic_pipeline(answers),
+}
+
+
+class RateLimiter:
+    """令牌桶限流（线程安全），rate 为每秒请求数，<=0 时不限流"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def iter_respondents(path: str, id_column: str, skip_invalid: bool) -> Iterator[Tuple[str, List[str]]]:
+    """
+    逐行读取问卷导出文件
+
+    Yields:
+        (受访者编号, 答案列表)；答案格式为 "题目：选项"
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        id_index = header.index(id_column)
+        question_columns = [(index, name) for index, name in enumerate(header) if QUESTION_COLUMN.match(name)]
+        valid_index = header.index("清洗数据结果") if "清洗数据结果" in header else None
+
+        for row in reader:
+            if not row or len(row) <= id_index:
+                continue
+            if skip_invalid and valid_index is not None and len(row) > valid_index \
+                    and row[valid_index].strip() == "无效":
+                continue
+            answers: List[str] = []
+            for index, name in question_columns:
+                value = row[index].strip() if index < len(row) else ""
+                if not value:
+                    continue
+                if name.endswith(FILL_IN_SUFFIX) and answers:
+                    answers[-1] = f"{answers[-1]}（{value}）"
+                else:
+                    answers.append(f"{name}：{value}")
+            if answers:
+                yield row[id_index].strip(), answers
+
+
+class JsonlSink:
+    """JSONL输出：成功的结果写入 output，失败的写入 output.errors.jsonl；已成功的编号用于续跑"""
+
+    def __init__(self, path: str, report_type: str):
+        self.path = path
+        self.error_path = f"{os.path.splitext(path)[0]}.errors.jsonl"
+        self.report_type = report_type
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._out = open(path, "a", encoding="utf-8")
+        self._errors = open(self.error_path, "a", encoding="utf-8")
+
+    def completed_ids(self) -> Set[str]:
+        completed = set()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 上次中断时写了一半的行
+                    continue
+                if record.get("report_type") == self.report_type and record.get("status") == "success":
+                    completed.add(record["respondent_id"])
+        return completed
+
+    def write(self, record: Dict[str, Any]):
+        target = self._out if record["status"] == "success" else self._errors
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            target.write(line + "\n")
+            target.flush()
+
+    def close(self):
+        self._out.close()
+        self._errors.close()
+
+
+class MongoSink:
+    """MongoDB输出：按 (报告类型, 受访者编号) upsert；已成功的编号用于续跑"""
+
+    def __init__(self, uri: str, collection: str, report_type: str):
+        from pymongo import MongoClient
+        self.client = MongoClient(uri)
+        self.collection = self.client.get_default_database()[collection]
+        self.report_type = report_type
+
+    def completed_ids(self) -> Set[str]:
+        cursor = self.collection.find({"report_type": self.report_type, "status": "success"},
+                                      {"respondent_id": 1, "_id": 0})
+        return {doc["respondent_id"] for doc in cursor}
+
+    def write(self, record: Dict[str, Any]):
+        doc = dict(record, _id=f"{self.report_type}:{record['respondent_id']}")
+        self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+
+    def close(self):
+        self.client.close()
+
+
+def score_one(service, report_type: str, respondent_id: str, answers: List[str],
+              limiter: RateLimiter) -> Dict[str, Any]:
+    """为一个受访者生成报告"""
+    limiter.acquire()
+    started = time.monotonic()
+    try:
+        result = REPORT_RUNNERS[report_type](service, answers)
+    except Exception as e:
+        result = {"error": f"Service error: {str(e)}"}
+    record = {
+        "respondent_id": respondent_id,
+        "report_type": report_type,
+        "status": "success" if result.get("status") == "success" else "error",
+        "elapsed": round(time.monotonic() - started, 3),
+        "scored_at": datetime.now().isoformat(),
+    }
+    if record["status"] == "success":
+        record["data"] = result["data"]
+    else:
+        record["error"] = result.get("error", "Unknown error")
+        if result.get("data"):
+            # 流水线部分阶段成功时保留已生成的部分
+            record["partial"] = result["data"]
+    return record
+
+
+def score_cohort(args, sink, completed: Set[str]) -> Dict[str, int]:
+    """本地批量计分：每 SCORE_BATCH_SIZE 个受访者组成一个矩阵一次算完"""
+    from app.services.big_five_scorer import big_five_scorer
+
+    if not big_five_scorer.available:
+        raise SystemExit("--scores-only requires numpy")
+    counts = {"success": 0, "error": 0, "skipped": 0}
+    batch: List[Tuple[str, List[str]]] = []
+
+    def flush():
+        scored_at = datetime.now().isoformat()
+        for (respondent_id, _), scores in zip(batch, big_five_scorer.score_batch([answers for _, answers in batch])):
+            record = {"respondent_id": respondent_id, "report_type": SCORES_ONLY_REPORT, "scored_at": scored_at}
+            if scores is not None:
+                record.update(status="success", data=scores)
+            else:
+                record.update(status="error", error="Answers do not cover all five dimensions")
+            sink.write(record)
+            counts[record["status"]] += 1
+        batch.clear()
+
+    submitted = 0
+    for respondent_id, answers in iter_respondents(args.csv, args.id_column, args.skip_invalid):
+        if args.limit and submitted >= args.limit:
+            break
+        if respondent_id in completed:
+            counts["skipped"] += 1
+            continue
+        batch.append((respondent_id, answers))
+        submitted += 1
+        if len(batch) >= SCORE_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return counts
+
+
+def run(args) -> int:
+    from app.config import Config
+    from app.services.report_service import ReportService
+
+    if args.dry_run:
+        for count, (respondent_id, answers) in enumerate(iter_respondents(args.csv, args.id_column, args.skip_invalid)):
+            if args.limit and count >= args.limit:
+                break
+            print(json.dumps({"respondent_id": respondent_id, "answers": answers}, ensure_ascii=False, indent=2))
+        return 0
+
+    report_type = SCORES_ONLY_REPORT if args.scores_only else args.report
+    if args.sink == "mongo":
+        sink = MongoSink(args.mongo_uri or Config.MONGO_URI, args.collection, report_type)
+    else:
+        default_output = f"{report_type}.jsonl" if args.scores_only else f"{report_type}_scores.jsonl"
+        sink = JsonlSink(args.output or os.path.join("results", default_output), report_type)
+    completed = sink.completed_ids() if args.resume else set()
+    if completed:
+        print(f"Resuming: {len(completed)} respondent(s) already scored")
+
+    if args.scores_only:
+        started = time.monotonic()
+        try:
+            counts = score_cohort(args, sink, completed)
+        finally:
+            sink.close()
+        print(f"Done in {time.monotonic() - started:.2f}s: success={counts['success']} "
+              f"error={counts['error']} skipped={counts['skipped']}")
+        return 0 if counts["error"] == 0 else 1
+
+    service = ReportService()
+    service.openai_service.print_log = lambda message: None
+    limiter = RateLimiter(args.rate, burst=args.concurrency)
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: (print("\nStopping after in-flight requests finish..."), stopping.set()))
+
+    counts = {"success": 0, "error": 0, "skipped": 0}
+    started = time.monotonic()
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            record = future.result()
+            sink.write(record)
+            counts[record["status"]] += 1
+            finished = counts["success"] + counts["error"]
+            if finished % args.progress_every == 0:
+                rate = finished / max(time.monotonic() - started, 1e-6)
+                print(f"[{finished}] success={counts['success']} error={counts['error']} "
+                      f"skipped={counts['skipped']} ({rate:.2f}/s)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="score") as executor:
+            submitted = 0
+            for respondent_id, answers in iter_respondents(args.csv, args.id_column, args.skip_invalid):
+                if stopping.is_set() or (args.limit and submitted >= args.limit):
+                    break
+                if respondent_id in completed:
+                    counts["skipped"] += 1
+                    continue
+                # 限制排队的任务数，保持逐行读取而不是一次性读入整个文件
+                while len(pending) >= args.concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                    collect(done)
+                pending.add(executor.submit(score_one, service, args.report, respondent_id, answers, limiter))
+                submitted += 1
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                collect(done)
+    finally:
+        sink.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Done in {elapsed:.1f}s: success={counts['success']} error={counts['error']} skipped={counts['skipped']}")
+    return 0 if counts["error"] == 0 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk offline report scoring for survey exports")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="问卷导出文件路径")
+    parser.add_argument("--report", choices=sorted(REPORT_RUNNERS), default="big_five")
+    parser.add_argument("--sink", choices=["jsonl", "mongo"], default="jsonl")
+    parser.add_argument("--output", default=None, help="JSONL输出路径，默认 results/<report>_scores.jsonl")
+    parser.add_argument("--mongo-uri", default=None, help="默认使用 MONGODB_URI")
+    parser.add_argument("--collection", default="survey_scores")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的报告生成数")
+    parser.add_argument("--rate", type=float, default=2.0, help="每秒最多发起的报告请求数，0为不限制")
+    parser.add_argument("--id-column", default="编号")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的受访者数，0为不限制")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="不跳过已成功的受访者")
+    parser.add_argument("--skip-invalid", action="store_true", help="跳过 清洗数据结果 为无效 的行")
+    parser.add_argument("--progress-every", type=int, default=10)
+    parser.add_argument("--dry-run", action="store_true", help="只打印映射后的答案，不调用模型")
+    parser.add_argument("--scores-only", action="store_true", help="只在本地批量计算大五人格得分，不调用模型")
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+消息内容压缩字典训练脚本
+- 从 MongoDB 的 chat_messages 抽取最近的消息（或从文件读取，每行一条消息或 {"content": ...} 的JSONL）训练 zstd 字典
+- 字典写入 <输出目录>/<字典ID>.zdict，并输出留出样本上使用/不使用字典的压缩率
+- 部署：把字典放到 CONTENT_CODEC_DICT_DIR，设置 CONTENT_CODEC_DICT_ID 为新字典ID；
+  旧字典必须保留在目录中，用旧字典压缩的消息仍需要它来解压
+
+用法：
+    python scripts/train_content_dict.py --samples 50000 --out-dir data/content_dicts
+    python scripts/train_content_dict.py --input exported_messages.jsonl --dict-id 2
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.config.persona_config import XinErPersona
+from app.services.content_codec import DICT_SUFFIX, decode_content, zstandard
+
+# 合成语料中随机插入的表情
+EMOJI = "😊😂🥺😭❤️✨🌙☀️🤗😴🙃👍🌸🍵"
+
+
+def read_corpus_file(path: str) -> list:
+    """读取语料文件：每行一条消息，或每行一个含 content 字段的JSON对象"""
+    messages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    line = json.loads(line).get("content") or ""
+                except ValueError:
+                    pass
+            if line:
+                messages.append(line)
+    return messages
+
+
+def read_corpus_mongo(uri: str, limit: int) -> list:
+    """读取 chat_messages 中最近的消息内容（已压缩的内容会先解码）"""
+    from pymongo import MongoClient
+    client = MongoClient(uri)
+    try:
+        cursor = client.get_default_database().chat_messages.find({}, {"content": 1, "_id": 0}) \
+            .sort("timestamp", -1).limit(limit)
+        return [content for content in (decode_content(doc.get("content")) for doc in cursor) if content]
+    finally:
+        client.close()
+
+
+def synthetic_corpus(count: int, seed: int = 42) -> list:
+    """
+    用人设文本拼接生成近似的聊天语料（没有真实数据时用于演示）
+    语句重复度比真实对话高，字典的收益会被高估
+    """
+    rng = random.Random(seed)
+    persona = XinErPersona
+    sentences = [text for responses in persona.EMOTIONAL_RESPONSES.values() for text in responses]
+    sentences += [text for texts in persona.DAILY_CARE.values() for text in texts]
+    sentences += [text for example in persona.CHAT_EXAMPLES.values() for text in example.values()]
+    corpus = []
+    for _ in range(count):
+        parts = rng.sample(sentences, rng.randint(1, 4))
+        text = "".join(part + (rng.choice(EMOJI) if rng.random() < 0.4 else "") for part in parts)
+        corpus.append(text)
+    return corpus
+
+
+def load_corpus(args) -> list:
+    """按命令行参数加载语料：--input 文件 > --synthetic > MongoDB"""
+    if args.input:
+        return read_corpus_file(args.input)
+    if args.synthetic:
+        return synthetic_corpus(args.samples)
+    return read_corpus_mongo(args.mongo_uri, args.samples)
+
+
+def split_corpus(corpus: list, holdout: float = 0.2, seed: int = 7):
+    """随机划分训练集和留出集"""
+    shuffled = list(corpus)
+    random.Random(seed).shuffle(shuffled)
+    cut = int(len(shuffled) * (1 - holdout))
+    return shuffled[:cut], shuffled[cut:]
+
+
+def train_dictionary(samples: list, dict_size: int, dict_id: int = 0, level: int = None):
+    """在消息样本上训练字典"""
+    level = level if level is not None else Config.CONTENT_CODEC_LEVEL
+    return zstandard.train_dictionary(dict_size, [text.encode("utf-8") for text in samples],
+                                      dict_id=dict_id, level=level)
+
+
+def compressed_size(texts: list, level: int, dictionary=None) -> int:
+    """逐条压缩后的总字节数（消息是单独存储的，不能整体压缩）"""
+    compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary) if dictionary is not None \
+        else zstandard.ZstdCompressor(level=level)
+    return sum(len(compressor.compress(text.encode("utf-8"))) for text in texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary for chat message content")
+    parser.add_argument("--mongo-uri", default=Config.MONGO_URI)
+    parser.add_argument("--input", default=None, help="语料文件（每行一条消息或JSONL）")
+    parser.add_argument("--synthetic", action="store_true", help="使用人设文本生成的合成语料")
+    parser.add_argument("--samples", type=int, default=50000, help="最多使用的消息条数")
+    parser.add_argument("--dict-size", type=int, default=32 * 1024, help="字典大小（字节）")
+    parser.add_argument("--dict-id", type=int, default=0, help="字典ID，0 表示自动分配")
+    parser.add_argument("--out-dir", default=Config.CONTENT_CODEC_DICT_DIR or "data/content_dicts")
+    args = parser.parse_args()
+
+    if zstandard is None:
+        sys.exit("zstandard is not installed")
+    corpus = load_corpus(args)
+    if len(corpus) < 100:
+        sys.exit(f"Need at least 100 messages to train a dictionary, got {len(corpus)}")
+
+    train, holdout = split_corpus(corpus)
+    dictionary = train_dictionary(train, args.dict_size, args.dict_id)
+    os.makedirs(args.out_dir, exist_ok=True)
+    path = os.path.join(args.out_dir, f"{dictionary.dict_id()}{DICT_SUFFIX}")
+    with open(path, "wb") as f:
+        f.write(dictionary.as_bytes())
+
+    level = Config.CONTENT_CODEC_LEVEL
+    raw = sum(len(text.encode("utf-8")) for text in holdout)
+    plain = compressed_size(holdout, level)
+    with_dict = compressed_size(holdout, level, dictionary)
+    print(f"trained on {len(train)} messages, evaluated on {len(holdout)} held-out messages")
+    print(f"dictionary {dictionary.dict_id()} ({len(dictionary.as_bytes())} bytes) written to {path}")
+    print(f"held-out size: raw {raw} bytes, zstd {plain / raw:.1%}, zstd+dict {with_dict / raw:.1%}")
+    print(f"to use it: CONTENT_CODEC_DICT_DIR={os.path.abspath(args.out_dir)} CONTENT_CODEC_DICT_ID={dictionary.dict_id()}")
+
+
+if __name__ == "__main__":
+    main()
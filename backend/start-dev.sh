@@ -1,6 +1,6 @@
 #!/bin/bash
 # Fast local development launcher for Flask API
-# Usage: bash start-dev.sh [flask|gunicorn]
+# Usage: bash start-dev.sh [flask|gunicorn|asgi]
 # Default: flask (with hot reload)
 
 set -e
@@ -30,6 +30,9 @@ MODE=${1:-flask}
 if [ "$MODE" = "gunicorn" ]; then
   echo "[INFO] Starting API with gunicorn (production-like)..."
   exec gunicorn --bind 0.0.0.0:5000 app:app
+elif [ "$MODE" = "asgi" ]; then
+  echo "[INFO] Starting API with uvicorn (async streaming chat)..."
+  exec uvicorn asgi:application --host 0.0.0.0 --port 5000
 else
   echo "[INFO] Starting API with Flask development server (hot reload enabled)..."
   exec flask run --host=0.0.0.0 --port=5000
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 公共夹具
+- 用 mongomock 代替 MongoDB，不需要启动数据库和大模型服务
+- 在 backend 目录下运行：python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import mongomock
+import pytest
+from flask import Flask
+
+# 确保 backend 目录在Python路径中
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.extensions import mongo
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """每个测试使用一个全新的内存数据库，替换 mongo.db"""
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(mongo, "db", database, raising=False)
+    return database
+
+
+@pytest.fixture
+def app(db):
+    """只注册蓝图的 Flask 应用（create_app 会连接真实的 MongoDB）"""
+    from app.routes import register_blueprints
+    flask_app = Flask(__name__)
+    flask_app.config["TESTING"] = True
+    register_blueprints(flask_app)
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
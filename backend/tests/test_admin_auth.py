@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""管理接口（/api/admin、/metrics）的访问令牌校验"""
+
+import pytest
+
+from app.config import Config
+
+
+def admin_urls(app):
+    """所有受 admin_required 保护的路由（路径参数用占位值填充）"""
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith("/api/admin") or rule.rule == "/metrics":
+            url = rule.rule
+            for argument in rule.arguments:
+                url = url.replace(f"<{argument}>", "x").replace(f"<string:{argument}>", "x")
+            method = "GET" if "GET" in rule.methods else sorted(rule.methods - {"HEAD", "OPTIONS"})[0]
+            urls.append((method, url))
+    return urls
+
+
+def test_admin_routes_exist(app):
+    urls = admin_urls(app)
+    assert ("GET", "/metrics") in urls
+    assert ("POST", "/api/admin/archive/run") in urls
+
+
+def test_admin_routes_are_closed_without_token(app, client, monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "")
+    for method, url in admin_urls(app):
+        response = client.open(url, method=method, headers={"Authorization": "Bearer "})
+        assert response.status_code == 403, (method, url)
+
+
+@pytest.mark.parametrize("header", [None, "Bearer wrong", "secret", "Bearer secret2"])
+def test_admin_routes_reject_wrong_token(app, client, monkeypatch, header):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    headers = {"Authorization": header} if header else {}
+    for method, url in admin_urls(app):
+        assert client.open(url, method=method, headers=headers).status_code == 401, (method, url)
+
+
+def test_admin_route_accepts_configured_token(client, monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    response = client.get("/api/admin/archive", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "success"
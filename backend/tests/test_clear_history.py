@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""ChatService.clear_history 清空聊天记录的范围"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.chat import ChatMessage
+from app.services.chat_service import ChatService
+from app.services.summary_service import ConversationSummarizer
+
+
+class FakeLLM:
+    """返回固定摘要的模型；on_call 在返回前执行，用于模拟调用期间发生的操作"""
+
+    def __init__(self, on_call=None):
+        self.on_call = on_call
+
+    def chat(self, messages, **kwargs):
+        if self.on_call:
+            self.on_call()
+        return "用户喜欢猫", 10
+
+
+@pytest.fixture
+def service(db):
+    chat_service = ChatService()
+    chat_service.summarizer = ConversationSummarizer(llm=FakeLLM(), db=db)
+    chat_service.summarizer.enabled = True
+    chat_service.summarizer.keep_recent = 0
+    chat_service.summarizer.min_messages = 1
+    return chat_service
+
+
+def seed_user(db, user_id="u1", count=4):
+    start = datetime(2026, 3, 1, 12, 0, 0)
+    db.users.insert_one({
+        "user_id": user_id,
+        "persona_profile": {"nickname": "小王"},
+        "conversation_summary": {"text": "用户喜欢猫", "summarized_until": start, "message_count": count},
+        "interaction_history": [{"timestamp": start, "summary": "用户喜欢猫"}],
+    })
+    db.chat_messages.insert_many([
+        ChatMessage(user_id, f"m{index}", "user", timestamp=start + timedelta(minutes=index)).to_dict()
+        for index in range(count)
+    ])
+
+
+def test_clear_history_removes_messages_and_summary(db, service):
+    seed_user(db)
+    seed_user(db, "u2")
+
+    result = service.clear_history("u1")
+
+    assert result["status"] == "success"
+    assert result["deleted_count"] == 4
+    assert db.chat_messages.count_documents({"user_id": "u1"}) == 0
+    user_doc = db.users.find_one({"user_id": "u1"})
+    assert "conversation_summary" not in user_doc
+    assert user_doc["interaction_history"] == []
+    # 画像不属于聊天记录，保留
+    assert user_doc["persona_profile"] == {"nickname": "小王"}
+    assert service.get_user_profile("u1")["conversation_summary"] == ""
+    # 其他用户不受影响
+    assert db.chat_messages.count_documents({"user_id": "u2"}) == 4
+    assert db.users.find_one({"user_id": "u2"})["conversation_summary"]["text"] == "用户喜欢猫"
+
+
+def test_clear_history_resets_pending_summary_turns(db, service):
+    seed_user(db)
+    summarizer = service.summarizer
+    summarizer._turns["u1"] = summarizer.check_every - 1
+
+    service.clear_history("u1")
+
+    assert "u1" not in summarizer._turns
+
+
+def test_in_flight_summary_is_not_written_after_clear(db, service):
+    seed_user(db)
+    db.users.update_one({"user_id": "u1"}, {"$unset": {"conversation_summary": ""}})
+    service.summarizer.llm.on_call = lambda: service.clear_history("u1")
+
+    assert service.summarizer.summarize_user("u1") is None
+    assert "conversation_summary" not in db.users.find_one({"user_id": "u1"})
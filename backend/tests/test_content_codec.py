@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""消息内容编解码（zstd 压缩、字典、版本头）"""
+
+import os
+
+import bson
+import pytest
+
+from app.models import chat as chat_models
+from app.services import content_codec as content_codec_module
+from app.services.content_codec import BINARY_SUBTYPE, HEADER, METHOD_ZSTD, METHOD_ZSTD_DICT, ContentCodec
+
+zstandard = pytest.importorskip("zstandard")
+
+MESSAGES = [
+    "今天工作好累啊，老板又让我加班到很晚，感觉自己快撑不住了😭" * 2,
+    "念念，我今天终于把那个项目做完了！想和你分享一下这个好消息✨" * 2,
+    "最近总是睡不好，晚上躺在床上脑子里一直在想各种事情，怎么办呢" * 2,
+]
+
+
+def train_dictionary(dict_id=7):
+    samples = [f"{text}{index}".encode("utf-8") for index in range(200) for text in MESSAGES]
+    return zstandard.train_dictionary(4096, samples, dict_id=dict_id).as_bytes()
+
+
+def header(value):
+    return HEADER.unpack_from(bytes(value))
+
+
+@pytest.fixture
+def codec():
+    return ContentCodec(enabled=True, level=3, min_bytes=16, dict_dir="", dict_id=0)
+
+
+def test_round_trip_without_dictionary(codec):
+    for text in MESSAGES:
+        encoded = codec.encode(text)
+        assert isinstance(encoded, bson.Binary) and encoded.subtype == BINARY_SUBTYPE
+        assert header(encoded) == (1, METHOD_ZSTD, 0)
+        assert codec.decode(encoded) == text
+
+
+def test_round_trip_with_dictionary_directory(tmp_path):
+    dictionary = train_dictionary()
+    (tmp_path / "7.zdict").write_bytes(dictionary)
+    codec = ContentCodec(enabled=True, level=3, min_bytes=16, dict_dir=str(tmp_path), dict_id=7)
+
+    for text in MESSAGES:
+        encoded = codec.encode(text)
+        assert header(encoded) == (1, METHOD_ZSTD_DICT, 7)
+        assert codec.decode(encoded) == text
+    assert codec.stats()["dictionaries"] == [7]
+
+
+def test_short_disabled_and_incompressible_content_stays_str(codec):
+    assert codec.encode("你好") == "你好"
+    assert ContentCodec(enabled=False, min_bytes=0).encode(MESSAGES[0]) == MESSAGES[0]
+    random_text = os.urandom(64).hex()[:40]
+    encoded = codec.encode(random_text)
+    assert encoded == random_text
+    assert codec.decode(encoded) == random_text
+
+
+def test_decode_passes_strings_and_none_through(codec):
+    assert codec.decode("原文") == "原文"
+    assert codec.decode(None) is None
+
+
+def test_decode_survives_bson_round_trip(codec):
+    doc = bson.decode(bson.encode({"content": codec.encode(MESSAGES[1])}))
+    assert codec.decode(doc["content"]) == MESSAGES[1]
+
+
+def test_decode_rejects_unknown_header_and_missing_dictionary(codec):
+    with pytest.raises(ValueError):
+        codec.decode(bson.Binary(HEADER.pack(9, METHOD_ZSTD, 0) + b"\x00", BINARY_SUBTYPE))
+
+    dict_codec = ContentCodec(enabled=True, level=3, min_bytes=16, dict_dir="")
+    dict_codec.dict_id = dict_codec.add_dictionary(train_dictionary())
+    with pytest.raises(ValueError):
+        codec.decode(dict_codec.encode(MESSAGES[0]))
+
+
+def test_chat_message_encodes_on_write_and_decodes_lazily(db, codec, monkeypatch):
+    monkeypatch.setattr(content_codec_module, "content_codec", codec)
+    monkeypatch.setattr(chat_models, "content_codec", codec)
+
+    message = chat_models.ChatMessage("u1", MESSAGES[2], "user")
+    db.chat_messages.insert_one(message.to_dict())
+    stored = db.chat_messages.find_one({"_id": message.message_id})
+    assert isinstance(stored["content"], bytes)
+
+    loaded = chat_models.ChatMessage.from_dict(stored)
+    assert not isinstance(loaded._content, str)
+    # 未访问 content 时原样写回，不重复压缩
+    assert loaded.to_dict()["content"] == stored["content"]
+    assert loaded.content == MESSAGES[2]
+    assert chat_models.openai_messages_from_docs([stored]) == [{"role": "user", "content": MESSAGES[2]}]
+
+
+def test_mixed_plain_and_compressed_history(db, codec, monkeypatch):
+    from app.services.chat_service import ChatService
+
+    monkeypatch.setattr(content_codec_module, "content_codec", codec)
+    monkeypatch.setattr(chat_models, "content_codec", codec)
+    plain = chat_models.ChatMessage("u1", "旧消息", "user").to_dict()
+    compressed = chat_models.ChatMessage("u1", MESSAGES[0], "assistant").to_dict()
+    db.chat_messages.insert_many([plain, compressed])
+
+    page = ChatService().get_history_page("u1", limit=10)
+    assert sorted(message["content"] for message in page["messages"]) == sorted(["旧消息", MESSAGES[0]])
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""gunicorn.conf.py 中在 master 进程执行的钩子"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_EXIT_SCRIPT = """
+import runpy, sys, types
+hooks = runpy.run_path("gunicorn.conf.py")
+hooks["child_exit"](None, types.SimpleNamespace(pid=12345))
+print(any(name == "app" or name.startswith("app.") for name in sys.modules))
+"""
+
+
+def test_child_exit_does_not_import_app(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, "-c", CHILD_EXIT_SCRIPT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
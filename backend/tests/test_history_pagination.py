@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""聊天历史键集分页（GET /api/chat/history 的 before/after 游标）"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.models.chat import ChatMessage
+from app.services.chat_service import ChatService
+
+
+@pytest.fixture
+def service(db):
+    return ChatService()
+
+
+def insert_messages(db, user_id, timestamps):
+    """按给定时间插入消息，content 为插入顺序编号"""
+    docs = [ChatMessage(user_id, f"m{index}", "user", timestamp=timestamp).to_dict()
+            for index, timestamp in enumerate(timestamps)]
+    db.chat_messages.insert_many(docs)
+    return docs
+
+
+def page_backwards(service, user_id, limit):
+    """从最新一页开始向前翻到底，返回按时间正序的全部消息ID"""
+    pages = []
+    page = service.get_history_page(user_id, limit=limit)
+    pages.append(page)
+    while page["has_more"]:
+        page = service.get_history_page(user_id, limit=limit, before=page["older_cursor"])
+        pages.append(page)
+    return [message["id"] for page in reversed(pages) for message in page["messages"]]
+
+
+def test_paging_backwards_keeps_messages_with_same_timestamp(db, service):
+    same = datetime(2026, 3, 1, 12, 0, 0)
+    docs = insert_messages(db, "u1", [same - timedelta(minutes=1)] + [same] * 5 + [same + timedelta(minutes=1)])
+    expected = [doc["_id"] for doc in sorted(docs, key=lambda doc: (doc["timestamp"], doc["_id"]))]
+
+    for limit in (1, 2, 3):
+        assert page_backwards(service, "u1", limit) == expected
+
+
+def test_paging_forwards_with_after_cursor(db, service):
+    same = datetime(2026, 3, 1, 12, 0, 0)
+    docs = insert_messages(db, "u1", [same] * 4)
+    expected = sorted(doc["_id"] for doc in docs)
+
+    oldest = service.get_history_page("u1", limit=10)["messages"][0]
+    cursor = ChatService.encode_history_cursor(same, oldest["id"])
+    seen = [oldest["id"]]
+    while True:
+        page = service.get_history_page("u1", limit=1, after=cursor)
+        if not page["messages"]:
+            break
+        seen.extend(message["id"] for message in page["messages"])
+        cursor = page["newer_cursor"]
+    assert seen == expected
+
+
+def test_cursor_preserves_objectid_ids(db, service):
+    same = datetime(2026, 3, 1, 12, 0, 0)
+    db.chat_messages.insert_many([{"_id": ObjectId(), "user_id": "u1", "role": "user",
+                                   "content": f"m{index}", "timestamp": same} for index in range(3)])
+    first = service.get_history_page("u1", limit=1)
+    second = service.get_history_page("u1", limit=1, before=first["older_cursor"])
+    assert second["messages"] and second["messages"][0]["id"] != first["messages"][0]["id"]
+
+    timestamp, message_id = ChatService.decode_history_cursor(first["older_cursor"])
+    assert isinstance(message_id, ObjectId)
+
+
+def test_invalid_cursor_raises_value_error(service):
+    with pytest.raises(ValueError):
+        ChatService.decode_history_cursor("not a cursor")
+    with pytest.raises(ValueError):
+        ChatService.decode_history_cursor(ChatService.encode_history_cursor(datetime.now(), "$oid:zz"))
+
+
+def test_history_route_pages_through_same_timestamp(db, client):
+    same = datetime(2026, 3, 1, 12, 0, 0)
+    docs = insert_messages(db, "u1", [same] * 3)
+    ids = []
+    url = "/api/chat/history?user_id=u1&limit=1"
+    while url:
+        body = client.get(url).get_json()
+        ids = [message["id"] for message in body["history"]] + ids
+        url = f"/api/chat/history?user_id=u1&limit=1&before={body['older_cursor']}" if body["has_more"] else None
+    assert ids == sorted(doc["_id"] for doc in docs)
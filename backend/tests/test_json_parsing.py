@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""报告JSON的提取、截断补全与字段校验"""
+
+import json
+
+import pytest
+
+from app.services.json_parsing import (IncrementalJSONObjectParser, JSONExtractionError, extract_json_object,
+                                       validate_schema)
+
+REPORT = {
+    "valueOrder": ["成长", "家庭", "自由"],
+    "valueAnalysis": "你重视\"成长\"，也在意{家人}的感受",
+    "valueGuide": "试着每周留出一段时间给自己",
+}
+
+
+def test_plain_json():
+    assert extract_json_object(json.dumps(REPORT, ensure_ascii=False)) == (REPORT, False)
+
+
+@pytest.mark.parametrize("template", [
+    "```json\nBODY\n```",
+    "好的，下面是报告：\n```json\nBODY\n```\n希望对你有帮助{",
+    "前缀 {不是json} 之后 BODY",
+])
+def test_json_inside_surrounding_text(template):
+    text = template.replace("BODY", json.dumps(REPORT, ensure_ascii=False))
+    assert extract_json_object(text) == (REPORT, False)
+
+
+def test_truncated_inside_string_keeps_prefix():
+    text = '{"valueOrder": ["成长", "家庭"], "valueAnalysis": "你重视成长，也'
+    result, repaired = extract_json_object(text)
+    assert repaired
+    assert result == {"valueOrder": ["成长", "家庭"], "valueAnalysis": "你重视成长，也"}
+
+
+def test_truncated_inside_array():
+    result, repaired = extract_json_object('```json\n{"valueOrder": ["成长", "家')
+    assert repaired
+    assert result["valueOrder"][0] == "成长"
+
+
+def test_truncated_after_key_drops_the_key():
+    result, repaired = extract_json_object('{"valueOrder": ["成长"], "valueAnalysis":')
+    assert repaired
+    assert result == {"valueOrder": ["成长"]}
+
+
+def test_truncated_in_escape_sequence():
+    result, repaired = extract_json_object('{"valueOrder": ["成长"], "valueAnalysis": "引号\\')
+    assert repaired
+    assert result["valueOrder"] == ["成长"]
+
+
+def test_repair_can_be_disabled():
+    with pytest.raises(JSONExtractionError):
+        extract_json_object('{"valueOrder": ["成长"', repair=False)
+
+
+@pytest.mark.parametrize("text", ["", "没有JSON", "[1, 2, 3]", "{]"])
+def test_no_object(text):
+    with pytest.raises(JSONExtractionError):
+        extract_json_object(text)
+
+
+def test_incremental_parser_emits_each_top_level_field():
+    text = "```json\n" + json.dumps(REPORT, ensure_ascii=False) + "\n```"
+    parser = IncrementalJSONObjectParser()
+    sections = []
+    for index in range(0, len(text), 7):
+        sections.extend(parser.feed(text[index:index + 7]))
+    assert sections == list(REPORT.items())
+
+
+def test_validate_schema():
+    schema = {"valueOrder": (list, str), "valueAnalysis": str, "plan": {"steps": (list, str)}, "title": str}
+    assert validate_schema(dict(REPORT, plan={"steps": ["a"]}), schema, optional=("title",)) == []
+    errors = validate_schema({"valueOrder": [1], "valueAnalysis": 2, "plan": {"steps": "a"}}, schema)
+    assert errors == ["valueOrder has items of unexpected type", "valueAnalysis has unexpected type int",
+                      "plan.steps should be an array", "missing field title"]
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""冷数据按 (用户, 月份) 归档"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import Config
+from app.models.chat import ChatMessage
+from app.services.message_archive import MessageArchiver, decode_chunk, encode_chunk, month_end, month_key
+
+NOW = datetime(2026, 6, 15, 12, 0, 0)
+
+
+@pytest.fixture
+def archiver(db, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_ENABLED", False)
+    return MessageArchiver(db=db, hot_days=30, retention_days=0, batch_messages=1000)
+
+
+def seed(db, user_id, timestamps):
+    db.users.update_one({"user_id": user_id}, {"$set": {"user_id": user_id}}, upsert=True)
+    docs = [ChatMessage(user_id, f"m{index}", "user", timestamp=timestamp).to_dict()
+            for index, timestamp in enumerate(timestamps)]
+    db.chat_messages.insert_many(docs)
+    return docs
+
+
+def test_month_helpers():
+    assert month_key(datetime(2026, 1, 31)) == "2026-01"
+    assert month_end("2026-01") == datetime(2026, 2, 1)
+    assert month_end("2026-12") == datetime(2027, 1, 1)
+    messages = [{"_id": "a", "content": "你好", "timestamp": datetime(2026, 1, 1)}]
+    assert decode_chunk(encode_chunk(messages, level=6)) == messages
+
+
+def test_archives_cold_messages_into_monthly_buckets(db, archiver):
+    cold = [datetime(2026, 3, 2), datetime(2026, 3, 20), datetime(2026, 4, 5)]
+    seed(db, "u1", cold + [NOW - timedelta(days=1)])
+
+    result = archiver.run(now=NOW)
+
+    assert result["archived"] == 3 and result["users"] == 1
+    assert db.chat_messages.count_documents({"user_id": "u1"}) == 1
+    assert [month["month"] for month in archiver.list_months("u1")] == ["2026-04", "2026-03"]
+    assert [message["content"] for message in archiver.load_month("u1", "2026-03")] == ["m0", "m1"]
+    assert db.users.find_one({"user_id": "u1"})["archived_until"] == archiver.cutoff(NOW)
+
+
+def test_rerun_after_interrupted_delete_does_not_duplicate(db, archiver):
+    docs = seed(db, "u1", [datetime(2026, 3, 2), datetime(2026, 3, 3)])
+    archiver.archive_user("u1", NOW)
+    # 模拟归档写入后、删除原消息前中断：原消息仍在
+    db.chat_messages.insert_many(docs)
+
+    archiver.archive_user("u1", NOW)
+
+    bucket = db[archiver.collection_name].find_one({"_id": "u1:2026-03"})
+    assert len(bucket["chunks"]) == 1 and bucket["message_count"] == 2
+    assert len(archiver.load_month("u1", "2026-03")) == 2
+    assert db.chat_messages.count_documents({"user_id": "u1"}) == 0
+
+
+def test_keeps_unsummarized_messages_hot(db, archiver, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_ENABLED", True)
+    summarized_until = datetime(2026, 3, 3, 10, 0, 0, 123000)
+    seed(db, "u1", [datetime(2026, 3, 2), summarized_until, datetime(2026, 3, 4)])
+    db.users.update_one({"user_id": "u1"},
+                        {"$set": {"conversation_summary": {"summarized_until": summarized_until}}})
+
+    assert archiver.archive_user("u1", NOW)["archived"] == 2
+    assert [doc["content"] for doc in db.chat_messages.find({"user_id": "u1"})] == ["m2"]
+
+
+def test_batch_limit_and_retention(db):
+    archiver = MessageArchiver(db=db, hot_days=30, retention_days=90, batch_messages=2)
+    seed(db, "u1", [datetime(2026, 3, day) for day in range(1, 6)])
+
+    first = archiver.archive_user("u1", NOW)
+    assert first["archived"] == 2 and not first["complete"]
+    assert archiver.run(now=NOW)["archived"] == 3
+    bucket = db[archiver.collection_name].find_one({"_id": "u1:2026-03"})
+    assert bucket["message_count"] == 5
+    assert bucket["expires_at"] == datetime(2026, 4, 1) + timedelta(days=90)
+    assert archiver.delete_user("u1") == 1
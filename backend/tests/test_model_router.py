@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""从环境变量读取模型部署"""
+
+import pytest
+
+from app.services.model_router import MODEL_ENV_SUFFIXES, load_deployments_from_env
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for suffix in MODEL_ENV_SUFFIXES.values():
+        for name in (f"AZURE_AI_API_KEY_{suffix}", f"AZURE_AI_ENDPOINT_{suffix}"):
+            monkeypatch.delenv(name, raising=False)
+            for index in range(2, 10):
+                monkeypatch.delenv(f"{name}_{index}", raising=False)
+
+
+def test_extra_deployments_without_key_use_primary_key(monkeypatch):
+    monkeypatch.setenv("AZURE_AI_API_KEY_4O", "primary")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_4O", "https://a.example.com")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_4O_2", "https://b.example.com")
+    monkeypatch.setenv("AZURE_AI_API_KEY_4O_2", "second")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_4O_3", "https://c.example.com")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_4O_4", "https://d.example.com")
+    monkeypatch.setenv("AZURE_AI_API_KEY_4O_4", "fourth")
+
+    deployments = load_deployments_from_env()["4o"]
+
+    assert [(item.name, item.endpoint, item.api_key) for item in deployments] == [
+        ("4o", "https://a.example.com", "primary"),
+        ("4o#2", "https://b.example.com", "second"),
+        ("4o#3", "https://c.example.com", "primary"),
+        ("4o#4", "https://d.example.com", "fourth"),
+    ]
+
+
+def test_extra_deployment_without_any_key_is_skipped(monkeypatch):
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_GPT4_2", "https://b.example.com")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_GPT4_3", "https://c.example.com")
+    monkeypatch.setenv("AZURE_AI_API_KEY_GPT4_3", "third")
+
+    deployments = load_deployments_from_env()["gpt-4"]
+
+    assert [(item.name, item.api_key) for item in deployments] == [("gpt-4#3", "third")]
+
+
+def test_primary_keys_argument_overrides_environment(monkeypatch):
+    monkeypatch.setenv("AZURE_AI_API_KEY_GPT35", "env")
+    monkeypatch.setenv("AZURE_AI_ENDPOINT_GPT35_2", "https://b.example.com")
+
+    deployments = load_deployments_from_env(primary_keys={"gpt-35-turbo": "given"},
+                                            primary_endpoints={"gpt-35-turbo": "https://a.example.com"})
+
+    assert [item.api_key for item in deployments["gpt-35-turbo"]] == ["given", "given"]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""报告缓存合并并发请求时遵守调用方的截止时间"""
+
+import threading
+import time
+
+import pytest
+
+from app.config import Config
+from app.services.report_cache import MemoryReportCacheBackend, ReportCache
+from app.services.resilience import Deadline
+
+
+@pytest.fixture
+def cache():
+    return ReportCache(MemoryReportCacheBackend(max_entries=10, ttl=60))
+
+
+def start_slow_leader(cache, release):
+    """占住同一输入的生成，直到 release 被设置"""
+    started = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return {"status": "success", "data": "leader"}
+
+    thread = threading.Thread(target=cache.get_or_compute, args=("core_values", ["a"], "v1", compute))
+    thread.start()
+    assert started.wait(1)
+    return thread
+
+
+def test_waiter_stops_at_caller_deadline(cache, monkeypatch):
+    monkeypatch.setattr(Config, "AZURE_REQUEST_DEADLINE", 30)
+    release = threading.Event()
+    leader = start_slow_leader(cache, release)
+    deadline = Deadline(0.2)
+    seen = []
+
+    def compute():
+        seen.append(deadline.remaining())
+        return {"error": "Deadline exceeded"}
+
+    try:
+        started = time.monotonic()
+        result = cache.get_or_compute("core_values", ["a"], "v1", compute, deadline=deadline)
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+        leader.join()
+
+    assert result == {"error": "Deadline exceeded"}
+    assert elapsed < 1
+    assert seen == [0.0]
+    assert cache.stats()["coalesced"] == 1
+
+
+def test_waiter_gets_leader_result_within_deadline(cache):
+    release = threading.Event()
+    leader = start_slow_leader(cache, release)
+    threading.Timer(0.1, release.set).start()
+
+    result = cache.get_or_compute("core_values", ["a"], "v1", lambda: {"error": "should not run"},
+                                  deadline=Deadline(5))
+    leader.join()
+
+    assert result == {"status": "success", "data": "leader"}
+
+
+def test_report_service_passes_deadline_to_cache(monkeypatch):
+    from app.services.report_service import ReportService
+
+    calls = []
+
+    class RecordingCache:
+        def get_or_compute(self, report_type, payload, prompt_version, compute, is_cacheable=None, deadline=None):
+            calls.append((report_type, deadline))
+            return {"status": "success", "data": {}}
+
+    service = ReportService()
+    service.report_cache = RecordingCache()
+    deadline = Deadline(10)
+
+    service.generate_core_values_report(["a"], deadline=deadline)
+    service.generate_holistic_report({"x": 1}, {"y": 1}, deadline=deadline)
+    service.generate_core_values_report(["a"])
+
+    assert calls[0] == ("core_values", deadline) and calls[1] == ("holistic", deadline)
+    assert isinstance(calls[2][1], Deadline)
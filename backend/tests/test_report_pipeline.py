@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""综合报告流水线的共用截止时间"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from app.config import Config
+from app.services.report_cache import report_cache
+from app.services.report_service import REPORT_SCHEMAS, ReportService
+
+
+def sample_value(spec):
+    """按字段定义生成一个能通过校验的值"""
+    if isinstance(spec, dict):
+        return {key: sample_value(value) for key, value in spec.items()}
+    if isinstance(spec, tuple):
+        return [1] if spec[1] == (int, float) else ["x"]
+    return "x"
+
+
+class FakeOpenAI:
+    """按报告类型返回合法JSON；delays 指定各类型的耗时（秒），调用会被截止时间提前打断"""
+    default_model = "fake"
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.deadlines = {}
+        self.lock = threading.Lock()
+
+    def call_azure_gpt_with_messages(self, messages, json_response=False, endpoint=None, deadline=None, **kwargs):
+        report_type = endpoint.split(".", 1)[1]
+        with self.lock:
+            self.deadlines[report_type] = deadline
+        delay = self.delays.get(report_type, 0)
+        if deadline is not None and delay > deadline.remaining():
+            time.sleep(deadline.remaining())
+            return None, 0
+        time.sleep(delay)
+        return json.dumps(sample_value(REPORT_SCHEMAS[report_type][0]), ensure_ascii=False), 100
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(report_cache, "backend", None)
+    monkeypatch.setattr(Config, "BIG_FIVE_LOCAL_SCORING", False)
+    report_service = ReportService()
+    report_service.openai_service = FakeOpenAI()
+    return report_service
+
+
+def test_all_stages_share_one_deadline(service):
+    result = service.generate_holistic_pipeline(["a", "b"])
+
+    assert result["status"] == "success"
+    deadlines = service.openai_service.deadlines
+    assert set(deadlines) == {"big_five", "core_values", "holistic"}
+    assert deadlines["big_five"] is deadlines["core_values"] is deadlines["holistic"]
+    assert deadlines["big_five"].timeout == Config.REPORT_PIPELINE_DEADLINE
+
+
+def test_slow_first_stage_stops_at_deadline(service, monkeypatch):
+    monkeypatch.setattr(Config, "REPORT_PIPELINE_DEADLINE", 0.3)
+    service.openai_service.delays = {"core_values": 5}
+
+    started = time.monotonic()
+    result = service.generate_holistic_pipeline(["a", "b"])
+
+    assert time.monotonic() - started < 1.5
+    assert result["status"] == "partial"
+    assert result["stages"]["core_values"]["status"] == "error"
+    assert result["stages"]["holistic"]["status"] == "skipped"
+    assert "big_five" in result["data"]
+
+
+def test_holistic_stage_skipped_when_too_little_time_left(service, monkeypatch):
+    monkeypatch.setattr(Config, "REPORT_PIPELINE_DEADLINE", 1.0)
+    monkeypatch.setattr(Config, "REPORT_HOLISTIC_MIN_SECONDS", 0.8)
+    service.openai_service.delays = {"big_five": 0.4}
+
+    result = service.generate_holistic_pipeline(["a", "b"])
+
+    assert result["status"] == "partial"
+    assert result["stages"]["holistic"]["status"] == "skipped"
+    assert "deadline" in result["stages"]["holistic"]["error"]
+    assert "holistic" not in service.openai_service.deadlines
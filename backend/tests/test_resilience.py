@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Azure 调用的截止时间、重试退避与熔断"""
+
+import time
+from email.utils import formatdate
+
+from app.services.resilience import CircuitBreaker, Deadline, RetryPolicy
+
+
+def test_deadline_remaining_and_clamp():
+    deadline = Deadline(0.5)
+    assert 0 < deadline.remaining() <= 0.5
+    connect, read = deadline.clamp(10, 60)
+    assert connect <= 0.5 and read <= 0.5
+    assert Deadline.resolve(deadline) is deadline
+    assert Deadline(0).expired
+
+
+def test_retry_delay_is_bounded_and_respects_retry_after():
+    policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=2)
+    deadline = Deadline(60)
+    for attempt in (1, 2, 3):
+        assert 0 <= policy.next_delay(attempt, deadline) <= min(2, 0.5 * 2 ** (attempt - 1))
+    assert policy.next_delay(4, deadline) is None
+    assert policy.next_delay(1, deadline, retry_after=5) == 5
+    # 等待后会超过截止时间时不再重试
+    assert policy.next_delay(1, Deadline(1), retry_after=5) is None
+
+
+def test_parse_retry_after():
+    assert RetryPolicy.parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert RetryPolicy.parse_retry_after({"retry-after": "3"}) == 3
+    assert 8 <= RetryPolicy.parse_retry_after({"retry-after": formatdate(time.time() + 10, usegmt=True)}) <= 10
+    assert RetryPolicy.parse_retry_after({"retry-after": "soon"}) is None
+    assert RetryPolicy.parse_retry_after(None) is None
+
+
+def test_circuit_breaker_opens_probes_and_recovers():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    # half_open 只放行一个探测请求
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_released_probe_lets_next_request_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
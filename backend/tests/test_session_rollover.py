@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""会话闲置结束后，上一段对话仍能进入上下文（原文或摘要）"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.chat import ChatMessage, ChatSession
+from app.services.chat_service import ChatService
+from app.services.context_cache import ConversationContextCache
+from app.services.session_manager import SESSION_COLLECTION, SessionManager
+from app.services.summary_service import ConversationSummarizer
+
+
+class InlineQueue:
+    """立即在当前线程执行任务的队列"""
+
+    def submit(self, func, *args, key=None, **kwargs):
+        return func(*args, **kwargs)
+
+
+class TranscriptLLM:
+    """把对话记录原样作为摘要返回，便于检查哪些消息被折叠"""
+
+    def chat(self, messages, **kwargs):
+        return messages[-1]["content"].split("新的对话记录：\n", 1)[1], 10
+
+
+@pytest.fixture
+def service(db):
+    chat_service = ChatService()
+    chat_service.context_cache = ConversationContextCache()
+    chat_service.sessions = SessionManager(db=db, enabled=True, idle_minutes=120)
+    summarizer = ConversationSummarizer(llm=TranscriptLLM(), db=db, job_queue=InlineQueue())
+    summarizer.enabled = True
+    summarizer.keep_recent = 20
+    summarizer.min_messages = 1
+    summarizer.max_chars = 10000
+    chat_service.summarizer = summarizer
+    return chat_service
+
+
+def yesterdays_chat(db, turns=10):
+    """昨天的一段对话（一个已闲置的会话）"""
+    started = datetime.now() - timedelta(days=1)
+    session = ChatSession("u1", created_at=started)
+    session.last_active = started + timedelta(minutes=turns)
+    db[SESSION_COLLECTION].insert_one(session.to_dict())
+    docs = []
+    for turn in range(turns):
+        timestamp = started + timedelta(minutes=turn)
+        docs.append(ChatMessage("u1", f"昨天的问题{turn}", "user", timestamp=timestamp,
+                                session_id=session.session_id).to_dict())
+        docs.append(ChatMessage("u1", f"昨天的回答{turn}", "assistant", timestamp=timestamp + timedelta(seconds=1),
+                                session_id=session.session_id).to_dict())
+    db.chat_messages.insert_many(docs)
+    db.users.insert_one({"user_id": "u1"})
+    return session
+
+
+def build_prompt(service):
+    history = service.get_history("u1")
+    profile = service.get_user_profile("u1")
+    return "\n".join(message["content"] for message in service._build_messages(
+        "今天好累", history["history"], conversation_summary=profile.get("conversation_summary")))
+
+
+def test_rollover_folds_previous_session_into_summary(db, service):
+    old_session = yesterdays_chat(db)
+
+    prompt = build_prompt(service)
+
+    assert service.sessions.get_active_session("u1")[0].session_id != old_session.session_id
+    summary = db.users.find_one({"user_id": "u1"})["conversation_summary"]
+    # keep_recent 只在当前会话内计算，上一个会话的20条消息全部折叠进摘要
+    assert "昨天的问题0" in summary["text"] and "昨天的回答9" in summary["text"]
+    assert "昨天的问题0" in prompt and "昨天的回答9" in prompt
+
+
+def test_previous_session_stays_in_context_until_summarized(db, service):
+    yesterdays_chat(db)
+    # 摘要暂未完成（任务排队中或模型调用失败）
+    service.summarizer.enabled = False
+
+    history = service.get_history("u1")["history"]
+
+    assert len(history) == 20
+    assert history[0]["content"] == "昨天的问题0" and history[-1]["content"] == "昨天的回答9"
+
+
+def test_summarized_messages_are_not_repeated_in_context(db, service):
+    old_session = yesterdays_chat(db)
+    build_prompt(service)
+    new_session, _ = service.sessions.get_active_session("u1")
+    db.chat_messages.insert_one(ChatMessage("u1", "今天的问题", "user", session_id=new_session.session_id).to_dict())
+    service.context_cache.invalidate("u1")
+
+    history = service.get_history("u1")["history"]
+
+    assert [message["content"] for message in history] == ["今天的问题"]
+    assert db.chat_messages.count_documents({"session_id": old_session.session_id}) == 20
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""聊天会话计数的幂等更新与清空"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.chat import ChatMessage, ChatSession
+from app.services.chat_service import ChatService
+from app.services.session_manager import SESSION_COLLECTION, SessionManager, session_counter_updates
+from app.services.write_behind import MessageWriteBehind
+
+
+def session_messages(session, count, start=datetime(2026, 3, 1, 12, 0, 0)):
+    return [ChatMessage(session.user_id, f"m{index}", "user", timestamp=start + timedelta(seconds=index),
+                        tokens_used=10, session_id=session.session_id).to_dict()
+            for index in range(count)]
+
+
+@pytest.fixture
+def session(db):
+    chat_session = ChatSession("u1", created_at=datetime(2026, 3, 1, 12, 0, 0))
+    db[SESSION_COLLECTION].insert_one(chat_session.to_dict())
+    return chat_session
+
+
+def test_counter_updates_are_idempotent(db, session):
+    docs = session_messages(session, 3)
+
+    db[SESSION_COLLECTION].bulk_write(session_counter_updates(docs))
+    db[SESSION_COLLECTION].bulk_write(session_counter_updates(docs))
+    db[SESSION_COLLECTION].bulk_write(session_counter_updates(session_messages(session, 2)))
+
+    doc = db[SESSION_COLLECTION].find_one({"_id": session.session_id})
+    assert doc["message_count"] == 5
+    assert doc["tokens_used"] == 50
+
+
+def test_write_behind_retry_does_not_double_count(db, session):
+    sessions = db[SESSION_COLLECTION]
+    failures = []
+
+    class FlakySessions:
+        """第一次 bulk_write 已在服务端生效但客户端收到错误，写入器会重试整批"""
+
+        def bulk_write(self, *args, **kwargs):
+            result = sessions.bulk_write(*args, **kwargs)
+            if not failures:
+                failures.append(1)
+                raise RuntimeError("connection reset")
+            return result
+
+    class FlakyDB:
+        def __getattr__(self, name):
+            return getattr(db, name)
+
+        def __getitem__(self, name):
+            return FlakySessions() if name == SESSION_COLLECTION else db[name]
+
+    writer = MessageWriteBehind(db=FlakyDB(), enabled=False, max_retries=2)
+    # 不启动后台线程，直接放入队列后手动刷新
+    for doc in session_messages(session, 4):
+        item = (doc, "u1", {"emotional_state": "neutral"})
+        writer._buffer.append(item)
+        writer._on_enqueue(item)
+
+    assert writer.flush() == 4
+    assert failures
+    doc = sessions.find_one({"_id": session.session_id})
+    assert doc["message_count"] == 4
+    assert doc["tokens_used"] == 40
+    assert db.chat_messages.count_documents({"session_id": session.session_id}) == 4
+
+
+def test_clear_history_deletes_sessions(db, session):
+    db.chat_messages.insert_many(session_messages(session, 3))
+    db[SESSION_COLLECTION].bulk_write(session_counter_updates(db.chat_messages.find()))
+    chat_service = ChatService()
+    chat_service.sessions = SessionManager(db=db, enabled=True)
+    chat_service.sessions._remember(session)
+
+    result = chat_service.clear_history("u1")
+
+    assert result["sessions_deleted"] == 1
+    assert chat_service.sessions.list_sessions("u1") == []
+    assert chat_service.sessions.stats()["cached_sessions"] == 0
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""聊天消息的 write-behind 批量写入"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.chat import ChatMessage
+from app.services import async_chat_service as async_chat_module
+from app.services.session_manager import SessionManager
+from app.services.write_behind import MessageWriteBehind
+
+
+@pytest.fixture
+def writer(db):
+    # 阈值足够大，后台线程不会抢先刷新，由测试手动 flush
+    message_writer = MessageWriteBehind(db=db, batch_size=1000, flush_interval=60, enabled=True)
+    yield message_writer
+    message_writer.shutdown(timeout=1)
+
+
+def message(user_id, index, emotional_state="neutral"):
+    doc = ChatMessage(user_id, f"m{index}", "user", timestamp=datetime(2026, 3, 1) + timedelta(seconds=index)).to_dict()
+    return doc, user_id, {"emotional_state": emotional_state, "last_active": doc["timestamp"]}
+
+
+def test_flush_writes_messages_and_coalesces_user_updates(db, writer):
+    items = [message("u1", 0, "sad"), message("u2", 1), message("u1", 2, "happy")]
+    for item in items:
+        assert writer.submit(item)
+    assert writer.has_pending("u1") and writer.has_pending("u2")
+
+    assert writer.flush() == 3
+    assert not writer.has_pending("u1")
+    assert db.chat_messages.count_documents({}) == 3
+    # 同一用户的多次更新合并为一次，后写入的值生效
+    assert db.users.find_one({"user_id": "u1"})["emotional_state"] == "happy"
+    assert writer.stats()["written"] == 3
+
+
+def test_already_written_messages_are_ignored_on_retry(db, writer):
+    items = [message("u1", index) for index in range(3)]
+    db.chat_messages.insert_one(items[0][0])
+    for item in items:
+        writer.submit(item)
+
+    assert writer.flush() == 3
+    assert db.chat_messages.count_documents({}) == 3
+
+
+def test_disabled_writer_rejects_items(db):
+    assert not MessageWriteBehind(db=db, enabled=False).submit(message("u1", 0))
+
+
+def test_full_queue_rejects_items(db):
+    writer = MessageWriteBehind(db=db, batch_size=1000, flush_interval=60, max_queue=2, enabled=True)
+    try:
+        assert writer.submit(message("u1", 0))
+        assert writer.submit(message("u1", 1))
+        assert not writer.submit(message("u1", 2))
+    finally:
+        writer.shutdown(timeout=1)
+    assert db.chat_messages.count_documents({}) == 2
+
+
+def test_shutdown_flushes_pending_items(db, writer):
+    writer.submit(message("u1", 0))
+    writer.shutdown(timeout=1)
+    assert db.chat_messages.count_documents({}) == 1
+    # 关闭后不再接受新数据，调用方应同步写入
+    assert not writer.submit(message("u1", 1))
+
+
+class FailingDB:
+    """前 failures 次写入 chat_messages 时抛出异常，模拟数据库主从切换"""
+
+    def __init__(self, db, failures):
+        self._db = db
+        self.failures = failures
+
+    def __getattr__(self, name):
+        if name == "chat_messages" and self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("not primary")
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+
+def test_failed_batch_is_requeued_and_written_later(db):
+    writer = MessageWriteBehind(db=FailingDB(db, failures=3), batch_size=1000, flush_interval=60,
+                                max_retries=3, enabled=True)
+    try:
+        writer.submit(message("u1", 0))
+        assert writer.flush() == 0
+        assert writer.has_pending("u1")
+        writer.submit(message("u1", 1))
+        assert writer.stats()["pending"] == 2 and writer.stats()["requeued"] == 1
+
+        assert writer.flush() == 2
+        assert [doc["content"] for doc in db.chat_messages.find().sort("timestamp", 1)] == ["m0", "m1"]
+        assert writer.stats()["failed"] == 0 and not writer.has_pending("u1")
+    finally:
+        writer.shutdown(timeout=1)
+
+
+def test_requeue_respects_max_queue(db):
+    writer = MessageWriteBehind(db=db, batch_size=1000, flush_interval=60, max_queue=3, enabled=True)
+    try:
+        # 一批3条写入失败期间又有2条入队，放回后只能保留最早的1条
+        failed = [message("u1", index) for index in range(3)]
+        for index in range(3, 5):
+            writer.submit(message("u1", index))
+        writer._requeue(failed)
+        assert [item[0]["content"] for item in writer._buffer] == ["m0", "m3", "m4"]
+        assert writer.stats()["failed"] == 2
+    finally:
+        writer.shutdown(timeout=1)
+
+
+def test_failed_batch_is_dropped_only_at_shutdown(db):
+    writer = MessageWriteBehind(db=FailingDB(db, failures=100), batch_size=1000, flush_interval=60,
+                                max_retries=1, enabled=True)
+    writer.submit(message("u1", 0))
+    writer.shutdown(timeout=1)
+    assert writer.stats()["pending"] == 0 and writer.stats()["failed"] == 1
+    assert not writer.has_pending("u1")
+
+
+def test_async_save_message_uses_write_behind(db, writer, monkeypatch):
+    monkeypatch.setattr(async_chat_module, "get_async_db", lambda: None)
+    service = async_chat_module.AsyncChatService()
+    service.write_behind = writer
+    service.sessions = SessionManager(db=db, enabled=False)
+
+    assert asyncio.run(service.save_message_async("u1", "你好", "user"))
+    assert writer.has_pending("u1")
+    assert writer.flush() == 1
+    assert db.chat_messages.find_one({"user_id": "u1"})["content"] == "你好"